@@ -0,0 +1,558 @@
+"""
+Client for the local adb server's socket protocol.
+
+Rather than spawning the `adb` binary for every operation, this talks to the
+adb server (TCP port 5037 by default, or $ANDROID_ADB_SERVER_PORT) directly:
+
+  host:devices          list devices and their states
+  host:track-devices    stream device list changes
+  host:transport:<s>    bind a connection to a device, then one of:
+    shell,v2,raw:<cmd>  run a shell command with separate stdout/stderr and
+                        an exit code
+    shell:<cmd>         legacy shell, for devices without shell_v2
+    sync:               file transfer session (STAT/SEND/RECV)
+
+The protocol is documented in adb's OVERVIEW.TXT, SERVICES.TXT and
+SYNC.TXT. Sync sessions are kept open and reused across pushes and pulls to
+the same device, and device feature lists are cached, so repeated operations
+cost one local socket round trip instead of a fork/exec of `adb`.
+"""
+import os
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5037
+
+# Shell protocol (v2) packet ids.
+SHELL_ID_STDIN = 0
+SHELL_ID_STDOUT = 1
+SHELL_ID_STDERR = 2
+SHELL_ID_EXIT = 3
+SHELL_ID_CLOSE_STDIN = 4
+
+# Maximum payload of a single sync DATA chunk.
+SYNC_DATA_MAX = 64 * 1024
+
+
+class AdbError(Exception):
+  """Raised when the adb server rejects a request or cannot be reached."""
+
+
+class AdbSyncError(AdbError):
+  """Raised when the device rejects a sync request, e.g. a missing file."""
+
+
+class ShellResult:
+  """The outcome of a shell command run to completion."""
+
+  def __init__(self, returncode, stdout, stderr):
+    self.returncode = returncode
+    self.stdout = stdout
+    self.stderr = stderr
+
+  def check(self, cmd):
+    """Raises AdbError if the command did not exit successfully."""
+    if self.returncode != 0:
+      raise AdbError(
+        f"Command '{cmd}' failed with exit code {self.returncode}: "
+        f"{self.stderr.decode('utf-8', 'replace').strip()}")
+    return self
+
+
+def _read_exact(sock, size):
+  data = bytearray()
+  while len(data) < size:
+    chunk = sock.recv(size - len(data))
+    if not chunk:
+      raise AdbError(f'Connection closed by adb server (wanted {size} bytes, got {len(data)})')
+    data += chunk
+  return bytes(data)
+
+
+def _read_hex_string(sock):
+  """Reads a 4-hex-digit length prefixed string."""
+  length = int(_read_exact(sock, 4), 16)
+  return _read_exact(sock, length)
+
+
+def _send_request(sock, service):
+  payload = service.encode('utf-8')
+  sock.sendall(b'%04x' % len(payload) + payload)
+
+
+def _read_status(sock, service):
+  status = _read_exact(sock, 4)
+  if status == b'OKAY':
+    return
+  if status == b'FAIL':
+    message = _read_hex_string(sock).decode('utf-8', 'replace')
+    raise AdbError(f"adb server rejected '{service}': {message}")
+  raise AdbError(f"Unexpected adb server status for '{service}': {status!r}")
+
+
+def _read_shell_packet(sock):
+  """Reads one shell v2 packet, returning (id, payload) or None at EOF."""
+  header = b''
+  while len(header) < 5:
+    chunk = sock.recv(5 - len(header))
+    if not chunk:
+      if header:
+        raise AdbError('Truncated shell protocol packet')
+      return None
+    header += chunk
+  packet_id, length = struct.unpack('<BI', header)
+  return packet_id, _read_exact(sock, length)
+
+
+def _shell_packet(packet_id, payload=b''):
+  return struct.pack('<BI', packet_id, len(payload)) + payload
+
+
+class AdbShellProcess:
+  """
+  A shell command running on a device, with a subprocess.Popen-like API.
+
+  Output is read by a background thread. By default it is forwarded to this
+  process's stdout/stderr as it arrives, like an inherited Popen stream;
+  pass capture=True to buffer it instead, or a binary file as `stdout` to
+  write stdout to that file.
+  """
+
+  def __init__(self, sock, cmd, shell_v2, capture=False, stdout=None):
+    self.cmd = cmd
+    self.returncode = None
+    self._sock = sock
+    self._shell_v2 = shell_v2
+    self._capture = capture
+    self._stdout_file = stdout
+    self._stdout = bytearray()
+    self._stderr = bytearray()
+    self._done = threading.Event()
+    self._output_cond = threading.Condition()
+    self._reader = threading.Thread(
+      target=self._read_loop, name=f'adb-shell-{cmd[:32]}', daemon=True)
+    self._reader.start()
+
+  def _emit(self, buffer, stream, data):
+    with self._output_cond:
+      if self._stdout_file is not None and buffer is self._stdout:
+        self._stdout_file.write(data)
+      elif self._capture:
+        buffer += data
+      elif hasattr(stream, 'buffer'):
+        stream.buffer.write(data)
+        stream.flush()
+      else:
+        stream.write(data.decode('utf-8', 'replace'))
+      self._output_cond.notify_all()
+
+  def _read_loop(self):
+    try:
+      if self._shell_v2:
+        while True:
+          packet = _read_shell_packet(self._sock)
+          if packet is None:
+            break
+          packet_id, payload = packet
+          if packet_id == SHELL_ID_STDOUT:
+            self._emit(self._stdout, sys.stdout, payload)
+          elif packet_id == SHELL_ID_STDERR:
+            self._emit(self._stderr, sys.stderr, payload)
+          elif packet_id == SHELL_ID_EXIT:
+            self.returncode = payload[0] if payload else 0
+            break
+      else:
+        while True:
+          data = self._sock.recv(SYNC_DATA_MAX)
+          if not data:
+            break
+          self._emit(self._stdout, sys.stdout, data)
+    except (OSError, AdbError):
+      pass
+    finally:
+      if self.returncode is None:
+        # Legacy shell has no exit status; a closed connection without an
+        # exit packet means the command was cut off.
+        self.returncode = 0 if not self._shell_v2 else -1
+      self._close_socket()
+      with self._output_cond:
+        self._done.set()
+        self._output_cond.notify_all()
+
+  def _close_socket(self):
+    try:
+      self._sock.close()
+    except OSError:
+      pass
+
+  def poll(self):
+    return self.returncode if self._done.is_set() else None
+
+  def wait(self, timeout=None):
+    if not self._done.wait(timeout):
+      raise subprocess.TimeoutExpired(self.cmd, timeout)
+    return self.returncode
+
+  def communicate(self, timeout=None):
+    self.wait(timeout)
+    return bytes(self._stdout), bytes(self._stderr)
+
+  def read_until(self, marker, stream='stdout', timeout=None):
+    """
+    Waits until captured output contains `marker` and consumes it.
+
+    Only valid with capture=True. Returns the output up to and including the
+    first occurrence of `marker`; anything after it stays buffered for the
+    next call.
+    """
+    buffer = self._stdout if stream == 'stdout' else self._stderr
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with self._output_cond:
+      while True:
+        index = buffer.find(marker)
+        if index >= 0:
+          end = index + len(marker)
+          data = bytes(buffer[:end])
+          del buffer[:end]
+          return data
+        if self._done.is_set():
+          raise AdbError(
+            f"Shell '{self.cmd}' exited with code {self.returncode} before "
+            f"printing {marker!r}")
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+          raise subprocess.TimeoutExpired(self.cmd, timeout)
+        self._output_cond.wait(remaining)
+
+  def write_stdin(self, data):
+    """Sends data to the command's stdin. Requires shell v2."""
+    if not self._shell_v2:
+      raise AdbError('stdin forwarding requires the shell_v2 device feature')
+    self._sock.sendall(_shell_packet(SHELL_ID_STDIN, data))
+
+  def close_stdin(self):
+    if self._shell_v2:
+      self._sock.sendall(_shell_packet(SHELL_ID_CLOSE_STDIN))
+
+  def terminate(self):
+    """Closes the connection, which makes adbd hang up the command."""
+    try:
+      self._sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+      pass
+    self._close_socket()
+
+  kill = terminate
+
+
+class SyncSession:
+  """An open sync: service connection to one device."""
+
+  def __init__(self, sock):
+    self._sock = sock
+    self._lock = threading.Lock()
+
+  def _send(self, request_id, payload):
+    self._sock.sendall(request_id + struct.pack('<I', len(payload)) + payload)
+
+  def _read_fail(self, header):
+    length = struct.unpack('<I', header[4:])[0]
+    message = _read_exact(self._sock, length).decode('utf-8', 'replace')
+    raise AdbSyncError(f'sync request failed: {message}')
+
+  def stat(self, remote_path):
+    """Returns (mode, size, mtime) of a device file; mode is 0 if missing."""
+    with self._lock:
+      self._send(b'STAT', remote_path.encode('utf-8'))
+      response = _read_exact(self._sock, 16)
+      if response[:4] != b'STAT':
+        raise AdbError(f'Unexpected sync STAT response: {response[:4]!r}')
+      return struct.unpack('<III', response[4:])
+
+  def push(self, local_path, remote_path, mode=None):
+    """Sends a local file to the device and returns the bytes sent."""
+    st = os.stat(local_path)
+    if mode is None:
+      mode = stat.S_IFREG | stat.S_IMODE(st.st_mode)
+    sent = 0
+    with self._lock:
+      self._send(b'SEND', f'{remote_path},{mode}'.encode('utf-8'))
+      with open(local_path, 'rb') as f:
+        while True:
+          chunk = f.read(SYNC_DATA_MAX)
+          if not chunk:
+            break
+          self._send(b'DATA', chunk)
+          sent += len(chunk)
+      self._sock.sendall(b'DONE' + struct.pack('<I', int(st.st_mtime)))
+      response = _read_exact(self._sock, 8)
+      if response[:4] == b'FAIL':
+        self._read_fail(response)
+      if response[:4] != b'OKAY':
+        raise AdbError(f'Unexpected sync SEND response: {response[:4]!r}')
+    return sent
+
+  def pull(self, remote_path, local_path):
+    """
+    Copies a device file to `local_path` and returns the bytes received.
+
+    The data is written to a temporary file that is renamed into place once
+    complete, so a failed pull never leaves a truncated file behind.
+    """
+    received = 0
+    temp_path = f'{local_path}.partial-{os.getpid()}-{threading.get_ident()}'
+    with self._lock:
+      self._send(b'RECV', remote_path.encode('utf-8'))
+      try:
+        with open(temp_path, 'wb') as f:
+          while True:
+            header = _read_exact(self._sock, 8)
+            if header[:4] == b'DATA':
+              length = struct.unpack('<I', header[4:])[0]
+              f.write(_read_exact(self._sock, length))
+              received += length
+            elif header[:4] == b'DONE':
+              break
+            elif header[:4] == b'FAIL':
+              self._read_fail(header)
+            else:
+              raise AdbError(f'Unexpected sync RECV response: {header[:4]!r}')
+        os.replace(temp_path, local_path)
+      finally:
+        if os.path.exists(temp_path):
+          os.remove(temp_path)
+    return received
+
+  def close(self):
+    try:
+      self._send(b'QUIT', b'')
+    except OSError:
+      pass
+    try:
+      self._sock.close()
+    except OSError:
+      pass
+
+
+class AdbClient:
+  """Talks to the local adb server over its socket protocol."""
+
+  def __init__(self, host=DEFAULT_HOST, port=None, start_server=True,
+               timeout_seconds=30):
+    if port is None:
+      port = int(os.environ.get('ANDROID_ADB_SERVER_PORT', DEFAULT_PORT))
+    self.host = host
+    self.port = port
+    self.timeout_seconds = timeout_seconds
+    self._start_server = start_server
+    self._server_started = False
+    self._lock = threading.Lock()
+    self._features = {}
+    self._sync_sessions = {}
+
+  # --- Connections ---
+
+  def _connect(self):
+    try:
+      return socket.create_connection((self.host, self.port), self.timeout_seconds)
+    except ConnectionRefusedError:
+      if not self._start_server or self._server_started:
+        raise AdbError(f'adb server is not running on {self.host}:{self.port}')
+    # Fall back to the adb binary once, only to start the server daemon.
+    self._server_started = True
+    try:
+      subprocess.run(['adb', '-P', str(self.port), 'start-server'],
+                     check=True, capture_output=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+      raise AdbError(f'Failed to start adb server: {e}')
+    return socket.create_connection((self.host, self.port), self.timeout_seconds)
+
+  def _host_request(self, service):
+    """Sends a host: request and returns its length-prefixed reply."""
+    sock = self._connect()
+    try:
+      _send_request(sock, service)
+      _read_status(sock, service)
+      return _read_hex_string(sock).decode('utf-8')
+    finally:
+      sock.close()
+
+  def _transport(self, serial):
+    """Returns a connection bound to the device with the given serial."""
+    sock = self._connect()
+    service = f'host:transport:{serial}'
+    try:
+      _send_request(sock, service)
+      _read_status(sock, service)
+    except BaseException:
+      sock.close()
+      raise
+    return sock
+
+  def _open_service(self, serial, service):
+    sock = self._transport(serial)
+    try:
+      _send_request(sock, service)
+      _read_status(sock, service)
+    except BaseException:
+      sock.close()
+      raise
+    return sock
+
+  # --- Host services ---
+
+  def version(self):
+    return int(self._host_request('host:version'), 16)
+
+  def devices(self):
+    """Returns a list of (serial, state) for all devices known to adb."""
+    return parse_device_list(self._host_request('host:devices'))
+
+  def online_devices(self):
+    """Returns the serials of all devices in the 'device' state."""
+    return [serial for serial, state in self.devices() if state == 'device']
+
+  def track_devices(self):
+    """
+    Yields the full device list as (serial, state) tuples on every change.
+
+    The first list is sent as soon as the subscription starts. The generator
+    ends when the adb server closes the connection; closing the generator
+    closes the connection.
+    """
+    sock = self._connect()
+    service = 'host:track-devices'
+    try:
+      _send_request(sock, service)
+      _read_status(sock, service)
+      # Updates arrive whenever the adb server sees a change; there is
+      # nothing to time out on.
+      sock.settimeout(None)
+      while True:
+        try:
+          text = _read_hex_string(sock).decode('utf-8')
+        except AdbError:
+          return
+        yield parse_device_list(text)
+    finally:
+      sock.close()
+
+  def features(self, serial):
+    """Returns the (cached) set of features supported by a device."""
+    with self._lock:
+      cached = self._features.get(serial)
+    if cached is None:
+      reply = self._host_request(f'host-serial:{serial}:features')
+      cached = frozenset(feature for feature in reply.split(',') if feature)
+      with self._lock:
+        self._features[serial] = cached
+    return cached
+
+  # --- Device services ---
+
+  def shell_popen(self, serial, cmd, capture=False, stdout=None):
+    """
+    Starts a shell command on a device and returns an AdbShellProcess.
+
+    `cmd` is either a string or a list of words, which are joined with spaces
+    exactly like `adb shell` does. With a binary file as `stdout`, the
+    command's stdout is streamed into it rather than held in memory.
+    """
+    if not isinstance(cmd, str):
+      cmd = ' '.join(cmd)
+    shell_v2 = 'shell_v2' in self.features(serial)
+    service = f'shell,v2,raw:{cmd}' if shell_v2 else f'shell:{cmd}'
+    sock = self._open_service(serial, service)
+    # Long-running commands may stay silent for a long time.
+    sock.settimeout(None)
+    return AdbShellProcess(sock, cmd, shell_v2, capture=capture, stdout=stdout)
+
+  def shell(self, serial, cmd, timeout_seconds=None):
+    """Runs a shell command to completion and returns a ShellResult."""
+    process = self.shell_popen(serial, cmd, capture=True)
+    stdout, stderr = process.communicate(timeout_seconds)
+    return ShellResult(process.returncode, stdout, stderr)
+
+  def getprop(self, serial, prop):
+    result = self.shell(serial, ['getprop', prop]).check(f'getprop {prop}')
+    return result.stdout.decode('utf-8').strip()
+
+  def sync(self, serial):
+    """Returns the open sync session for a device, creating it if needed."""
+    with self._lock:
+      session = self._sync_sessions.get(serial)
+    if session is None:
+      session = SyncSession(self._open_service(serial, 'sync:'))
+      with self._lock:
+        self._sync_sessions[serial] = session
+    return session
+
+  def push(self, serial, local_path, remote_path):
+    """
+    Pushes a file to the device, like `adb push`.
+
+    If `remote_path` ends with '/', the file keeps its local name inside that
+    directory. Returns the number of bytes transferred.
+    """
+    if remote_path.endswith('/'):
+      remote_path += os.path.basename(local_path)
+    try:
+      return self.sync(serial).push(local_path, remote_path)
+    except (OSError, AdbError):
+      # A failed transfer leaves the sync stream in an unknown state.
+      self.close_sync(serial)
+      raise
+
+  def pull(self, serial, remote_path, local_path):
+    """Pulls a device file to `local_path`, like `adb pull`."""
+    try:
+      return self.sync(serial).pull(remote_path, local_path)
+    except AdbSyncError:
+      # The device rejected the request; the session is still usable.
+      raise
+    except (OSError, AdbError):
+      self.close_sync(serial)
+      raise
+
+  def close_sync(self, serial):
+    with self._lock:
+      session = self._sync_sessions.pop(serial, None)
+    if session is not None:
+      session.close()
+
+  def close(self):
+    with self._lock:
+      sessions = list(self._sync_sessions.values())
+      self._sync_sessions.clear()
+    for session in sessions:
+      session.close()
+
+
+def parse_device_list(text):
+  """Parses the body of a host:devices reply into (serial, state) tuples."""
+  devices = []
+  for line in text.splitlines():
+    parts = line.split()
+    if len(parts) >= 2:
+      devices.append((parts[0], parts[1]))
+  return devices
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+  """Returns the AdbClient shared by all harness scripts in this process."""
+  global _default_client
+  with _default_client_lock:
+    if _default_client is None:
+      _default_client = AdbClient()
+    return _default_client
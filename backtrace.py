@@ -0,0 +1,156 @@
+"""
+Structured backtraces of every thread of a process, via SBThread/SBFrame.
+
+Frames are walked one by one with GetFrameAtIndex() up to a depth limit,
+rather than asking for GetNumFrames(), which unwinds each stack completely.
+Each thread's unwind is timed separately, so a slow unwind shows up against
+the thread that caused it.
+
+Without symbolication only the PC, module and file address of each frame
+are recorded; symbol lookup, which is the expensive part for large modules,
+can then be done later with symbolicate(), outside the timed walk.
+"""
+import json
+import os
+import time
+
+
+class Options:
+  """
+  How to collect backtraces.
+
+  Args:
+    max_depth: The maximum number of frames per thread.
+    symbolicate: Whether to look up symbols during the walk.
+    json_dir: If set, every collection is written as JSON to this directory.
+  """
+
+  def __init__(self, max_depth=64, symbolicate=True, json_dir=None):
+    self.max_depth = max_depth
+    self.symbolicate = symbolicate
+    self.json_dir = json_dir
+
+
+def _frame_info(frame, symbolicate):
+  pc = frame.GetPC()
+  address = frame.GetPCAddress()
+  module = address.GetModule()
+  info = {
+    'index': frame.GetFrameID(),
+    'pc': pc,
+    'module': module.GetFileSpec().GetFilename() if module.IsValid() else None,
+    'file_address': address.GetFileAddress() if module.IsValid() else None,
+  }
+  if symbolicate:
+    _add_symbol(info, address)
+  return info
+
+
+def _add_symbol(info, address):
+  symbol = address.GetSymbol()
+  if symbol.IsValid():
+    info['symbol'] = symbol.GetName()
+    info['symbol_offset'] = (address.GetFileAddress() -
+                             symbol.GetStartAddress().GetFileAddress())
+  else:
+    info['symbol'] = None
+
+
+def collect(process, max_depth=64, symbolicate=True):
+  """
+  Walks the stacks of all threads of a stopped process.
+
+  Returns:
+    A JSON-serializable dict with the threads, each with its frames and
+    unwind time, and the total time taken.
+  """
+  start = time.monotonic()
+  threads = []
+  for thread in process:
+    thread_start = time.monotonic()
+    frames = []
+    for index in range(max_depth):
+      frame = thread.GetFrameAtIndex(index)
+      if not frame.IsValid():
+        break
+      frames.append(_frame_info(frame, symbolicate))
+    # Only probe one frame past the limit, without unwinding the rest.
+    truncated = len(frames) == max_depth and thread.GetFrameAtIndex(max_depth).IsValid()
+    threads.append({
+      'tid': thread.GetThreadID(),
+      'index': thread.GetIndexID(),
+      'name': thread.GetName(),
+      'stop_reason': thread.GetStopReason(),
+      'frames': frames,
+      'truncated': truncated,
+      'unwind_seconds': time.monotonic() - thread_start,
+    })
+  return {
+    'pid': process.GetProcessID(),
+    'max_depth': max_depth,
+    'symbolicated': symbolicate,
+    'threads': threads,
+    'seconds': time.monotonic() - start,
+  }
+
+
+def symbolicate(target, backtraces, tids=None):
+  """
+  Adds symbols to backtraces collected without them, in place.
+
+  Args:
+    target: The SBTarget the backtraces were collected from.
+    backtraces: A collect() result.
+    tids: If set, only the threads with these ids are symbolicated.
+  """
+  start = time.monotonic()
+  for thread in backtraces['threads']:
+    if tids is not None and thread['tid'] not in tids:
+      continue
+    for frame in thread['frames']:
+      _add_symbol(frame, target.ResolveLoadAddress(frame['pc']))
+  if tids is None:
+    backtraces['symbolicated'] = True
+    backtraces['symbolicate_seconds'] = time.monotonic() - start
+  return backtraces
+
+
+def summarize(backtraces):
+  """Returns the counts and timings of a collect() result, without frames."""
+  threads = backtraces['threads']
+  slowest = max(threads, key=lambda thread: thread['unwind_seconds'], default=None)
+  return {
+    'threads': len(threads),
+    'frames': sum(len(thread['frames']) for thread in threads),
+    'truncated_threads': sum(1 for thread in threads if thread['truncated']),
+    'seconds': backtraces['seconds'],
+    'slowest_thread': slowest and {'tid': slowest['tid'], 'name': slowest['name'],
+                                   'unwind_seconds': slowest['unwind_seconds']},
+  }
+
+
+def format_thread(thread):
+  """Returns the lines of a thread's backtrace, similar to LLDB's `bt`."""
+  lines = [f'thread #{thread["index"]}: tid = {thread["tid"]}, name = {thread["name"]}']
+  for frame in thread['frames']:
+    if frame.get('symbol'):
+      location = frame['symbol']
+      if frame.get('symbol_offset'):
+        location += f' + {frame["symbol_offset"]}'
+    elif frame['file_address'] is not None:
+      location = f'{frame["file_address"]:#x}'
+    else:
+      location = '???'
+    lines.append(f'  frame #{frame["index"]}: {frame["pc"]:#018x} '
+                 f'{frame["module"] or "???"}`{location}')
+  if thread['truncated']:
+    lines.append('  ...')
+  return lines
+
+
+def write_json(path, backtraces):
+  directory = os.path.dirname(path)
+  if directory:
+    os.makedirs(directory, exist_ok=True)
+  with open(path, 'w') as f:
+    json.dump(backtraces, f, indent=1)
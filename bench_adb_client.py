@@ -0,0 +1,118 @@
+"""
+Compares adb_client.AdbClient against spawning the `adb` binary per call.
+
+By default both paths talk to a local FakeAdbServer, so the numbers isolate
+the per-call client overhead (fork/exec of `adb` vs. a socket round trip)
+from device and USB latency. Pass --real-server to run against the adb server
+and device that are actually attached.
+
+Usage:
+
+  python3 bench_adb_client.py --iterations=50
+  python3 bench_adb_client.py --real-server --serial=<serial>
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import adb_client
+import fake_adb_server
+
+
+def time_calls(fn, iterations):
+  samples = []
+  for _ in range(iterations):
+    start = time.perf_counter()
+    fn()
+    samples.append(time.perf_counter() - start)
+  return samples
+
+
+def report(name, samples):
+  samples_ms = sorted(sample * 1000 for sample in samples)
+  print(f'{name:<40} median {statistics.median(samples_ms):8.3f} ms   '
+        f'min {samples_ms[0]:8.3f} ms   max {samples_ms[-1]:8.3f} ms')
+
+
+def run_benchmarks(port, serial, iterations, push_bytes):
+  client = adb_client.AdbClient(port=port, start_server=False)
+  adb = ['adb', '-P', str(port)]
+  have_adb = shutil.which('adb') is not None
+  if not have_adb:
+    print("'adb' not found in PATH; only measuring the socket client.")
+
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    payload = os.path.join(tmp_dir, 'payload.bin')
+    with open(payload, 'wb') as f:
+      f.write(os.urandom(push_bytes))
+
+    cases = [
+      ('devices',
+       client.devices,
+       lambda: subprocess.run(adb + ['devices'], check=True, capture_output=True)),
+      ('shell getprop',
+       lambda: client.getprop(serial, 'ro.product.cpu.abilist'),
+       lambda: subprocess.run(adb + ['-s', serial, 'shell', 'getprop', 'ro.product.cpu.abilist'],
+                              check=True, capture_output=True)),
+      (f'push {push_bytes} bytes',
+       lambda: client.push(serial, payload, '/data/local/tmp/'),
+       lambda: subprocess.run(adb + ['-s', serial, 'push', payload, '/data/local/tmp/'],
+                              check=True, capture_output=True)),
+    ]
+    for name, client_fn, subprocess_fn in cases:
+      report(f'{name} (socket client)', time_calls(client_fn, iterations))
+      if have_adb:
+        report(f'{name} (adb subprocess)', time_calls(subprocess_fn, iterations))
+  client.close()
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Benchmark the adb socket client against the adb binary.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  parser.add_argument(
+    '--iterations',
+    type=int,
+    default=50,
+    help="How many times to run each operation. (Default: 50)"
+  )
+  parser.add_argument(
+    '--push-bytes',
+    type=int,
+    default=1024 * 1024,
+    help="Size of the file pushed by the push benchmark. (Default: 1 MiB)"
+  )
+  parser.add_argument(
+    '--real-server',
+    action='store_true',
+    help="Benchmark against the real adb server instead of a fake one."
+  )
+  parser.add_argument(
+    '--serial',
+    default=None,
+    help="The device to use with --real-server. (Default: first online device)"
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  if args.real_server:
+    client = adb_client.get_default_client()
+    serial = args.serial or client.online_devices()[0]
+    run_benchmarks(client.port, serial, args.iterations, args.push_bytes)
+    return
+
+  device = fake_adb_server.FakeDevice('FAKE0000')
+  with fake_adb_server.FakeAdbServer([device]) as server:
+    print(f'Using fake adb server on port {server.port}')
+    run_benchmarks(server.port, device.serial, args.iterations, args.push_bytes)
+
+
+if __name__ == '__main__':
+  main()
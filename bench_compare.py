@@ -0,0 +1,81 @@
+"""
+Compares two benchmark result files written by `test.py --benchmark_json`.
+
+Samples of every phase are pooled across all device runs in a file, then the
+median and p90 of the baseline and candidate are printed side by side. Phases
+whose median regressed by more than --threshold-percent are flagged, and the
+exit code is non-zero if any were.
+
+Usage:
+
+  python3 bench_compare.py baseline.json candidate.json
+"""
+import argparse
+import json
+import sys
+
+import metrics
+
+
+def load_phase_samples(path):
+  """Returns {phase name: [seconds, ...]} pooled over all runs in a file."""
+  with open(path) as f:
+    data = json.load(f)
+  samples = []
+  for run in data['runs']:
+    samples.extend(run['iterations'])
+  by_phase = {}
+  for sample in samples:
+    for name, seconds in sample.items():
+      by_phase.setdefault(name, []).append(seconds)
+  return by_phase
+
+
+def compare(baseline, candidate, threshold_percent):
+  """Prints a comparison table and returns the names of regressed phases."""
+  regressions = []
+  print(f'{"Phase":<18} {"base median":>12} {"new median":>12} {"change":>9}   '
+        f'{"base p90":>10} {"new p90":>10}')
+  for name in baseline:
+    if name not in candidate:
+      continue
+    base = metrics.summarize(baseline[name])
+    new = metrics.summarize(candidate[name])
+    change = (new['median'] - base['median']) / base['median'] * 100 if base['median'] else 0.0
+    flag = ''
+    if change > threshold_percent:
+      flag = '  REGRESSION'
+      regressions.append(name)
+    print(f'{name:<18} {base["median"] * 1000:9.2f} ms {new["median"] * 1000:9.2f} ms '
+          f'{change:+8.1f}%   {base["p90"] * 1000:7.2f} ms {new["p90"] * 1000:7.2f} ms{flag}')
+  return regressions
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Compare two test.py benchmark result files.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  parser.add_argument('baseline', help="Benchmark JSON of the baseline build.")
+  parser.add_argument('candidate', help="Benchmark JSON of the build under test.")
+  parser.add_argument(
+    '--threshold-percent',
+    type=float,
+    default=10,
+    help="Flag phases whose median got slower by more than this. (Default: 10)"
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  regressions = compare(load_phase_samples(args.baseline),
+                        load_phase_samples(args.candidate),
+                        args.threshold_percent)
+  if regressions:
+    print(f'\nRegressed phases: {", ".join(regressions)}')
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,356 @@
+"""
+Benchmarks the runner scripts against farms of fake devices.
+
+For every farm size, a FakeAdbServer is populated with that many devices
+(see fake_adb_server.make_farm()) and the runner scripts run against it the
+way they do against phones:
+
+  setup     gh_setup_runners.setup_runner() provisions a runner for every
+            device: copies the template and reads the device properties.
+  startup   gh_test_runner_manager.py is started and detects the devices;
+            timed until every device's runner is running.
+  idle      the manager's CPU use while nothing changes.
+  churn     devices are unplugged, go offline and come back on a random
+            script (see fake_adb_server.random_churn()); each event is timed
+            until the manager stopped or started that device's runner.
+
+The runner template holds stub config.sh and run.sh scripts instead of the
+GitHub runner: config.sh only writes the .runner marker, and run.sh logs when
+it starts and stops. CPU times are the manager process's own, read from /proc,
+so this runs on Linux only; setup CPU is the provisioning thread's plus that
+of the config.sh processes.
+
+Usage:
+
+  python3 bench_runner_manager.py --devices=10,100,500
+  python3 bench_runner_manager.py --devices=100 --latency-ms=20 --no-track-devices
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import adb_client
+import fake_adb_server
+import gh_setup_runners
+import metrics
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The log the stub run.sh scripts append to, in the runner base directory.
+EVENTS_LOG = 'runner-events.log'
+
+STUB_CONFIG_SH = """#!/bin/sh
+# Stub of the GitHub runner's config.sh: records the registration only.
+if [ "$1" = remove ]; then
+  rm -f .runner
+  exit 0
+fi
+printf '%s\\n' "$@" > .runner
+"""
+
+STUB_RUN_SH = f"""#!/bin/sh
+# Stub of the GitHub runner's run.sh: logs its start and stop, and idles.
+serial=$(basename "$PWD")
+echo "start $serial $$ $(date +%s.%N)" >> ../{EVENTS_LOG}
+trap 'echo "stop $serial $$ $(date +%s.%N)" >> ../{EVENTS_LOG}; exit 0' TERM
+while true; do
+  sleep 1 &
+  wait $!
+done
+"""
+
+
+def write_template(template_dir):
+  os.makedirs(template_dir)
+  for name, contents in (('config.sh', STUB_CONFIG_SH), ('run.sh', STUB_RUN_SH)):
+    path = os.path.join(template_dir, name)
+    with open(path, 'w') as f:
+      f.write(contents)
+    os.chmod(path, 0o755)
+
+
+class RunnerEvents:
+  """Follows the start and stop lines the stub run.sh scripts log."""
+
+  def __init__(self, path):
+    self.path = path
+    self._offset = 0
+    self._partial = ''
+    # (action, serial, pid, time.time()) tuples, in log order.
+    self.events = []
+
+  def read(self):
+    try:
+      with open(self.path) as f:
+        f.seek(self._offset)
+        data = f.read()
+        self._offset = f.tell()
+    except FileNotFoundError:
+      return
+    lines = (self._partial + data).split('\n')
+    self._partial = lines.pop()
+    for line in lines:
+      action, serial, pid, timestamp = line.split()
+      self.events.append((action, serial, int(pid), float(timestamp)))
+
+  def wait_for(self, predicate, timeout_seconds):
+    """Re-reads the log until predicate(events) is true; returns whether it was."""
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+      self.read()
+      if predicate(self.events):
+        return True
+      if time.monotonic() > deadline:
+        return False
+      time.sleep(0.01)
+
+  def running_pids(self):
+    """Returns the pids of the runners that started and did not stop."""
+    running = set()
+    for action, _, pid, _ in self.events:
+      if action == 'start':
+        running.add(pid)
+      else:
+        running.discard(pid)
+    return running
+
+
+def process_cpu_seconds(pid):
+  """Returns the user + system CPU seconds of a process, from /proc."""
+  with open(f'/proc/{pid}/stat') as f:
+    fields = f.read().rsplit(')', 1)[1].split()
+  return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def own_cpu_seconds():
+  """Returns the CPU seconds of this thread and of the finished child processes."""
+  children = resource.getrusage(resource.RUSAGE_CHILDREN)
+  return time.thread_time() + children.ru_utime + children.ru_stime
+
+
+def set_devices(server, devices):
+  """Replaces the devices of `server`."""
+  for serial, _ in adb_client.parse_device_list(server.device_list()):
+    server.remove_device(serial)
+  for device in devices:
+    server.add_device(device)
+
+
+def provision(serials, base_dir, template_dir):
+  """Runs gh_setup_runners.setup_runner() for every device; returns (seconds, CPU seconds)."""
+  setup_args = argparse.Namespace(github_url='https://github.com/example/fake',
+                                  runner_token='FAKE-TOKEN', runner_base_dir=base_dir)
+  start, start_cpu = time.monotonic(), own_cpu_seconds()
+  # setup_runner() prints several lines per device.
+  with contextlib.redirect_stdout(io.StringIO()):
+    for serial in serials:
+      gh_setup_runners.setup_runner(serial, setup_args, template_dir)
+  return time.monotonic() - start, own_cpu_seconds() - start_cpu
+
+
+def start_manager(port, base_dir, args):
+  cmd = [
+    sys.executable, os.path.join(SCRIPT_DIR, 'gh_test_runner_manager.py'),
+    '--runner-base-dir', base_dir,
+    '--poll-interval-seconds', str(args.poll_interval_seconds),
+  ]
+  if args.no_track_devices:
+    cmd.append('--no-track-devices')
+  return subprocess.Popen(cmd, env=dict(os.environ, ANDROID_ADB_SERVER_PORT=str(port)),
+                          stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                          stderr=subprocess.DEVNULL)
+
+
+def stop_manager(manager, runner_events):
+  """Stops the manager, and the runners it leaves behind."""
+  manager.terminate()
+  manager.wait()
+  runner_events.read()
+  for pid in runner_events.running_pids():
+    try:
+      os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+      pass
+  # Their stop lines are written on the way out.
+  runner_events.wait_for(lambda _: not runner_events.running_pids(), timeout_seconds=5)
+
+
+def reaction_times(churn, runner_events):
+  """
+  Returns the seconds from each churn event to the runner start or stop it
+  caused, for the events that were answered.
+  """
+  times = []
+  for event, applied in churn:
+    expected = 'start' if event.action in ('plug', 'online') else 'stop'
+    for action, serial, _, timestamp in runner_events.events:
+      if action == expected and serial == event.serial and timestamp >= applied:
+        times.append(timestamp - applied)
+        break
+  return times
+
+
+def run_farm(server, count, args):
+  """Runs every phase against `count` devices; returns the results."""
+  result = {'devices': count}
+  devices = fake_adb_server.make_farm(count, latency_seconds=args.latency_ms / 1000)
+  set_devices(server, devices)
+  serials = [device.serial for device in devices]
+
+  with tempfile.TemporaryDirectory(prefix='bench-runners-') as base_dir:
+    template_dir = os.path.join(base_dir, 'template')
+    write_template(template_dir)
+    result['setup_seconds'], result['setup_cpu_seconds'] = provision(
+        serials, base_dir, template_dir)
+
+    runner_events = RunnerEvents(os.path.join(base_dir, EVENTS_LOG))
+    start = time.time()
+    manager = start_manager(server.port, base_dir, args)
+    try:
+      started = runner_events.wait_for(
+          lambda events: len({serial for action, serial, _, _ in events
+                              if action == 'start'}) >= count,
+          args.timeout_seconds)
+      if not started:
+        result['error'] = 'not every runner started'
+        return result
+      result['startup_seconds'] = max(timestamp for _, _, _, timestamp
+                                      in runner_events.events) - start
+      result['startup_cpu_seconds'] = process_cpu_seconds(manager.pid)
+
+      idle_cpu = process_cpu_seconds(manager.pid)
+      time.sleep(args.idle_seconds)
+      result['idle_cpu_percent'] = (
+          100 * (process_cpu_seconds(manager.pid) - idle_cpu) / args.idle_seconds)
+
+      events = fake_adb_server.random_churn(serials, args.churn_events,
+                                            args.churn_interval_seconds, args.seed)
+      churn = []
+      churn_cpu = process_cpu_seconds(manager.pid)
+      fake_adb_server.run_churn(server, events, lambda event, applied:
+                                churn.append((event, applied)))
+      runner_events.wait_for(lambda _: len(reaction_times(churn, runner_events)) == len(churn),
+                             args.timeout_seconds)
+      result['churn_cpu_seconds'] = process_cpu_seconds(manager.pid) - churn_cpu
+      reactions = reaction_times(churn, runner_events)
+      result['churn_events'] = len(churn)
+      result['churn_missed'] = len(churn) - len(reactions)
+      if reactions:
+        result['reaction_seconds'] = metrics.summarize(reactions)
+    finally:
+      stop_manager(manager, runner_events)
+  return result
+
+
+def report(results):
+  print(f'{"Devices":>7} {"Setup":>8} {"CPU":>7} {"Startup":>8} {"CPU":>7} {"Idle CPU":>8} '
+        f'{"Reaction median/p90/max":>24} {"CPU":>7} {"Missed":>6}')
+  for result in results:
+    if 'error' in result:
+      print(f'{result["devices"]:>7} {result["setup_seconds"]:>7.2f}s '
+            f'{result["setup_cpu_seconds"]:>6.2f}s  {result["error"]}')
+      continue
+    reaction = result.get('reaction_seconds')
+    reaction_text = '-'
+    if reaction:
+      reaction_text = (f'{reaction["median"] * 1000:.0f}/{reaction["p90"] * 1000:.0f}/'
+                       f'{reaction["max"] * 1000:.0f} ms')
+    print(f'{result["devices"]:>7} {result["setup_seconds"]:>7.2f}s '
+          f'{result["setup_cpu_seconds"]:>6.2f}s {result["startup_seconds"]:>7.2f}s '
+          f'{result["startup_cpu_seconds"]:>6.2f}s {result["idle_cpu_percent"]:>7.1f}% '
+          f'{reaction_text:>24} {result["churn_cpu_seconds"]:>6.2f}s '
+          f'{result["churn_missed"]:>6}')
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Benchmark the runner manager and setup against fake device farms.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  parser.add_argument(
+    '--devices',
+    type=lambda value: [int(count) for count in value.split(',')],
+    default=[10, 100, 500],
+    help="Comma-separated farm sizes to run. (Default: 10,100,500)"
+  )
+  parser.add_argument(
+    '--latency-ms',
+    type=float,
+    default=0,
+    help="Simulated per-command device latency in milliseconds. (Default: 0)"
+  )
+  parser.add_argument(
+    '--churn-events',
+    type=int,
+    default=20,
+    help="How many device changes to time. (Default: 20)"
+  )
+  parser.add_argument(
+    '--churn-interval-seconds',
+    type=float,
+    default=0.25,
+    help="The time between device changes. (Default: 0.25)"
+  )
+  parser.add_argument(
+    '--idle-seconds',
+    type=float,
+    default=3,
+    help="How long to measure the manager's CPU use without changes. (Default: 3)"
+  )
+  parser.add_argument(
+    '--seed',
+    type=int,
+    default=0,
+    help="The seed of the churn script. (Default: 0)"
+  )
+  parser.add_argument(
+    '--poll-interval-seconds',
+    type=int,
+    default=15,
+    help="Passed on to the manager. (Default: 15)"
+  )
+  parser.add_argument(
+    '--no-track-devices',
+    action='store_true',
+    help="Run the manager without adb device tracking, so it only polls."
+  )
+  parser.add_argument(
+    '--timeout-seconds',
+    type=float,
+    default=120,
+    help="Give up on runners that did not start or stop after this long. (Default: 120)"
+  )
+  parser.add_argument(
+    '--results-json',
+    default=None,
+    help="Write the results to this file."
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  with fake_adb_server.FakeAdbServer() as server:
+    # setup_runner() talks to the adb server of the default client.
+    os.environ['ANDROID_ADB_SERVER_PORT'] = str(server.port)
+    print(f'Using fake adb server on port {server.port}')
+    results = []
+    for count in args.devices:
+      print(f'Running with {count} devices...', flush=True)
+      results.append(run_farm(server, count, args))
+  report(results)
+  if args.results_json:
+    with open(args.results_json, 'w') as f:
+      json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,246 @@
+"""
+Index of ELF files on the host by their GNU build-id.
+
+A device library and the unstripped host copy it was built from share the
+same build-id (the `NT_GNU_BUILD_ID` note), which is also the UUID LLDB
+reports for the module. With an index from build-id to host path, symbols
+can be attached to every module of a target directly instead of having
+LLDB search directories for them.
+
+Only the ELF header, the section or program header table and the note data
+are read, through mmap, so indexing large unstripped libraries touches a
+few pages of each file. The index is persisted as JSON and re-scans only
+files whose size or modification time changed since the last scan.
+
+Usage:
+
+  python3 build_id_index.py --index=build-ids.json <directory>...
+  python3 build_id_index.py --index=build-ids.json --lookup=<build-id>
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+
+
+ELF_MAGIC = b'\x7fELF'
+PT_NOTE = 4
+SHT_NOTE = 7
+NT_GNU_BUILD_ID = 3
+
+INDEX_VERSION = 1
+
+# struct formats of the (ELF header after e_ident, program header, section
+# header) per EI_CLASS: 1 is ELFCLASS32, 2 is ELFCLASS64.
+_HEADER_FORMATS = {
+  1: ('HHIIIIIHHHHHH', 'IIIIIIII', 'IIIIIIIIII'),
+  2: ('HHIQQQIHHHHHH', 'IIQQQQQQ', 'IIQQQQIIQQ'),
+}
+
+
+def normalize_build_id(build_id):
+  """Returns `build_id` as lowercase hex, accepting LLDB's dashed UUIDs."""
+  return build_id.replace('-', '').lower()
+
+
+def _parse_notes(data, byte_order, start, size, align):
+  """Returns the GNU build-id in the notes at data[start:start + size]."""
+  align = 8 if align == 8 else 4
+  offset = start
+  end = min(start + size, len(data))
+  while offset + 12 <= end:
+    namesz, descsz, note_type = struct.unpack_from(byte_order + 'III', data, offset)
+    name_start = offset + 12
+    desc_start = name_start + ((namesz + align - 1) & ~(align - 1))
+    desc_end = desc_start + descsz
+    if desc_end > end:
+      break
+    if note_type == NT_GNU_BUILD_ID and data[name_start:name_start + namesz] == b'GNU\0':
+      return data[desc_start:desc_end].hex()
+    offset = desc_start + ((descsz + align - 1) & ~(align - 1))
+  return None
+
+
+def _read_build_id(data):
+  ei_class, ei_data = data[4], data[5]
+  if ei_class not in _HEADER_FORMATS or ei_data not in (1, 2):
+    return None
+  byte_order = '<' if ei_data == 1 else '>'
+  header_format, phdr_format, shdr_format = _HEADER_FORMATS[ei_class]
+  (_, _, _, _, phoff, shoff, _, _, phentsize, phnum, shentsize, shnum,
+   _) = struct.unpack_from(byte_order + header_format, data, 16)
+
+  # Prefer the section headers: separate debug files keep their notes as
+  # sections, while their program headers may point at stripped data.
+  if shoff and shnum and shoff + shnum * shentsize <= len(data):
+    for i in range(shnum):
+      fields = struct.unpack_from(byte_order + shdr_format, data, shoff + i * shentsize)
+      sh_type, sh_offset, sh_size, sh_addralign = fields[1], fields[4], fields[5], fields[8]
+      if sh_type == SHT_NOTE:
+        build_id = _parse_notes(data, byte_order, sh_offset, sh_size, sh_addralign)
+        if build_id:
+          return build_id
+
+  if phoff and phnum and phoff + phnum * phentsize <= len(data):
+    for i in range(phnum):
+      fields = struct.unpack_from(byte_order + phdr_format, data, phoff + i * phentsize)
+      if ei_class == 1:
+        p_type, p_offset, p_filesz, p_align = fields[0], fields[1], fields[4], fields[7]
+      else:
+        p_type, p_offset, p_filesz, p_align = fields[0], fields[2], fields[5], fields[7]
+      if p_type == PT_NOTE:
+        build_id = _parse_notes(data, byte_order, p_offset, p_filesz, p_align)
+        if build_id:
+          return build_id
+  return None
+
+
+def read_build_id(path):
+  """
+  Returns the GNU build-id of an ELF file as lowercase hex.
+
+  Returns:
+    The build-id, or None if the file is not ELF or has no build-id note.
+  """
+  try:
+    with open(path, 'rb') as f:
+      if f.read(4) != ELF_MAGIC:
+        return None
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if len(data) < 64:
+          return None
+        return _read_build_id(data)
+  except (OSError, ValueError, struct.error):
+    return None
+
+
+def _walk_files(directory):
+  """Yields (path, stat) for the regular files under `directory`."""
+  stack = [directory]
+  while stack:
+    try:
+      with os.scandir(stack.pop()) as entries:
+        for entry in entries:
+          try:
+            if entry.is_dir(follow_symlinks=False):
+              stack.append(entry.path)
+            elif entry.is_file():
+              yield entry.path, entry.stat()
+          except OSError:
+            pass
+    except OSError:
+      pass
+
+
+class BuildIdIndex:
+  """A persistent map from build-id to the ELF files that carry it."""
+
+  def __init__(self, path):
+    self.path = os.path.expanduser(path)
+    # path -> [size, mtime_ns, build_id or None]
+    self.files = {}
+    self._by_build_id = None
+    self._dirty = False
+    try:
+      with open(self.path) as f:
+        data = json.load(f)
+      if data.get('version') == INDEX_VERSION:
+        self.files = data['files']
+    except (OSError, ValueError, KeyError):
+      pass
+
+  def scan(self, directories):
+    """
+    Brings the index up to date with the ELF files under `directories`.
+
+    Files whose size and modification time match the index are not opened.
+    Files that disappeared from the scanned directories are dropped.
+
+    Returns:
+      A dict with the number of files seen, re-read, reused and removed,
+      and the scan time in seconds.
+    """
+    start = time.monotonic()
+    stats = {'files': 0, 'read': 0, 'reused': 0, 'removed': 0}
+    seen = set()
+    roots = [os.path.abspath(os.path.expanduser(d)) for d in directories]
+    for root in roots:
+      for path, stat in _walk_files(root):
+        seen.add(path)
+        stats['files'] += 1
+        known = self.files.get(path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+          stats['reused'] += 1
+          continue
+        self.files[path] = [stat.st_size, stat.st_mtime_ns, read_build_id(path)]
+        stats['read'] += 1
+        self._dirty = True
+
+    prefixes = tuple(os.path.join(root, '') for root in roots)
+    for path in [p for p in self.files if p.startswith(prefixes) and p not in seen]:
+      del self.files[path]
+      stats['removed'] += 1
+      self._dirty = True
+    if self._dirty:
+      self._by_build_id = None
+    stats['seconds'] = time.monotonic() - start
+    return stats
+
+  def lookup(self, build_id):
+    """Returns the paths of the files with `build_id`, in any UUID format."""
+    if self._by_build_id is None:
+      self._by_build_id = {}
+      for path, (_, _, file_build_id) in self.files.items():
+        if file_build_id:
+          self._by_build_id.setdefault(file_build_id, []).append(path)
+    return self._by_build_id.get(normalize_build_id(build_id), [])
+
+  def save(self):
+    """Writes the index back to disk if the last scan changed it."""
+    if not self._dirty:
+      return
+    directory = os.path.dirname(self.path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    with open(self.path + '.tmp', 'w') as f:
+      json.dump({'version': INDEX_VERSION, 'files': self.files}, f)
+    os.replace(self.path + '.tmp', self.path)
+    self._dirty = False
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Index ELF files by GNU build-id.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  parser.add_argument('directories', nargs='*', help="Directories to scan.")
+  parser.add_argument(
+    '--index',
+    default='~/.cache/lldb-testing/build-ids.json',
+    help="The index file to update. (Default: ~/.cache/lldb-testing/build-ids.json)"
+  )
+  parser.add_argument(
+    '--lookup',
+    default=None,
+    help="Print the files with this build-id instead of scanning."
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  index = BuildIdIndex(args.index)
+  if args.lookup:
+    for path in index.lookup(args.lookup):
+      print(path)
+    return
+  stats = index.scan(args.directories)
+  index.save()
+  print(f'{stats["files"]} files in {stats["seconds"]:.3f} seconds: '
+        f'{stats["read"]} read, {stats["reused"]} unchanged, {stats["removed"]} removed')
+
+
+if __name__ == '__main__':
+  main()
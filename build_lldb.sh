@@ -43,7 +43,8 @@ $CMAKE ../llvm-project/llvm -G Ninja \
   -DCMAKE_INSTALL_PREFIX="${INSTALL_DIR}"
 
 pushd "${OUT_DIR}"
-time "${NINJA}" lldb
+# lldb-server is also used on the host, by test.py --target=host.
+time "${NINJA}" lldb lldb-server
 
 echo "Installing LLDB to ${INSTALL_DIR}"
 time "${NINJA}" tools/lldb/install
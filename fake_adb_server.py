@@ -0,0 +1,731 @@
+"""
+A local stand-in for the adb server, for exercising the harness without phones.
+
+FakeAdbServer speaks enough of the adb server socket protocol for
+adb_client.AdbClient (and the `adb` binary, via `adb -P <port>`) to list
+devices, run shell commands and push and pull files. Each FakeDevice has its
+own system properties and a file system in a temporary host directory.
+Shell commands run with the host's /bin/sh in that directory, with paths
+under the top-level device directories (/data, /system, ...) mapped into
+it, and with stand-ins for the device commands the harness uses (getprop,
+run-as, pkill, pidof, am) first on the PATH. run-as runs its command in
+/data/data/<package>.
+
+make_farm() creates many devices with a mix of models, SDKs and ABIs, and
+run_churn() plugs and unplugs them on a script, so the runner scripts can be
+exercised at scale (see bench_runner_manager.py). A churn script is a JSON
+lines file of events such as
+
+  {"seconds": 1.5, "action": "unplug", "serial": "FAKE0003"}
+
+where seconds are since the churn started, and action is one of unplug,
+plug, offline or online.
+
+Usage:
+
+  python3 fake_adb_server.py --port=15037 --devices=3
+  python3 fake_adb_server.py --devices=100 --churn-events=50 --latency-ms=20
+
+  ANDROID_ADB_SERVER_PORT=15037 python3 gh_test_runner_manager.py
+"""
+import argparse
+import collections
+import collections.abc
+import json
+import os
+import random
+import re
+import shlex
+import shutil
+import socketserver
+import stat
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import weakref
+
+import adb_client
+
+
+DEFAULT_FEATURES = ('shell_v2', 'cmd', 'stat_v2', 'ls_v2', 'abb', 'abb_exec')
+
+# The protocol version reported for host:version (adb 1.0.41).
+ADB_SERVER_VERSION = 41
+
+# The (model, SDK, ABI list) of the devices make_farm() creates, in turn.
+FARM_PROFILES = (
+  ('Pixel 8', '34', 'arm64-v8a'),
+  ('Pixel 6', '33', 'arm64-v8a,armeabi-v7a,armeabi'),
+  ('Galaxy A14', '31', 'arm64-v8a,armeabi-v7a,armeabi'),
+  ('Pixel 3', '29', 'arm64-v8a,armeabi-v7a,armeabi'),
+  ('Moto E', '28', 'armeabi-v7a,armeabi'),
+  ('Emulator', '34', 'x86_64,arm64-v8a'),
+)
+
+CHURN_ACTIONS = ('unplug', 'plug', 'offline', 'online')
+
+# A scripted device change, `seconds` after the churn started.
+ChurnEvent = collections.namedtuple('ChurnEvent', 'seconds action serial')
+
+
+# Top-level device directories. Paths under them in shell commands refer to
+# the device's file system; any other path, like /dev/null, is the host's.
+DEVICE_DIRECTORIES = ('data', 'sdcard', 'storage', 'system', 'vendor', 'apex', 'proc')
+
+_DEVICE_PATH = re.compile(
+  r'(?<![\w./-])/(?=(?:%s)(?![\w.-]))' % '|'.join(DEVICE_DIRECTORIES))
+
+# Device commands that the host lacks or must not run for real, as scripts on
+# the PATH of device shells. There are never matching processes on a fake
+# device, and nothing is really started.
+_DEVICE_COMMANDS = {
+  'run-as': (
+    'if [ $# -eq 0 ]; then\n'
+    "  echo 'run-as: usage: run-as <package-name> [<command> [<args>]]' >&2\n"
+    '  exit 1\n'
+    'fi\n'
+    'case "$1" in\n'
+    "  *[!A-Za-z0-9._]*) echo \"run-as: unknown package: $1\" >&2; exit 1 ;;\n"
+    'esac\n'
+    'mkdir -p "$FAKE_DEVICE_ROOT/data/data/$1" && cd "$FAKE_DEVICE_ROOT/data/data/$1" || exit 1\n'
+    'shift\n'
+    '[ $# -gt 0 ] || set -- sh\n'
+    'exec "$@"\n'),
+  'pkill': 'exit 1\n',
+  'pidof': 'exit 1\n',
+  'am': 'exit 0\n',
+}
+
+
+def _getprop_script(props):
+  """Returns the getprop command of a device with system properties `props`."""
+  listing = ' '.join(shlex.quote(f'[{key}]: [{value}]') for key, value in sorted(props.items()))
+  cases = ''.join(f'  {shlex.quote(key)}) echo {shlex.quote(value)} ;;\n'
+                  for key, value in props.items())
+  return (
+    f"[ $# -gt 0 ] || exec printf '%s\\n' {listing}\n"
+    'case "$1" in\n'
+    f'{cases}'
+    '  *) echo ;;\n'
+    'esac\n')
+
+
+class _DeviceFiles(collections.abc.MutableMapping):
+  """The regular files of a FakeDevice, as remote path -> (mode, contents, mtime)."""
+
+  def __init__(self, root):
+    self._root = root
+
+  def _local_path(self, path):
+    return os.path.join(self._root, os.path.normpath('/' + path).lstrip('/'))
+
+  def __getitem__(self, path):
+    local_path = self._local_path(path)
+    try:
+      st = os.stat(local_path)
+      if not stat.S_ISREG(st.st_mode):
+        raise KeyError(path)
+      with open(local_path, 'rb') as f:
+        return st.st_mode, f.read(), int(st.st_mtime)
+    except OSError:
+      raise KeyError(path) from None
+
+  def __setitem__(self, path, entry):
+    mode, contents, mtime = entry
+    local_path = self._local_path(path)
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    with open(local_path, 'wb') as f:
+      f.write(contents)
+    os.chmod(local_path, stat.S_IMODE(mode))
+    os.utime(local_path, (mtime, mtime))
+
+  def __delitem__(self, path):
+    try:
+      os.remove(self._local_path(path))
+    except OSError:
+      raise KeyError(path) from None
+
+  def __iter__(self):
+    for directory, _, names in os.walk(self._root):
+      for name in names:
+        yield '/' + os.path.relpath(os.path.join(directory, name), self._root)
+
+  def __len__(self):
+    return sum(1 for _ in self)
+
+
+class FakeDevice:
+  """
+  A simulated device attached to a FakeAdbServer.
+
+  The device's file system is a temporary directory on the host, removed
+  again when the device is garbage collected, and its shell is the host's
+  /bin/sh running in that directory.
+  """
+
+  def __init__(self, serial, state='device', props=None,
+               features=DEFAULT_FEATURES, latency_seconds=0.0):
+    self.serial = serial
+    self.state = state
+    self.props = {
+      'ro.product.model': 'Fake Phone',
+      'ro.product.cpu.abilist': 'arm64-v8a,armeabi-v7a,armeabi',
+      'ro.build.version.sdk': '34',
+      'ro.build.fingerprint': 'fake/fake_phone/fake:14/FAKE.1/1:userdebug/test-keys',
+    }
+    if props:
+      self.props.update(props)
+    self.features = tuple(features)
+    self.latency_seconds = latency_seconds
+    temp_dir = tempfile.mkdtemp(prefix='fake-adb-device-')
+    weakref.finalize(self, shutil.rmtree, temp_dir, ignore_errors=True)
+    self.root = os.path.join(temp_dir, 'root')
+    self._bin_dir = os.path.join(temp_dir, 'bin')
+    os.makedirs(self.root)
+    os.makedirs(self._bin_dir)
+    for name, script in _DEVICE_COMMANDS.items():
+      self._write_command(name, script)
+    # Remote path -> (mode, contents, mtime).
+    self.files = _DeviceFiles(self.root)
+    self.shell_log = []
+    self._lock = threading.Lock()
+
+  def _write_command(self, name, script):
+    path = os.path.join(self._bin_dir, name)
+    with open(path + '.new', 'w') as f:
+      f.write('#!/bin/sh\n' + script)
+    os.chmod(path + '.new', 0o755)
+    # Atomically, as another shell may be running the old version.
+    os.replace(path + '.new', path)
+
+  def to_host(self, text):
+    """Maps the device paths in a shell command to host paths."""
+    return _DEVICE_PATH.sub(lambda match: self.root + '/', text)
+
+  def from_host(self, data):
+    """Maps host paths in shell output back to device paths."""
+    return data.replace(self.root.encode('utf-8'), b'')
+
+  def popen(self, cmd, merge_stderr=False):
+    """
+    Starts a shell command like adbd does, returning a subprocess.Popen.
+
+    The command's stdout and stderr are pipes, or one pipe with merge_stderr.
+    """
+    with self._lock:
+      self.shell_log.append(cmd)
+      # The properties may have changed since the last command.
+      self._write_command('getprop', _getprop_script(self.props))
+    env = dict(os.environ, FAKE_DEVICE_ROOT=self.root,
+               PATH=self._bin_dir + os.pathsep + os.environ.get('PATH', os.defpath))
+    return subprocess.Popen(
+      ['/bin/sh', '-c', self.to_host(cmd)], cwd=self.root, env=env,
+      stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+      stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE)
+
+  def run_shell(self, cmd):
+    """Runs a shell command, returning (exit_code, stdout, stderr)."""
+    process = self.popen(cmd)
+    out, err = process.communicate()
+    return process.returncode, self.from_host(out), self.from_host(err)
+
+
+def make_farm(count, profiles=FARM_PROFILES, latency_seconds=0.0):
+  """
+  Returns `count` FakeDevices named FAKE0000, FAKE0001, ..., cycling through
+  `profiles` for their model, SDK and ABI properties.
+  """
+  devices = []
+  for i in range(count):
+    model, sdk, abilist = profiles[i % len(profiles)]
+    devices.append(FakeDevice(f'FAKE{i:04d}', props={
+      'ro.product.model': model,
+      'ro.build.version.sdk': sdk,
+      'ro.product.cpu.abilist': abilist,
+      'ro.build.fingerprint': f'fake/{model.lower().replace(" ", "_")}/fake:{sdk}/FAKE.1/1:'
+                              f'userdebug/test-keys',
+    }, latency_seconds=latency_seconds))
+  return devices
+
+
+def random_churn(serials, count, interval_seconds, seed=None):
+  """
+  Returns `count` ChurnEvents, `interval_seconds` apart: random devices are
+  unplugged or go offline, and come back a few events later.
+  """
+  rng = random.Random(seed)
+  present = list(serials)
+  if not present:
+    return []
+  # (serial, action that brings it back) of the devices that are away.
+  away = []
+  events = []
+  for i in range(count):
+    if away and (not present or len(away) >= 3 or rng.random() < 0.5):
+      serial, action = away.pop(rng.randrange(len(away)))
+      present.append(serial)
+    else:
+      serial = present.pop(rng.randrange(len(present)))
+      action = rng.choice(('unplug', 'offline'))
+      away.append((serial, 'plug' if action == 'unplug' else 'online'))
+    events.append(ChurnEvent(i * interval_seconds, action, serial))
+  return events
+
+
+def load_churn(path):
+  """Reads a churn script: a JSON lines file of ChurnEvent fields."""
+  events = []
+  with open(path) as f:
+    for line in f:
+      if line.strip():
+        event = ChurnEvent(**json.loads(line))
+        if event.action not in CHURN_ACTIONS:
+          raise ValueError(f'{path}: unknown churn action {event.action!r}')
+        events.append(event)
+  return sorted(events, key=lambda event: event.seconds)
+
+
+class _FakeAdbHandler(socketserver.BaseRequestHandler):
+  """Handles one client connection to the fake adb server."""
+
+  def handle(self):
+    try:
+      service = self._read_request()
+      if service is not None:
+        self._dispatch(service)
+    except (OSError, adb_client.AdbError):
+      pass
+
+  # --- Wire helpers ---
+
+  def _read_request(self):
+    try:
+      length = int(adb_client._read_exact(self.request, 4), 16)
+    except adb_client.AdbError:
+      return None
+    return adb_client._read_exact(self.request, length).decode('utf-8')
+
+  def _okay(self, payload=None):
+    data = b'OKAY'
+    if payload is not None:
+      encoded = payload.encode('utf-8')
+      data += b'%04x' % len(encoded) + encoded
+    self.request.sendall(data)
+
+  def _fail(self, message):
+    encoded = message.encode('utf-8')
+    self.request.sendall(b'FAIL' + b'%04x' % len(encoded) + encoded)
+
+  # --- Host services ---
+
+  def _dispatch(self, service):
+    server = self.server.fake
+    if service == 'host:version':
+      self._okay('%04x' % ADB_SERVER_VERSION)
+    elif service in ('host:devices', 'host:devices-l'):
+      self._okay(server.device_list())
+    elif service == 'host:features':
+      self._okay(','.join(DEFAULT_FEATURES))
+    elif service.startswith('host-serial:') and service.endswith(':features'):
+      device = server.find_device(service[len('host-serial:'):-len(':features')])
+      if device is None:
+        self._fail('device not found')
+      else:
+        self._okay(','.join(device.features))
+    elif service == 'host:track-devices':
+      self._track_devices()
+    elif service == 'host:kill':
+      self._okay()
+    elif service.startswith('host:transport') or service.startswith('host:tport:'):
+      self._transport(service)
+    else:
+      self._fail(f'unknown host service {service}')
+
+  def _track_devices(self):
+    server = self.server.fake
+    self.request.sendall(b'OKAY')
+    generation = None
+    while not server.stopped:
+      generation, devices = server.wait_for_change(generation)
+      if devices is None:
+        return
+      encoded = devices.encode('utf-8')
+      self.request.sendall(b'%04x' % len(encoded) + encoded)
+
+  def _transport(self, service):
+    server = self.server.fake
+    if service.startswith('host:tport:'):
+      selector = service[len('host:tport:'):]
+      serial = selector[len('serial:'):] if selector.startswith('serial:') else None
+    elif service.startswith('host:transport:'):
+      serial = service[len('host:transport:'):]
+    else:
+      serial = None
+    device = server.find_device(serial) if serial else server.any_device()
+    if device is None or device.state != 'device':
+      self._fail(f"device '{serial}' not found" if serial else 'no devices/emulators found')
+      return
+    self.request.sendall(b'OKAY')
+    if service.startswith('host:tport:'):
+      self.request.sendall(struct.pack('<Q', server.transport_id(device)))
+
+    device_service = self._read_request()
+    if device_service is None:
+      return
+    if device.latency_seconds:
+      time.sleep(device.latency_seconds)
+    if device_service.startswith('shell,') or device_service.startswith('shell:'):
+      self._shell(device, device_service)
+    elif device_service == 'sync:':
+      self.request.sendall(b'OKAY')
+      self._sync(device)
+    else:
+      self._fail(f'unknown device service {device_service}')
+
+  # --- Device services ---
+
+  def _shell(self, device, service):
+    options, _, cmd = service.partition(':')
+    shell_v2 = 'v2' in options.split(',')[1:]
+    # Legacy shell has a single output stream and no way to send stdin.
+    process = device.popen(cmd, merge_stderr=not shell_v2)
+    self.request.sendall(b'OKAY')
+    try:
+      if shell_v2:
+        self._shell_v2(device, process)
+      else:
+        process.stdin.close()
+        for data in iter(lambda: process.stdout.read1(adb_client.SYNC_DATA_MAX), b''):
+          self.request.sendall(device.from_host(data))
+    finally:
+      # The client hung up before the command finished.
+      if process.poll() is None:
+        process.kill()
+      process.wait()
+
+  def _shell_v2(self, device, process):
+    send_lock = threading.Lock()
+
+    def forward_output(stream, packet_id):
+      try:
+        for data in iter(lambda: stream.read1(adb_client.SYNC_DATA_MAX), b''):
+          with send_lock:
+            self.request.sendall(adb_client._shell_packet(packet_id, device.from_host(data)))
+      except OSError:
+        process.kill()
+
+    def forward_stdin():
+      try:
+        while True:
+          packet = adb_client._read_shell_packet(self.request)
+          if packet is None:
+            # The client is gone; so is the command.
+            process.kill()
+            break
+          packet_id, payload = packet
+          if packet_id == adb_client.SHELL_ID_CLOSE_STDIN:
+            break
+          if packet_id == adb_client.SHELL_ID_STDIN:
+            process.stdin.write(device.to_host(payload.decode('utf-8')).encode('utf-8'))
+            process.stdin.flush()
+      except (OSError, ValueError, adb_client.AdbError):
+        pass
+      finally:
+        try:
+          process.stdin.close()
+        except OSError:
+          pass
+
+    threading.Thread(target=forward_stdin, name='fake-adb-stdin', daemon=True).start()
+    readers = [
+      threading.Thread(target=forward_output, args=(process.stdout, adb_client.SHELL_ID_STDOUT)),
+      threading.Thread(target=forward_output, args=(process.stderr, adb_client.SHELL_ID_STDERR)),
+    ]
+    for reader in readers:
+      reader.start()
+    for reader in readers:
+      reader.join()
+    code = process.wait()
+    with send_lock:
+      self.request.sendall(
+        adb_client._shell_packet(adb_client.SHELL_ID_EXIT, bytes([code & 0xff])))
+
+  def _sync(self, device):
+    sock = self.request
+    while True:
+      header = adb_client._read_exact(sock, 8)
+      request_id = header[:4]
+      length = struct.unpack('<I', header[4:])[0]
+      if request_id == b'QUIT':
+        return
+      path = adb_client._read_exact(sock, length).decode('utf-8')
+      if request_id == b'STAT':
+        entry = device.files.get(path)
+        if entry is None:
+          sock.sendall(b'STAT' + struct.pack('<III', 0, 0, 0))
+        else:
+          mode, contents, mtime = entry
+          sock.sendall(b'STAT' + struct.pack('<III', mode, len(contents), mtime))
+      elif request_id == b'RECV':
+        entry = device.files.get(path)
+        if entry is None:
+          message = b'No such file or directory'
+          sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+          continue
+        contents = entry[1]
+        data = bytearray()
+        for offset in range(0, len(contents), adb_client.SYNC_DATA_MAX):
+          chunk = contents[offset:offset + adb_client.SYNC_DATA_MAX]
+          data += b'DATA' + struct.pack('<I', len(chunk)) + chunk
+        data += b'DONE' + struct.pack('<I', 0)
+        sock.sendall(bytes(data))
+      elif request_id == b'SEND':
+        remote_path, _, mode = path.rpartition(',')
+        contents = bytearray()
+        while True:
+          chunk_header = adb_client._read_exact(sock, 8)
+          chunk_id = chunk_header[:4]
+          value = struct.unpack('<I', chunk_header[4:])[0]
+          if chunk_id == b'DATA':
+            contents += adb_client._read_exact(sock, value)
+          elif chunk_id == b'DONE':
+            device.files[remote_path] = (int(mode), bytes(contents), value)
+            sock.sendall(b'OKAY' + struct.pack('<I', 0))
+            break
+          else:
+            message = f'unexpected sync chunk {chunk_id!r}'.encode('utf-8')
+            sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+            return
+      else:
+        message = f'unknown sync request {request_id!r}'.encode('utf-8')
+        sock.sendall(b'FAIL' + struct.pack('<I', len(message)) + message)
+        return
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+  allow_reuse_address = True
+  daemon_threads = True
+
+
+class FakeAdbServer:
+  """Serves a set of FakeDevices over the adb server protocol."""
+
+  def __init__(self, devices=(), host='127.0.0.1', port=0):
+    self._lock = threading.Lock()
+    self._changed = threading.Condition(self._lock)
+    self._generation = 0
+    self.stopped = False
+    self._devices = {device.serial: device for device in devices}
+    self._unplugged = {}
+    self._transport_ids = {}
+    self._server = _ThreadingServer((host, port), _FakeAdbHandler)
+    self._server.fake = self
+    self._thread = None
+
+  @property
+  def port(self):
+    return self._server.server_address[1]
+
+  def start(self):
+    self._thread = threading.Thread(
+      target=self._server.serve_forever, name='fake-adb-server', daemon=True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    with self._lock:
+      self.stopped = True
+      self._changed.notify_all()
+    self._server.shutdown()
+    self._server.server_close()
+
+  def serve_forever(self):
+    """Serves requests on the calling thread until interrupted."""
+    try:
+      self._server.serve_forever()
+    finally:
+      self._server.server_close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *exc_info):
+    self.stop()
+
+  # --- Device management ---
+
+  def _notify_change(self):
+    self._generation += 1
+    self._changed.notify_all()
+
+  def add_device(self, device):
+    with self._lock:
+      self._devices[device.serial] = device
+      self._notify_change()
+
+  def remove_device(self, serial):
+    with self._lock:
+      if self._devices.pop(serial, None) is not None:
+        self._notify_change()
+
+  def set_state(self, serial, state):
+    with self._lock:
+      device = self._devices.get(serial)
+      if device is not None and device.state != state:
+        device.state = state
+        self._notify_change()
+
+  def wait_for_change(self, generation):
+    """
+    Blocks until the device list differs from `generation`.
+
+    Returns the new (generation, device list), or (generation, None) once the
+    server is stopping. Pass None to get the current list immediately.
+    """
+    with self._lock:
+      while generation == self._generation and not self.stopped:
+        self._changed.wait()
+      if self.stopped:
+        return generation, None
+      return self._generation, self._device_list_locked()
+
+  def find_device(self, serial):
+    with self._lock:
+      return self._devices.get(serial)
+
+  def any_device(self):
+    with self._lock:
+      online = [device for device in self._devices.values() if device.state == 'device']
+    return online[0] if len(online) == 1 else None
+
+  def device_list(self):
+    with self._lock:
+      return self._device_list_locked()
+
+  def _device_list_locked(self):
+    return ''.join(f'{device.serial}\t{device.state}\n' for device in self._devices.values())
+
+  def apply(self, event):
+    """Applies one ChurnEvent; unplugged devices are kept for their replug."""
+    if event.action == 'unplug':
+      with self._lock:
+        device = self._devices.pop(event.serial, None)
+        if device is not None:
+          self._unplugged[event.serial] = device
+          self._notify_change()
+    elif event.action == 'plug':
+      with self._lock:
+        device = self._unplugged.pop(event.serial, None)
+        if device is not None:
+          self._devices[event.serial] = device
+          self._notify_change()
+    else:
+      self.set_state(event.serial, 'device' if event.action == 'online' else 'offline')
+
+  def transport_id(self, device):
+    with self._lock:
+      return self._transport_ids.setdefault(device.serial, len(self._transport_ids) + 1)
+
+
+def run_churn(server, events, on_event=None, stop=None):
+  """
+  Applies `events` to `server` at their times, counted from now.
+
+  Args:
+    server: The FakeAdbServer.
+    events: The ChurnEvents, sorted by time.
+    on_event: Called with each event and the time.time() it was applied.
+    stop: A threading.Event that ends the churn early when set.
+  """
+  start = time.monotonic()
+  for event in events:
+    delay = start + event.seconds - time.monotonic()
+    if delay > 0:
+      if stop is not None:
+        if stop.wait(delay):
+          return
+      else:
+        time.sleep(delay)
+    elif stop is not None and stop.is_set():
+      return
+    server.apply(event)
+    if on_event is not None:
+      on_event(event, time.time())
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Local fake adb server for offline testing.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  parser.add_argument(
+    '--port',
+    type=int,
+    default=15037,
+    help="The TCP port to serve the adb protocol on. (Default: 15037)"
+  )
+  parser.add_argument(
+    '--devices',
+    type=int,
+    default=1,
+    help="The number of simulated devices. (Default: 1)"
+  )
+  parser.add_argument(
+    '--latency-ms',
+    type=float,
+    default=0,
+    help="Simulated per-command device latency in milliseconds. (Default: 0)"
+  )
+  parser.add_argument(
+    '--churn-script',
+    default=None,
+    help="A JSON lines file of device events to play, see the module docstring."
+  )
+  parser.add_argument(
+    '--churn-events',
+    type=int,
+    default=0,
+    help="Play this many random unplug/offline and replug events instead. (Default: 0)"
+  )
+  parser.add_argument(
+    '--churn-interval-seconds',
+    type=float,
+    default=1.0,
+    help="The time between random churn events. (Default: 1)"
+  )
+  parser.add_argument(
+    '--seed',
+    type=int,
+    default=None,
+    help="The seed of the random churn."
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  devices = make_farm(args.devices, latency_seconds=args.latency_ms / 1000)
+  server = FakeAdbServer(devices, port=args.port)
+  print(f'Fake adb server with {len(devices)} devices listening on port {server.port}')
+  events = []
+  if args.churn_script:
+    events = load_churn(args.churn_script)
+  elif args.churn_events:
+    events = random_churn([device.serial for device in devices], args.churn_events,
+                          args.churn_interval_seconds, args.seed)
+  if events:
+    threading.Thread(
+      target=run_churn,
+      args=(server, events, lambda event, _: print(f'{event.action} {event.serial}', flush=True)),
+      name='fake-adb-churn',
+      daemon=True).start()
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+
+
+if __name__ == '__main__':
+  main()
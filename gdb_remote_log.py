@@ -0,0 +1,246 @@
+"""
+Streaming analysis of LLDB `gdb-remote packets` logs.
+
+start_lldb_server.sh has lldb-server log every packet it sends and reads to
+lldb/log/platform.log (the platform connection) and lldb/log/gdb-server.log
+(the debug session). Packet lines look like:
+
+  <  49> read packet: $qSupported:xmlRegisters=i386,arm,mips,arc#f9
+  < 283> send packet: $PacketSize=20000;QStartNoAckMode+;...#8b
+
+where the number in angle brackets is the packet size in bytes. "read" is a
+packet from LLDB to lldb-server, "send" one from lldb-server to LLDB.
+
+The logs are processed as a generator pipeline (lines -> packets -> phases
+-> statistics), so multi-megabyte logs are never held in memory. The report
+has packet counts by type, bytes each way, request round trips per phase and
+the most frequent request sequences, which point at the exchanges that
+dominate attach time.
+
+Usage:
+
+  python3 gdb_remote_log.py platform.log gdb-server.log
+"""
+import argparse
+import collections
+import json
+import re
+
+
+PACKET_LINE = re.compile(
+  r'^(?:(\d+\.\d+)\s+)?.*?<\s*(\d+)>\s+(read|send) packet:\s?(.*)$')
+
+# Phases of a debug session, in order. Packets in the platform log are all
+# in the 'platform' phase; the gdb-server log is split at vAttach and at the
+# stop reply that answers it.
+PHASES = ('platform', 'handshake', 'attach', 'inspect')
+
+# Packet types whose name is longer than their first character.
+_NAMED_PREFIXES = ('q', 'Q', 'v', 'j', '_')
+
+
+class Packet:
+  """One logged packet."""
+  __slots__ = ('timestamp', 'direction', 'size', 'payload', 'type', 'phase')
+
+  def __init__(self, timestamp, direction, size, payload):
+    self.timestamp = timestamp
+    self.direction = direction
+    self.size = size
+    self.payload = payload
+    self.type = packet_type(payload)
+    self.phase = None
+
+  @property
+  def is_request(self):
+    """Whether this is a command from LLDB rather than an ack or a reply."""
+    return self.direction == 'read' and self.type not in ('+', '-', '\x03')
+
+
+def packet_type(payload):
+  """
+  Returns the command name of a packet payload.
+
+  For example '$qXfer:libraries-svr4:read::0,fff#xx' is 'qXfer:libraries-svr4',
+  '$vAttach;1234#xx' is 'vAttach' and '$m7fff0000,200#xx' is 'm'.
+  """
+  if payload.startswith(('$', '%')):
+    payload = payload[1:]
+  payload = payload.split('#', 1)[0]
+  if not payload:
+    return '<empty>'
+  if not payload.startswith(_NAMED_PREFIXES):
+    return payload[0]
+  parts = re.split(r'[:;,?]', payload, maxsplit=2)
+  if parts[0] == 'qXfer' and len(parts) > 1:
+    return f'qXfer:{parts[1]}'
+  return parts[0]
+
+
+def read_lines(path):
+  """Yields the lines of a log file, decoded leniently."""
+  with open(path, 'r', encoding='utf-8', errors='replace') as f:
+    for line in f:
+      yield line.rstrip('\n')
+
+
+def parse_packets(lines):
+  """Yields a Packet for every packet line in `lines`, skipping the rest."""
+  for line in lines:
+    match = PACKET_LINE.match(line)
+    if match:
+      timestamp = float(match.group(1)) if match.group(1) else None
+      yield Packet(timestamp, match.group(3), int(match.group(2)), match.group(4))
+
+
+def assign_phases(packets, platform=False):
+  """Yields `packets` with their phase set, see PHASES."""
+  phase = 'platform' if platform else 'handshake'
+  for packet in packets:
+    if not platform:
+      if packet.direction == 'read' and packet.type == 'vAttach':
+        phase = 'attach'
+      elif (phase == 'attach' and packet.direction == 'send' and
+            packet.type in ('T', 'S', 'W', 'X', 'E')):
+        # The stop reply is the last packet of the attach.
+        packet.phase = phase
+        phase = 'inspect'
+        yield packet
+        continue
+    packet.phase = phase
+    yield packet
+
+
+class PacketStats:
+  """Accumulates statistics over a stream of packets."""
+
+  def __init__(self, sequence_length=3):
+    self.sequence_length = sequence_length
+    self.packets = 0
+    self.counts_by_type = collections.Counter()
+    self.bytes = {'read': 0, 'send': 0}
+    self.round_trips = collections.Counter()
+    self.phase_bytes = collections.Counter()
+    self.phase_times = {}
+    self.sequences = collections.Counter()
+    self.longest_runs = {}
+    self._recent = collections.deque(maxlen=sequence_length)
+    self._run_type = None
+    self._run_length = 0
+
+  def add(self, packet):
+    self.packets += 1
+    self.bytes[packet.direction] += packet.size
+    self.phase_bytes[packet.phase] += packet.size
+    if packet.timestamp is not None:
+      first, _ = self.phase_times.get(packet.phase, (packet.timestamp, None))
+      self.phase_times[packet.phase] = (first, packet.timestamp)
+    if not packet.is_request:
+      return
+
+    self.counts_by_type[packet.type] += 1
+    self.round_trips[packet.phase] += 1
+    self._recent.append(packet.type)
+    if len(self._recent) == self.sequence_length:
+      self.sequences[tuple(self._recent)] += 1
+    if packet.type == self._run_type:
+      self._run_length += 1
+    else:
+      self._run_type = packet.type
+      self._run_length = 1
+    if self._run_length > self.longest_runs.get(packet.type, 0):
+      self.longest_runs[packet.type] = self._run_length
+
+  def consume(self, packets):
+    """Adds a stream of packets; sequences do not span separate streams."""
+    self._recent.clear()
+    self._run_type = None
+    self._run_length = 0
+    for packet in packets:
+      self.add(packet)
+    return self
+
+  def report(self, top=10):
+    """Returns the statistics as a JSON-serializable dict."""
+    return {
+      'packets': self.packets,
+      'bytes': dict(self.bytes),
+      'round_trips': {phase: self.round_trips[phase]
+                      for phase in PHASES if phase in self.round_trips},
+      'bytes_by_phase': {phase: self.phase_bytes[phase]
+                         for phase in PHASES if phase in self.phase_bytes},
+      'seconds_by_phase': {phase: last - first
+                           for phase, (first, last) in self.phase_times.items()},
+      'counts_by_type': dict(self.counts_by_type.most_common()),
+      'top_sequences': [{'sequence': list(sequence), 'count': count}
+                        for sequence, count in self.sequences.most_common(top)],
+      'longest_runs': dict(sorted(self.longest_runs.items(),
+                                  key=lambda item: -item[1])[:top]),
+    }
+
+
+def analyze(platform_log=None, gdb_server_log=None, top=10):
+  """
+  Analyzes the platform and gdb-server packet logs of one session.
+
+  Either log may be None, e.g. if the session never got to attach.
+
+  Returns:
+    The PacketStats.report() of both logs together.
+  """
+  stats = PacketStats()
+  if platform_log:
+    stats.consume(assign_phases(parse_packets(read_lines(platform_log)), platform=True))
+  if gdb_server_log:
+    stats.consume(assign_phases(parse_packets(read_lines(gdb_server_log))))
+  return stats.report(top)
+
+
+def format_report(report):
+  """Returns a short human-readable summary of an analyze() report."""
+  lines = [
+    f'{report["packets"]} packets, {report["bytes"]["read"]} bytes to lldb-server, '
+    f'{report["bytes"]["send"]} bytes from lldb-server',
+    'Round trips by phase: ' + ', '.join(
+        f'{phase} {count}' for phase, count in report['round_trips'].items()),
+    'Top packet types: ' + ', '.join(
+        f'{name} {count}' for name, count in list(report['counts_by_type'].items())[:10]),
+  ]
+  for entry in report['top_sequences'][:5]:
+    lines.append(f'  {entry["count"]:6d} x {" -> ".join(entry["sequence"])}')
+  return '\n'.join(lines)
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Analyze lldb-server gdb-remote packet logs.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  parser.add_argument('platform_log', help="The platform.log of the session.")
+  parser.add_argument('gdb_server_log', nargs='?', default=None,
+                      help="The gdb-server.log of the session.")
+  parser.add_argument(
+    '--top',
+    type=int,
+    default=10,
+    help="How many sequences and runs to report. (Default: 10)"
+  )
+  parser.add_argument(
+    '--json',
+    action='store_true',
+    help="Print the full report as JSON."
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  report = analyze(args.platform_log, args.gdb_server_log, args.top)
+  if args.json:
+    print(json.dumps(report, indent=2))
+  else:
+    print(format_report(report))
+
+
+if __name__ == '__main__':
+  main()
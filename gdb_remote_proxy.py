@@ -0,0 +1,570 @@
+"""
+A gdb-remote proxy that simulates a slow transport between LLDB and lldb-server.
+
+The proxy listens on one socket and forwards every connection to another,
+delaying each packet by a fixed latency plus random jitter, and limiting each
+direction to a bandwidth, like a USB or adb-over-network link. Packets keep
+their order, and a packet only goes out once the link has finished sending
+the ones before it.
+
+The platform connection launches a gdb-server for every debug session and
+tells LLDB where to connect to it in its qLaunchGDBServer reply. The proxy
+listens on a socket of its own for each of them and rewrites the reply to
+point there, so the debug session goes through the proxy as well.
+
+Every packet is logged with its arrival time in the format of lldb-server's
+`gdb-remote packets` log, so the log can be analyzed with gdb_remote_log.py.
+The summary has the round trip of each request type as LLDB sees it, which
+shows the operations whose time is dominated by the link's round-trip time.
+
+With --trace, the connections are also recorded byte for byte into a
+gdb_remote_trace.py trace, which gdb_remote_replay.py can serve to LLDB
+without lldb-server.
+
+Addresses are LLDB style URLs: unix-abstract:///name, unix:///path or
+tcp://host:port.
+
+Usage:
+
+  python3 gdb_remote_proxy.py \\
+    --listen unix-abstract:///proxy/platform.sock \\
+    --connect unix-abstract:///lldb/platform.sock \\
+    --latency-ms 10 --jitter-ms 2 --bandwidth-kbps 4000 \\
+    --log proxy.log --summary-json proxy.json
+"""
+import argparse
+import collections
+import json
+import random
+import re
+import signal
+import socket
+import threading
+import time
+
+import gdb_remote_log
+import gdb_remote_trace
+import metrics
+
+# Single byte packets: ack, nack and interrupt.
+_SINGLE_BYTE_PACKETS = b'+-\x03'
+
+# The qLaunchGDBServer reply fields that say where the gdb-server listens.
+_SOCKET_NAME_FIELD = re.compile(rb'socket_name:([0-9a-fA-F]+);')
+_PORT_FIELD = re.compile(rb'port:(\d+);')
+
+_RECV_BYTES = 65536
+
+
+class LinkConfig:
+  """
+  The simulated link, the same in both directions.
+
+  Args:
+    latency_ms: The delay of every packet, one way.
+    jitter_ms: Up to this much more delay, uniformly distributed.
+    bandwidth_kbps: The link's capacity in kilobits per second, 0 for none.
+    seed: The seed of the jitter, for repeatable runs.
+  """
+
+  def __init__(self, latency_ms=0.0, jitter_ms=0.0, bandwidth_kbps=0.0, seed=None):
+    self.latency_ms = latency_ms
+    self.jitter_ms = jitter_ms
+    self.bandwidth_kbps = bandwidth_kbps
+    self.seed = seed
+
+  def to_dict(self):
+    return {'latency_ms': self.latency_ms, 'jitter_ms': self.jitter_ms,
+            'bandwidth_kbps': self.bandwidth_kbps, 'seed': self.seed}
+
+
+class Address:
+  """A socket address parsed from an LLDB style URL."""
+
+  def __init__(self, url):
+    self.url = url
+    scheme, sep, rest = url.partition('://')
+    if not sep:
+      raise ValueError(f'Not a URL: {url}')
+    if scheme in ('unix-abstract', 'unix-abstract-connect'):
+      self.family = socket.AF_UNIX
+      self.name = rest
+      self.address = '\0' + rest
+    elif scheme in ('unix', 'unix-connect'):
+      self.family = socket.AF_UNIX
+      self.name = rest
+      self.address = rest
+    elif scheme in ('tcp', 'connect', 'listen'):
+      host, _, port = rest.rstrip('/').rpartition(':')
+      self.family = socket.AF_INET
+      self.name = host or 'localhost'
+      self.address = (self.name, int(port))
+    else:
+      raise ValueError(f'Unsupported scheme: {scheme}')
+    self.scheme = scheme
+
+  def with_socket_name(self, name):
+    """Returns the address of another socket of the same kind and host."""
+    if self.family == socket.AF_UNIX:
+      return Address(f'{self.scheme}://{name}')
+    return Address(f'{self.scheme}://{self.name}:{name}')
+
+
+def split_packets(buffer):
+  """
+  Splits complete packets off the front of `buffer`.
+
+  `#` is always escaped inside packet data, so a packet ends two checksum
+  characters after the first `#`.
+
+  Returns:
+    A (packets, rest) tuple of the complete packets and the remaining bytes.
+  """
+  packets = []
+  start = 0
+  while start < len(buffer):
+    first = buffer[start:start + 1]
+    if first in (b'$', b'%'):
+      end = buffer.find(b'#', start)
+      if end < 0 or end + 3 > len(buffer):
+        break
+      packets.append(bytes(buffer[start:end + 3]))
+      start = end + 3
+    elif first in _SINGLE_BYTE_PACKETS:
+      packets.append(bytes(first))
+      start += 1
+    else:
+      # Junk between packets; forward it as is.
+      end = start + 1
+      while end < len(buffer) and buffer[end:end + 1] not in b'$%' + _SINGLE_BYTE_PACKETS:
+        end += 1
+      packets.append(bytes(buffer[start:end]))
+      start = end
+  return packets, buffer[start:]
+
+
+def payload_of(packet):
+  """Returns the data of a `$...#xx` packet, without framing and checksum."""
+  return packet[1:-3]
+
+
+def make_packet(payload, prefix=b'$'):
+  return prefix + payload + b'#%02x' % (sum(payload) & 0xff)
+
+
+def launch_reply_target(packet):
+  """
+  Returns where a qLaunchGDBServer reply says its gdb-server listens.
+
+  Returns:
+    ('socket_name', name) if the reply has a socket name, ('port', port) if
+    it has a port other than 0, else None.
+  """
+  payload = payload_of(packet)
+  match = _SOCKET_NAME_FIELD.search(payload)
+  if match:
+    return 'socket_name', bytes.fromhex(match.group(1).decode()).decode()
+  match = _PORT_FIELD.search(payload)
+  if match and match.group(1) != b'0':
+    return 'port', int(match.group(1))
+  return None
+
+
+def retarget_launch_reply(packet, kind, value):
+  """Returns a qLaunchGDBServer reply with its socket name or port replaced."""
+  payload = payload_of(packet)
+  if kind == 'socket_name':
+    field = _SOCKET_NAME_FIELD
+    replacement = b'socket_name:' + value.encode().hex().encode() + b';'
+  else:
+    field = _PORT_FIELD
+    replacement = b'port:%d;' % value
+  return make_packet(field.sub(lambda _: replacement, payload, count=1))
+
+
+def _escape(packet):
+  """Returns a packet as printable text for the log."""
+  return ''.join(chr(b) if 0x20 <= b < 0x7f else f'\\x{b:02x}' for b in packet)
+
+
+class Stats:
+  """Packet counts, injected delays and request round trips, thread-safe."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.connections = 0
+    self.packets = {'read': 0, 'send': 0}
+    self.bytes = {'read': 0, 'send': 0}
+    self.delay_seconds = {'read': 0.0, 'send': 0.0}
+    self.round_trips = collections.defaultdict(list)
+
+  def add_packet(self, direction, size, delay):
+    with self._lock:
+      self.packets[direction] += 1
+      self.bytes[direction] += size
+      self.delay_seconds[direction] += delay
+
+  def add_round_trip(self, packet_type, seconds):
+    with self._lock:
+      self.round_trips[packet_type].append(seconds)
+
+  def add_connection(self):
+    with self._lock:
+      self.connections += 1
+
+  def summary(self):
+    with self._lock:
+      round_trips = {
+          packet_type: dict(metrics.summarize(samples), total=sum(samples))
+          for packet_type, samples in self.round_trips.items()}
+      return {
+        'connections': self.connections,
+        'packets': dict(self.packets),
+        'bytes': dict(self.bytes),
+        'delay_seconds': dict(self.delay_seconds),
+        'round_trips': dict(sorted(round_trips.items(),
+                                   key=lambda item: -item[1]['total'])),
+      }
+
+
+class _Pump:
+  """
+  Forwards the packets of one direction of a connection over the link.
+
+  A reader thread frames the packets and schedules each for delivery; a
+  writer thread sends them when they are due.
+  """
+
+  def __init__(self, connection, source, destination, direction):
+    self.connection = connection
+    self.source = source
+    self.destination = destination
+    # The lldb-server log's point of view: "read" is from LLDB.
+    self.direction = direction
+    proxy = connection.proxy
+    self.link = proxy.link
+    self.random = random.Random(proxy.next_seed())
+    self.bytes_per_second = self.link.bandwidth_kbps * 1000 / 8
+    # Due times never decrease, so the queue is in delivery order.
+    self._queue = collections.deque()
+    self._condition = threading.Condition()
+    self._closed = False
+    self._last_delivery = 0.0
+    self._link_free = 0.0
+
+  def start(self):
+    for target in (self._read, self._write):
+      threading.Thread(target=target, daemon=True).start()
+
+  def _schedule(self, packet, arrival):
+    delay = self.link.latency_ms / 1000
+    if self.link.jitter_ms:
+      delay += self.random.uniform(0, self.link.jitter_ms / 1000)
+    # Jitter does not reorder packets, and the link sends one at a time.
+    ready = max(arrival + delay, self._last_delivery)
+    if self.bytes_per_second:
+      ready = max(ready, self._link_free) + len(packet) / self.bytes_per_second
+      self._link_free = ready
+    self._last_delivery = ready
+    self.connection.proxy.stats.add_packet(self.direction, len(packet), ready - arrival)
+    with self._condition:
+      self._queue.append((ready, packet))
+      self._condition.notify()
+
+  def _read(self):
+    buffer = b''
+    try:
+      while True:
+        data = self.source.recv(_RECV_BYTES)
+        if not data:
+          break
+        arrival = time.monotonic()
+        packets, buffer = split_packets(buffer + data)
+        for packet in packets:
+          packet = self.connection.on_packet(self.direction, packet, arrival)
+          self._schedule(packet, arrival)
+    except OSError:
+      pass
+    with self._condition:
+      self._closed = True
+      self._condition.notify()
+
+  def _write(self):
+    try:
+      while True:
+        with self._condition:
+          while not self._queue and not self._closed:
+            self._condition.wait()
+          if not self._queue:
+            break
+          due, packet = self._queue[0]
+          wait = due - time.monotonic()
+          if wait > 0:
+            self._condition.wait(wait)
+            continue
+          self._queue.popleft()
+        self.destination.sendall(packet)
+        self.connection.on_delivered(self.direction, packet)
+    except OSError:
+      pass
+    self.connection.close()
+
+
+class _Connection:
+  """One proxied connection between LLDB and lldb-server."""
+
+  def __init__(self, proxy, client, server, kind):
+    self.proxy = proxy
+    self.client = client
+    self.server = server
+    self.trace_id = None
+    if proxy.trace is not None:
+      self.trace_id = proxy.trace.open_connection(kind)
+    self._pending = collections.deque()
+    self._launching_gdb_server = False
+    self._closed = False
+    self._lock = threading.Lock()
+
+  def start(self):
+    _Pump(self, self.client, self.server, 'read').start()
+    _Pump(self, self.server, self.client, 'send').start()
+
+  def on_packet(self, direction, packet, arrival):
+    """Logs a packet as it arrives, and rewrites qLaunchGDBServer replies."""
+    type_name = packet_type(packet)
+    if self.trace_id is not None:
+      self.proxy.trace.packet(self.trace_id, direction == 'read', packet, arrival)
+    if direction == 'read':
+      if type_name not in ('+', '-', '\x03'):
+        with self._lock:
+          self._pending.append((type_name, arrival))
+      if type_name == 'qLaunchGDBServer':
+        self._launching_gdb_server = True
+    elif self._launching_gdb_server and packet.startswith(b'$'):
+      self._launching_gdb_server = False
+      packet = self.proxy.rewrite_launch_reply(packet)
+    self.proxy.log_packet(direction, packet)
+    return packet
+
+  def on_delivered(self, direction, packet):
+    """Completes the round trip of the oldest request when LLDB gets its reply."""
+    if direction != 'send' or not packet.startswith(b'$'):
+      return
+    with self._lock:
+      if not self._pending:
+        return
+      packet_type, arrival = self._pending.popleft()
+    self.proxy.stats.add_round_trip(packet_type, time.monotonic() - arrival)
+
+  def close(self):
+    with self._lock:
+      if self._closed:
+        return
+      self._closed = True
+    if self.trace_id is not None:
+      self.proxy.trace.close_connection(self.trace_id)
+    for sock in (self.client, self.server):
+      try:
+        sock.shutdown(socket.SHUT_RDWR)
+      except OSError:
+        pass
+      sock.close()
+
+
+def packet_type(packet):
+  """Returns the command name of a packet, see gdb_remote_log.packet_type()."""
+  return gdb_remote_log.packet_type(packet.decode('latin-1'))
+
+
+class Proxy:
+  """
+  Accepts connections on `listen` and forwards them to `connect` over a
+  simulated link.
+
+  Args:
+    listen: The Address to listen on.
+    connect: The Address of lldb-server.
+    link: The LinkConfig of the simulated link.
+    log_path: If set, every packet is logged to this file.
+    trace: If set, the gdb_remote_trace.TraceWriter to record into.
+  """
+
+  def __init__(self, listen, connect, link, log_path=None, trace=None):
+    self.listen = listen
+    self.connect = connect
+    self.link = link
+    self.trace = trace
+    self.stats = Stats()
+    self._seeds = random.Random(link.seed)
+    self._seed_lock = threading.Lock()
+    self._log = open(log_path, 'w') if log_path else None
+    self._log_lock = threading.Lock()
+    self._listeners = []
+
+  def start(self):
+    """Listens on the proxy's address; returns once it accepts connections."""
+    self._serve(self.listen, self.connect, 'platform')
+
+  def next_seed(self):
+    with self._seed_lock:
+      return self._seeds.getrandbits(32)
+
+  def _serve(self, listen, connect, kind):
+    """Listens on `listen` for `kind` connections to forward to `connect`."""
+    listener = socket.socket(listen.family, socket.SOCK_STREAM)
+    if listen.family == socket.AF_INET:
+      listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(listen.address)
+    listener.listen(16)
+    self._listeners.append(listener)
+    threading.Thread(target=self._accept, args=(listener, connect, kind),
+                     daemon=True).start()
+    return listener
+
+  def _accept(self, listener, connect, kind):
+    while True:
+      try:
+        client, _ = listener.accept()
+      except OSError:
+        return
+      try:
+        server = socket.socket(connect.family, socket.SOCK_STREAM)
+        server.connect(connect.address)
+      except OSError:
+        client.close()
+        continue
+      for sock in (client, server):
+        if sock.family == socket.AF_INET:
+          sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+      self.stats.add_connection()
+      _Connection(self, client, server, kind).start()
+
+  def rewrite_launch_reply(self, packet):
+    """
+    Points a qLaunchGDBServer reply at a new proxy listener.
+
+    The gdb-server is reached like the platform: by socket name if the reply
+    has one, else by port.
+    """
+    target = launch_reply_target(packet)
+    if target is None:
+      return packet
+    kind, value = target
+    if kind == 'socket_name':
+      self._serve(self.listen.with_socket_name(f'{value}.proxy'),
+                  self.connect.with_socket_name(value), 'gdb-server')
+      return retarget_launch_reply(packet, kind, f'{value}.proxy')
+    listener = self._serve(self.listen.with_socket_name(0),
+                           self.connect.with_socket_name(value), 'gdb-server')
+    return retarget_launch_reply(packet, kind, listener.getsockname()[1])
+
+  def log_packet(self, direction, packet):
+    if self._log is None:
+      return
+    with self._log_lock:
+      self._log.write(f'{time.time():.6f} <{len(packet):4d}> {direction} packet: '
+                      f'{_escape(packet)}\n')
+
+  def close(self):
+    for listener in self._listeners:
+      listener.close()
+    if self.trace is not None:
+      self.trace.close()
+    if self._log is not None:
+      with self._log_lock:
+        self._log.close()
+        self._log = None
+
+  def summary(self):
+    return dict(self.stats.summary(), link=self.link.to_dict())
+
+
+def format_summary(summary, top=10):
+  """Returns a short human-readable version of a Proxy.summary()."""
+  lines = [
+    f'{summary["connections"]} connections, '
+    f'{summary["packets"]["read"]} packets to lldb-server, '
+    f'{summary["packets"]["send"]} from lldb-server, '
+    f'{summary["delay_seconds"]["read"] + summary["delay_seconds"]["send"]:.3f} s '
+    f'of injected delay',
+    f'{"Request":<24} {"Count":>6} {"Total (s)":>10} {"Median (ms)":>12}',
+  ]
+  for packet_type, stats in list(summary['round_trips'].items())[:top]:
+    lines.append(f'{packet_type:<24} {stats["count"]:>6} {stats["total"]:>10.3f} '
+                 f'{stats["median"] * 1000:>12.2f}')
+  return '\n'.join(lines)
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Forward gdb-remote connections over a simulated slow link.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  parser.add_argument('--listen', required=True, help="The URL to listen on.")
+  parser.add_argument('--connect', required=True, help="The URL of lldb-server.")
+  parser.add_argument(
+    '--latency-ms',
+    type=float,
+    default=0.0,
+    help="One-way delay of every packet, half the round-trip time. (Default: 0)"
+  )
+  parser.add_argument(
+    '--jitter-ms',
+    type=float,
+    default=0.0,
+    help="Up to this much more delay per packet, uniformly distributed. (Default: 0)"
+  )
+  parser.add_argument(
+    '--bandwidth-kbps',
+    type=float,
+    default=0.0,
+    help="The link capacity in each direction in kilobits per second. (Default: unlimited)"
+  )
+  parser.add_argument('--seed', type=int, default=None, help="The seed of the jitter.")
+  parser.add_argument('--log', default=None, help="Log every packet to this file.")
+  parser.add_argument(
+    '--trace',
+    default=None,
+    help="Record the connections into this gdb_remote_trace.py trace."
+  )
+  parser.add_argument(
+    '--trace-metadata',
+    type=json.loads,
+    default=None,
+    help="A JSON object to store in the trace's metadata."
+  )
+  parser.add_argument(
+    '--summary-json',
+    default=None,
+    help="Write the summary to this file when the proxy is stopped."
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  link = LinkConfig(args.latency_ms, args.jitter_ms, args.bandwidth_kbps, args.seed)
+  trace = None
+  if args.trace:
+    trace = gdb_remote_trace.TraceWriter(
+        args.trace, dict(args.trace_metadata or {}, source='gdb_remote_proxy'))
+  proxy = Proxy(Address(args.listen), Address(args.connect), link, args.log, trace)
+  proxy.start()
+  print(f'Forwarding {args.listen} to {args.connect}', flush=True)
+
+  stopped = threading.Event()
+  signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+  try:
+    stopped.wait()
+  except KeyboardInterrupt:
+    pass
+  proxy.close()
+  summary = proxy.summary()
+  if args.summary_json:
+    with open(args.summary_json, 'w') as f:
+      json.dump(summary, f, indent=2)
+  print(format_summary(summary), flush=True)
+
+
+if __name__ == '__main__':
+  main()
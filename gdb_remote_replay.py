@@ -0,0 +1,322 @@
+"""
+Serves a recorded gdb-remote trace to LLDB in place of lldb-server.
+
+The trace (see gdb_remote_trace.py) holds the platform connection and the
+gdb-server connections of a recorded session. Each connection LLDB opens is
+answered from the next recorded connection of its kind: every packet LLDB
+sends is matched against the recorded requests, and the replies that
+followed the match are sent back. qLaunchGDBServer replies are rewritten to
+point at a gdb-server socket of the replay server.
+
+Requests are matched in order. When LLDB's request differs from the next
+recorded one, e.g. because a newer LLDB asks for something else, the replay
+falls back to, in turn:
+
+  1. the same request a little further ahead, skipping the ones between,
+  2. the same request anywhere in the connection, for repeated queries,
+  3. the next request of the same type, e.g. a memory read at another
+     address, or failing that any request of the same type,
+  4. an empty reply, which tells LLDB the packet is not supported.
+
+The summary counts how often each fallback was needed; a replay without any
+is an exact reproduction of the recorded session. By default the replies go
+out as fast as possible, so the client's own time is measured; --realtime
+delays them as much as the recorded server did.
+
+Usage:
+
+  python3 gdb_remote_replay.py --trace trace.bin \\
+    --listen unix-abstract:///replay/platform.sock --summary-json replay.json
+"""
+import argparse
+import collections
+import json
+import signal
+import socket
+import threading
+import time
+
+import gdb_remote_proxy
+import gdb_remote_trace
+
+# How far ahead of the next recorded request to look for LLDB's request.
+LOOKAHEAD = 32
+
+_EMPTY_REPLY = b'$#00'
+
+
+class _Exchange:
+  """A recorded client packet and the server packets that followed it."""
+  __slots__ = ('request', 'type', 'replies')
+
+  def __init__(self, request):
+    self.request = request
+    self.type = gdb_remote_proxy.packet_type(request)
+    # (packet, seconds after the request) tuples.
+    self.replies = []
+
+
+def _exchanges(connection):
+  """
+  Returns the (greeting, exchanges) of a recorded connection, where greeting
+  are the server packets sent before LLDB sent anything.
+  """
+  greeting = _Exchange(b'')
+  exchanges = []
+  request_seconds = 0.0
+  for kind, data, seconds in connection.records:
+    if kind == gdb_remote_trace.CLIENT:
+      exchanges.append(_Exchange(data))
+      request_seconds = seconds
+    else:
+      current = exchanges[-1] if exchanges else greeting
+      current.replies.append((data, seconds - request_seconds))
+  return greeting, exchanges
+
+
+class ReplayStats:
+  """How LLDB's requests were matched, thread-safe."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.connections = collections.Counter()
+    self.matches = collections.Counter()
+    self.unmatched_types = collections.Counter()
+
+  def add(self, how, packet_type=None):
+    with self._lock:
+      self.matches[how] += 1
+      if how == 'unmatched':
+        self.unmatched_types[packet_type] += 1
+
+  def add_connection(self, kind):
+    with self._lock:
+      self.connections[kind] += 1
+
+  def summary(self):
+    with self._lock:
+      return {
+        'connections': dict(self.connections),
+        'matches': dict(self.matches),
+        'unmatched_types': dict(self.unmatched_types.most_common()),
+      }
+
+
+class _Replayer:
+  """Answers one LLDB connection from one recorded connection."""
+
+  def __init__(self, server, sock, connection):
+    self.server = server
+    self.sock = sock
+    self.greeting, self.exchanges = _exchanges(connection)
+    self.cursor = 0
+    self.ack_mode = True
+
+  def _match(self, packet):
+    """
+    Returns the recorded exchange to answer `packet` with, or None.
+
+    See the module docstring for the order of the fallbacks.
+    """
+    exchanges = self.exchanges
+    end = min(self.cursor + LOOKAHEAD, len(exchanges))
+    for i in range(self.cursor, end):
+      if exchanges[i].request == packet:
+        self.server.stats.add('exact' if i == self.cursor else 'skipped')
+        self.cursor = i + 1
+        return exchanges[i]
+    for exchange in exchanges:
+      if exchange.request == packet:
+        self.server.stats.add('repeated')
+        return exchange
+    packet_type = gdb_remote_proxy.packet_type(packet)
+    for i in range(self.cursor, end):
+      if exchanges[i].type == packet_type:
+        self.server.stats.add('same_type')
+        self.cursor = i + 1
+        return exchanges[i]
+    for exchange in exchanges:
+      if exchange.type == packet_type:
+        self.server.stats.add('same_type')
+        return exchange
+    self.server.stats.add('unmatched', packet_type)
+    return None
+
+  def _send(self, replies, request, start):
+    for reply, delay in replies:
+      if self.server.realtime:
+        wait = start + delay - time.monotonic()
+        if wait > 0:
+          time.sleep(wait)
+      if request is not None and request.type == 'qLaunchGDBServer':
+        reply = self.server.retarget_launch_reply(reply)
+      self.sock.sendall(reply)
+
+  def run(self):
+    try:
+      self._send(self.greeting.replies, None, time.monotonic())
+      buffer = b''
+      while True:
+        data = self.sock.recv(65536)
+        if not data:
+          break
+        start = time.monotonic()
+        packets, buffer = gdb_remote_proxy.split_packets(buffer + data)
+        for packet in packets:
+          exchange = self._match(packet)
+          if exchange is not None:
+            if exchange.type == 'QStartNoAckMode':
+              self.ack_mode = False
+            self._send(exchange.replies, exchange, start)
+          elif packet.startswith(b'$'):
+            self.sock.sendall((b'+' if self.ack_mode else b'') + _EMPTY_REPLY)
+    except OSError:
+      pass
+    finally:
+      self.sock.close()
+
+
+class ReplayServer:
+  """
+  Serves the connections of a trace on `listen`.
+
+  Args:
+    trace_path: The gdb_remote_trace.py trace to serve.
+    listen: The gdb_remote_proxy.Address of the platform socket.
+    realtime: Whether to delay replies as much as the recorded server did.
+  """
+
+  def __init__(self, trace_path, listen, realtime=False):
+    self.metadata, connections = gdb_remote_trace.load(trace_path)
+    self.listen = listen
+    self.realtime = realtime
+    self.stats = ReplayStats()
+    self._connections = {'platform': [], 'gdb-server': []}
+    for connection in connections:
+      self._connections.setdefault(connection.kind, []).append(connection)
+    self._next = collections.Counter()
+    self._launches = 0
+    self._lock = threading.Lock()
+    self._listeners = []
+
+  def start(self):
+    """Listens on the platform socket; returns once it accepts connections."""
+    if not self._connections['platform']:
+      raise gdb_remote_trace.TraceError('The trace has no platform connection')
+    self._serve(self.listen, 'platform')
+
+  def _next_connection(self, kind):
+    """
+    Returns the next recorded connection of `kind`. Once all were used, they
+    are served again from the first, so a trace of one attach can serve a
+    benchmark of many.
+    """
+    with self._lock:
+      recorded = self._connections[kind]
+      connection = recorded[self._next[kind] % len(recorded)]
+      self._next[kind] += 1
+      return connection
+
+  def _serve(self, listen, kind):
+    listener = socket.socket(listen.family, socket.SOCK_STREAM)
+    if listen.family == socket.AF_INET:
+      listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(listen.address)
+    listener.listen(16)
+    self._listeners.append(listener)
+    threading.Thread(target=self._accept, args=(listener, kind), daemon=True).start()
+    return listener
+
+  def _accept(self, listener, kind):
+    while True:
+      try:
+        sock, _ = listener.accept()
+      except OSError:
+        return
+      if sock.family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+      self.stats.add_connection(kind)
+      replayer = _Replayer(self, sock, self._next_connection(kind))
+      threading.Thread(target=replayer.run, daemon=True).start()
+
+  def retarget_launch_reply(self, packet):
+    """Points a recorded qLaunchGDBServer reply at a new gdb-server socket."""
+    target = gdb_remote_proxy.launch_reply_target(packet)
+    if target is None or not self._connections['gdb-server']:
+      return packet
+    kind, _ = target
+    with self._lock:
+      self._launches += 1
+      launch = self._launches
+    if kind == 'socket_name':
+      name = f'{self.listen.name.rsplit("/", 1)[0]}/gdb-server-{launch}.sock'
+      self._serve(self.listen.with_socket_name(name), 'gdb-server')
+      return gdb_remote_proxy.retarget_launch_reply(packet, kind, name)
+    listener = self._serve(self.listen.with_socket_name(0), 'gdb-server')
+    return gdb_remote_proxy.retarget_launch_reply(packet, kind, listener.getsockname()[1])
+
+  def close(self):
+    for listener in self._listeners:
+      listener.close()
+
+  def summary(self):
+    return dict(self.stats.summary(), metadata=self.metadata)
+
+
+def format_summary(summary):
+  """Returns a short human-readable version of a ReplayServer.summary()."""
+  matches = summary['matches']
+  lines = [
+    'Connections: ' + ', '.join(f'{kind} {count}'
+                                 for kind, count in summary['connections'].items()),
+    'Requests: ' + ', '.join(f'{how} {count}' for how, count in matches.items()),
+  ]
+  if summary['unmatched_types']:
+    lines.append('Unmatched: ' + ', '.join(
+        f'{packet_type} {count}'
+        for packet_type, count in list(summary['unmatched_types'].items())[:10]))
+  return '\n'.join(lines)
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Serve a recorded gdb-remote trace to LLDB.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  parser.add_argument('--trace', required=True, help="The gdb_remote_trace.py trace.")
+  parser.add_argument('--listen', required=True, help="The URL of the platform socket.")
+  parser.add_argument(
+    '--realtime',
+    action='store_true',
+    help="Delay replies as much as the recorded server did."
+  )
+  parser.add_argument(
+    '--summary-json',
+    default=None,
+    help="Write the summary to this file when the server is stopped."
+  )
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  server = ReplayServer(args.trace, gdb_remote_proxy.Address(args.listen), args.realtime)
+  server.start()
+  print(f'Replaying {args.trace} on {args.listen}', flush=True)
+
+  stopped = threading.Event()
+  signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+  try:
+    stopped.wait()
+  except KeyboardInterrupt:
+    pass
+  server.close()
+  summary = server.summary()
+  if args.summary_json:
+    with open(args.summary_json, 'w') as f:
+      json.dump(summary, f, indent=2)
+  print(format_summary(summary), flush=True)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,298 @@
+"""
+A compact binary trace of gdb-remote conversations, for gdb_remote_replay.py.
+
+A trace holds every connection of a debug session (the platform connection
+and one per gdb-server) with the exact bytes each side sent, in order, and
+the time between them. It starts with a header:
+
+  8 bytes   magic, b'GDBRTRC\\0'
+  uint16    format version
+  uint32    length of the metadata
+  ...       metadata, a JSON object: where the trace was recorded, the
+            process names of the debugged process, ...
+
+followed by records, all little-endian:
+
+  uint8     kind: OPEN, CLIENT, SERVER or CLOSE
+  uint16    connection id
+  uint32    microseconds since the previous record of the connection, or
+            for OPEN, since the first record of the trace
+  uint32    length of the data
+  ...       data: the connection kind ('platform' or 'gdb-server') for
+            OPEN, the packet bytes for CLIENT and SERVER
+
+Traces are written by gdb_remote_proxy.py --trace on the host, which sees
+the exact bytes, or converted from the lldb-server packet logs of a device
+session with from_logs(). lldb-server logs binary packets from LLDB in hex,
+so those do not match byte for byte in a trace converted from logs.
+
+Usage:
+
+  python3 gdb_remote_trace.py info trace.bin
+  python3 gdb_remote_trace.py from-logs platform.log gdb-server.log -o trace.bin
+"""
+import argparse
+import json
+import re
+import struct
+import threading
+import time
+
+import gdb_remote_log
+
+MAGIC = b'GDBRTRC\0'
+VERSION = 1
+
+_HEADER = struct.Struct('<8sHI')
+_RECORD = struct.Struct('<BHII')
+
+OPEN = 0
+CLIENT = 1
+SERVER = 2
+CLOSE = 3
+
+_MAX_DELTA_US = 0xffffffff
+
+# An escaped byte in a packet log line.
+_LOG_ESCAPE = re.compile(r'\\x([0-9a-fA-F]{2})')
+
+
+class TraceError(Exception):
+  """The file is not a trace, or is truncated."""
+
+
+class Connection:
+  """
+  The packets of one connection, in order, as (kind, data, seconds) tuples,
+  where seconds are since the connection was opened.
+  """
+
+  def __init__(self, connection_id, kind):
+    self.id = connection_id
+    self.kind = kind
+    self.records = []
+
+
+class TraceWriter:
+  """
+  Writes a trace as the records happen. Safe to use from several threads.
+
+  Args:
+    path: The trace file to write.
+    metadata: The JSON-serializable metadata of the trace.
+  """
+
+  def __init__(self, path, metadata=None):
+    self._file = open(path, 'wb')
+    encoded = json.dumps(metadata or {}, sort_keys=True).encode()
+    self._file.write(_HEADER.pack(MAGIC, VERSION, len(encoded)) + encoded)
+    self._lock = threading.Lock()
+    self._start = None
+    # The time of the latest record of each connection.
+    self._last = {}
+    self._next_id = 0
+
+  def _write(self, kind, connection_id, data, timestamp=None):
+    with self._lock:
+      if self._file is None:
+        return
+      timestamp = time.monotonic() if timestamp is None else timestamp
+      if self._start is None:
+        self._start = timestamp
+      last = self._start if kind == OPEN else self._last[connection_id]
+      delta_us = min(max(int((timestamp - last) * 1e6), 0), _MAX_DELTA_US)
+      self._last[connection_id] = max(last, timestamp)
+      self._file.write(_RECORD.pack(kind, connection_id, delta_us, len(data)) + data)
+
+  def open_connection(self, kind, timestamp=None):
+    """Starts a connection of `kind` and returns its id."""
+    with self._lock:
+      connection_id = self._next_id
+      self._next_id += 1
+    self._write(OPEN, connection_id, kind.encode(), timestamp)
+    return connection_id
+
+  def packet(self, connection_id, from_client, data, timestamp=None):
+    self._write(CLIENT if from_client else SERVER, connection_id, data, timestamp)
+
+  def close_connection(self, connection_id, timestamp=None):
+    self._write(CLOSE, connection_id, b'', timestamp)
+
+  def close(self):
+    with self._lock:
+      if self._file is not None:
+        self._file.close()
+        self._file = None
+
+
+def _read_header(f, path):
+  """Reads the header of a trace file; returns its metadata."""
+  header = f.read(_HEADER.size)
+  if len(header) < _HEADER.size:
+    raise TraceError(f'{path}: too short for a trace')
+  magic, version, metadata_length = _HEADER.unpack(header)
+  if magic != MAGIC or version != VERSION:
+    raise TraceError(f'{path}: not a version {VERSION} gdb-remote trace')
+  return json.loads(f.read(metadata_length))
+
+
+def read_metadata(path):
+  """Returns the metadata of a trace, without reading its records."""
+  with open(path, 'rb') as f:
+    return _read_header(f, path)
+
+
+def read_records(path):
+  """
+  Reads a trace.
+
+  Returns:
+    A (metadata, records) tuple, where records is a generator of
+    (kind, connection id, seconds, data) tuples. For OPEN, seconds are since
+    the start of the trace, else since the connection was opened.
+  """
+  f = open(path, 'rb')
+  try:
+    metadata = _read_header(f, path)
+  except BaseException:
+    f.close()
+    raise
+
+  def records():
+    with f:
+      seconds = {}
+      while True:
+        fixed = f.read(_RECORD.size)
+        if not fixed:
+          return
+        if len(fixed) < _RECORD.size:
+          raise TraceError(f'{path}: truncated record')
+        kind, connection_id, delta_us, length = _RECORD.unpack(fixed)
+        data = f.read(length)
+        if len(data) < length:
+          raise TraceError(f'{path}: truncated record')
+        if kind == OPEN:
+          opened = delta_us / 1e6
+          seconds[connection_id] = 0.0
+          yield kind, connection_id, opened, data
+          continue
+        seconds[connection_id] = seconds.get(connection_id, 0.0) + delta_us / 1e6
+        yield kind, connection_id, seconds[connection_id], data
+  return metadata, records()
+
+
+def load(path):
+  """
+  Reads a whole trace into memory.
+
+  Returns:
+    A (metadata, connections) tuple, with the Connections in the order they
+    were opened.
+  """
+  metadata, records = read_records(path)
+  connections = {}
+  for kind, connection_id, seconds, data in records:
+    if kind == OPEN:
+      connections[connection_id] = Connection(connection_id, data.decode())
+    elif kind in (CLIENT, SERVER):
+      connections[connection_id].records.append((kind, data, seconds))
+  return metadata, list(connections.values())
+
+
+def _log_payload_bytes(payload):
+  """Returns the bytes of a packet as written to a packet log."""
+  return _LOG_ESCAPE.sub(lambda m: chr(int(m.group(1), 16)), payload).encode('latin-1')
+
+
+def _split_sessions(packets):
+  """
+  Splits the packets of one log into its connections.
+
+  Every connection starts with LLDB's QStartNoAckMode, preceded by its
+  first acks.
+  """
+  starts = []
+  for i, packet in enumerate(packets):
+    if packet.direction == 'read' and packet.type == 'QStartNoAckMode':
+      start = i
+      while (start > 0 and packets[start - 1].direction == 'read' and
+             packets[start - 1].type == '+'):
+        start -= 1
+      starts.append(start)
+  if not starts or starts[0] != 0:
+    starts.insert(0, 0)
+  bounds = starts + [len(packets)]
+  return [packets[bounds[i]:bounds[i + 1]] for i in range(len(starts))
+          if bounds[i] < bounds[i + 1]]
+
+
+def from_logs(path, platform_log, gdb_server_log, metadata=None):
+  """
+  Converts the lldb-server packet logs of a session into a trace.
+
+  Logs without timestamps give a trace without timing.
+
+  Returns:
+    The number of connections written.
+  """
+  writer = TraceWriter(path, dict(metadata or {}, source='lldb-server logs'))
+  count = 0
+  try:
+    for kind, log_path in (('platform', platform_log), ('gdb-server', gdb_server_log)):
+      if not log_path:
+        continue
+      packets = list(gdb_remote_log.parse_packets(gdb_remote_log.read_lines(log_path)))
+      for session in _split_sessions(packets):
+        connection_id = writer.open_connection(kind, session[0].timestamp or 0.0)
+        for packet in session:
+          writer.packet(connection_id, packet.direction == 'read',
+                        _log_payload_bytes(packet.payload), packet.timestamp or 0.0)
+        writer.close_connection(connection_id, session[-1].timestamp or 0.0)
+        count += 1
+  finally:
+    writer.close()
+  return count
+
+
+def info(path):
+  """Returns a summary of a trace: its metadata and per-connection counts."""
+  metadata, connections = load(path)
+  return {
+    'metadata': metadata,
+    'connections': [{
+        'id': connection.id,
+        'kind': connection.kind,
+        'client_packets': sum(1 for kind, _, _ in connection.records if kind == CLIENT),
+        'server_packets': sum(1 for kind, _, _ in connection.records if kind == SERVER),
+        'bytes': sum(len(data) for _, data, _ in connection.records),
+      } for connection in connections],
+  }
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Inspect or create gdb-remote traces for gdb_remote_replay.py.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  subparsers = parser.add_subparsers(dest='command', required=True)
+  info_parser = subparsers.add_parser('info', help="Summarize a trace.")
+  info_parser.add_argument('trace')
+  logs_parser = subparsers.add_parser(
+    'from-logs', help="Convert lldb-server packet logs into a trace.")
+  logs_parser.add_argument('platform_log')
+  logs_parser.add_argument('gdb_server_log', nargs='?', default=None)
+  logs_parser.add_argument('-o', '--output', required=True, help="The trace to write.")
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  if args.command == 'info':
+    print(json.dumps(info(args.trace), indent=2))
+  else:
+    count = from_logs(args.output, args.platform_log, args.gdb_server_log)
+    print(f'Wrote {count} connections to {args.output}')
+
+
+if __name__ == '__main__':
+  main()
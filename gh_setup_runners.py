@@ -33,6 +33,8 @@ import urllib.request
 import urllib.error
 from pathlib import Path
 
+import adb_client
+
 
 def log(message):
   """Logs a timestamped message to the console and log file."""
@@ -166,25 +168,12 @@ def remove_runner(serial, runner_base_dir, runner_token):
 def get_online_devices():
   """Returns a list of serial IDs for all currently online ADB devices."""
   try:
-    result = subprocess.run(
-      ['adb', 'devices'],
-      capture_output=True,
-      text=True,
-      check=True
-    )
-
-    devices = []
-    for line in result.stdout.splitlines():
-      if line.strip() and line != "List of devices attached":
-        parts = line.split()
-        if len(parts) == 2 and parts[1] == 'device':
-          devices.append(parts[0])
-    return devices
-  except FileNotFoundError:
-    log("ERROR: 'adb' command not found. Ensure ADB is in your system PATH.")
+    return adb_client.get_default_client().online_devices()
+  except adb_client.AdbError as e:
+    log(f"ERROR: Could not reach the adb server. Ensure ADB is installed and running. {e}")
     return []
   except Exception as e:
-    log(f"ERROR executing adb devices: {e}")
+    log(f"ERROR listing adb devices: {e}")
     return []
 
 
@@ -198,9 +187,8 @@ def get_device_info(serial):
 
   for key, prop in props.items():
     try:
-      cmd = ['adb', '-s', serial, 'shell', 'getprop', prop]
-      result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-      info[key] = result.stdout.strip().replace(' ', '_').replace('-', '')
+      value = adb_client.get_default_client().getprop(serial, prop)
+      info[key] = value.replace(' ', '_').replace('-', '')
     except Exception as e:
       log(f"Device {serial}: WARNING: Could not retrieve {prop}. {e}")
       info[key] = "unknown"
@@ -211,10 +199,7 @@ def get_device_info(serial):
 def get_device_abi_labels(serial):
   """Retrieves the supported ABIs for a device and formats them as a label string."""
   try:
-    abi_cmd = ['adb', '-s', serial, 'shell', 'getprop', 'ro.product.cpu.abilist']
-    result = subprocess.run(abi_cmd, capture_output=True, text=True, check=True)
-
-    abi_list_str = result.stdout.strip()
+    abi_list_str = adb_client.get_default_client().getprop(serial, 'ro.product.cpu.abilist')
 
     if not abi_list_str:
       return "generic-android-abi"
@@ -1,8 +1,15 @@
 import argparse
 import os
+import queue
 import subprocess
+import threading
 import time
 
+import adb_client
+
+# Pushed by track_online_devices() when the adb tracking stream breaks.
+TRACKING_LOST = 'tracking-lost'
+
 
 # --- HELPER FUNCTIONS ---
 
@@ -25,28 +32,66 @@ def log(message):
 def get_online_devices():
   """Returns a list of serial IDs for all currently online ADB devices."""
   try:
-    result = subprocess.run(
-      ['adb', 'devices'],
-      capture_output=True,
-      text=True,
-      check=True
-    )
-
-    devices = []
-    for line in result.stdout.splitlines():
-      if line.strip() and line != "List of devices attached":
-        parts = line.split()
-        if len(parts) == 2 and parts[1] == 'device':
-          devices.append(parts[0])
-    return devices
-  except FileNotFoundError:
-    log("ERROR: 'adb' command not found. Ensure ADB is in your system PATH.")
+    return adb_client.get_default_client().online_devices()
+  except adb_client.AdbError as e:
+    log(f"ERROR: Could not reach the adb server. Ensure ADB is installed and running. {e}")
     return []
   except Exception as e:
-    log(f"ERROR executing adb devices: {e}")
+    log(f"ERROR listing adb devices: {e}")
     return []
 
 
+def track_online_devices(device_events):
+  """
+  Pushes the list of online serials into `device_events` on every change.
+
+  Subscribes to the adb server's host:track-devices stream, so attach and
+  detach events arrive as soon as adb sees them. If the stream breaks (e.g.
+  the adb server restarts), pushes TRACKING_LOST once and resubscribes with a
+  growing delay; the first list after resubscribing means tracking is back.
+  Runs forever; meant to be the target of a daemon thread.
+  """
+  retry_delay = 1
+  lost = False
+  while True:
+    try:
+      for devices in adb_client.get_default_client().track_devices():
+        retry_delay = 1
+        lost = False
+        device_events.put([serial for serial, state in devices if state == 'device'])
+      log("WARNING: adb device tracking stream closed. Reconnecting.")
+    except Exception as e:
+      log(f"WARNING: adb device tracking failed: {e}. Retrying in {retry_delay} seconds.")
+    if not lost:
+      device_events.put(TRACKING_LOST)
+      lost = True
+    time.sleep(retry_delay)
+    retry_delay = min(retry_delay * 2, 30)
+
+
+def wait_for_device_change(device_events, timeout_seconds):
+  """
+  Waits for the next event from the tracking thread.
+
+  Args:
+    device_events: The queue track_online_devices() pushes to.
+    timeout_seconds: How long to wait, or None to wait for as long as it takes.
+
+  Returns:
+    The most recent event if several queued up: a list of online serials or
+    TRACKING_LOST. None if nothing arrived within the timeout.
+  """
+  try:
+    event = device_events.get(timeout=timeout_seconds)
+  except queue.Empty:
+    return None
+  while True:
+    try:
+      event = device_events.get_nowait()
+    except queue.Empty:
+      return event
+
+
 # --- RUNNER MANAGEMENT ---
 
 
@@ -119,7 +164,14 @@ def parse_args():
     '--poll-interval-seconds',
     type=int,
     default=15,
-    help="How often (in seconds) to check for connected devices. (Default: 15)"
+    help="How often (in seconds) to re-check connected devices while adb device tracking is\n"
+         "disabled or reconnecting, or a runner failed to start. Otherwise changes are picked\n"
+         "up as adb reports them and there is no polling. (Default: 15)"
+  )
+  parser.add_argument(
+    '--no-track-devices',
+    action='store_true',
+    help="Disable adb device tracking and only poll for connected devices."
   )
   return parser.parse_args()  # Return as a dictionary
 
@@ -138,10 +190,24 @@ def main():
   # Dictionary to track active runners: {serial_id: subprocess_object}
   active_runners = {}
 
+  # Device lists pushed by the adb tracking thread, newest last.
+  device_events = queue.Queue()
+  if not args.no_track_devices:
+    threading.Thread(
+      target=track_online_devices,
+      args=(device_events,),
+      name='adb-track-devices',
+      daemon=True).start()
+
+  # Whether device changes arrive from the tracking thread. Poll only while
+  # they do not.
+  tracking = not args.no_track_devices
+  online_serials = None
   while True:
     try:
-      log("--- Checking ADB devices ---")
-      online_serials = get_online_devices()
+      if online_serials is None:
+        log("--- Checking ADB devices ---")
+        online_serials = get_online_devices()
 
       # Identify New Devices (Start Runners)
       for serial in online_serials:
@@ -168,7 +234,24 @@ def main():
     except Exception as e:
       log(f"An unexpected error occurred in main loop: {e}")
 
-    time.sleep(args.poll_interval_seconds)
+    # Tracking only reports changes, so keep polling while a device still
+    # needs a runner, e.g. after a failed start.
+    retrying = online_serials is None or any(
+      serial not in active_runners for serial in online_serials)
+    event = wait_for_device_change(
+      device_events, args.poll_interval_seconds if retrying or not tracking else None)
+    if event is TRACKING_LOST:
+      log("--- ADB device tracking lost, polling until it reconnects ---")
+      tracking = False
+      online_serials = None
+    elif event is None:
+      online_serials = None
+    else:
+      if not tracking:
+        log("--- ADB device tracking reconnected ---")
+      tracking = True
+      log("--- ADB device change ---")
+      online_serials = event
 
 
 if __name__ == "__main__":
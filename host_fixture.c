@@ -0,0 +1,67 @@
+// The process that test.py --target=host attaches to.
+//
+// Starts a number of threads that each descend a chain of calls and then
+// sleep, so every stack has a known shape, and prints "ready" once they are
+// all running.
+//
+// The lldb-server that attaches is not an ancestor of this process, which
+// Yama's ptrace_scope=1 would refuse, so it allows any process to trace it.
+//
+// Usage: host_fixture [threads] [depth]
+
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <sys/prctl.h>
+#include <unistd.h>
+
+#ifndef PR_SET_PTRACER
+#define PR_SET_PTRACER 0x59616d61
+#endif
+#ifndef PR_SET_PTRACER_ANY
+#define PR_SET_PTRACER_ANY ((unsigned long)-1)
+#endif
+
+static int g_depth = 8;
+
+// Called by every thread once a second, so a breakpoint on it is hit soon on
+// any thread; the breakpoint scenario uses it on --target=host.
+__attribute__((noinline)) void fixture_nap(void) {
+  sleep(1);
+}
+
+__attribute__((noinline)) static int descend(int depth) {
+  if (depth == 0) {
+    for (;;)
+      fixture_nap();
+  }
+  // Not a tail call, so every level keeps its frame.
+  return descend(depth - 1) + 1;
+}
+
+static void *thread_main(void *arg) {
+  (void)arg;
+  descend(g_depth);
+  return NULL;
+}
+
+int main(int argc, char **argv) {
+  int threads = argc > 1 ? atoi(argv[1]) : 4;
+  if (argc > 2)
+    g_depth = atoi(argv[2]);
+
+  // Fails with EINVAL without Yama, where no permission is needed.
+  prctl(PR_SET_PTRACER, PR_SET_PTRACER_ANY, 0, 0, 0);
+
+  for (int i = 0; i < threads; i++) {
+    pthread_t thread;
+    if (pthread_create(&thread, NULL, thread_main, NULL) != 0) {
+      perror("pthread_create");
+      return 1;
+    }
+  }
+  printf("ready\n");
+  fflush(stdout);
+  descend(g_depth);
+  return 0;
+}
@@ -0,0 +1,731 @@
+"""
+A stand-in for lldb-server that serves synthetic devices, for load testing.
+
+Each device has its own platform port and a synthetic x86_64 Linux process
+list, and implements enough of the platform and gdb-remote protocols for
+test.py to connect, find the app with pidof or a process listing, attach,
+stop, unwind every thread and detach, the same way it does against a real
+lldb-server. One stub process can serve hundreds of devices, so the harness,
+the multi-device scheduler and the result pipeline can be exercised at scale
+on one machine.
+
+The app process has a configurable number of threads, modules and extra
+memory regions. Every thread's stack holds a frame-pointer chain of return
+addresses into the modules, so LLDB's unwinder walks real memory reads. The
+modules are listed through qXfer:libraries-svr4 but have no object files, so
+frames are not symbolicated.
+
+Usage:
+
+  python3 lldb_server_stub.py --devices 100 --app-name com.example.hellojni \\
+    --threads 8 --modules 16 --regions 32 --devices-json devices.json
+"""
+import argparse
+import bisect
+import collections
+import json
+import selectors
+import signal
+import socket
+import struct
+import threading
+
+import gdb_remote_proxy
+
+TRIPLE = 'x86_64-pc-linux-gnu'
+
+# The registers of a thread, in register number order, as (name, DWARF
+# number, generic role). Every register is 64 bits wide.
+REGISTERS = [
+  ('rax', 0, None), ('rbx', 3, None), ('rcx', 2, 'arg4'), ('rdx', 1, 'arg3'),
+  ('rsi', 4, 'arg2'), ('rdi', 5, 'arg1'), ('rbp', 6, 'fp'), ('rsp', 7, 'sp'),
+  ('r8', 8, 'arg5'), ('r9', 9, 'arg6'), ('r10', 10, None), ('r11', 11, None),
+  ('r12', 12, None), ('r13', 13, None), ('r14', 14, None), ('r15', 15, None),
+  ('rip', 16, 'pc'), ('rflags', 49, 'flags'),
+]
+_REGISTER_NUMBERS = {name: number for number, (name, _, _) in enumerate(REGISTERS)}
+
+# Registers sent with every stop reply, so stopping needs no p packets.
+_EXPEDITED = ('rbp', 'rsp', 'rip')
+
+# Synthetic address space layout.
+_MODULE_BASE = 0x7f0000000000
+_MODULE_STRIDE = 0x100000
+_MODULE_SIZE = 0x20000
+_STACK_BASE = 0x7ffe00000000
+_STACK_STRIDE = 0x200000
+_STACK_SIZE = 0x100000
+_HEAP_BASE = 0x560000000000
+_HEAP_STRIDE = 0x400000
+_HEAP_SIZE = 0x200000
+_FRAME_SIZE = 0x40
+
+_SIGSTOP = 0x13
+_SIGTRAP = 0x05
+
+# Packet bytes that must be escaped in binary data.
+_ESCAPED = b'#$}*'
+
+
+def _hex(text):
+  return text.encode().hex()
+
+
+def _escape_binary(data):
+  out = bytearray()
+  for b in data:
+    if b in _ESCAPED:
+      out += bytes((0x7d, b ^ 0x20))
+    else:
+      out.append(b)
+  return bytes(out)
+
+
+class Region:
+  """A mapped range of the synthetic address space."""
+  __slots__ = ('start', 'size', 'permissions', 'name', 'fill', 'thread')
+
+  def __init__(self, start, size, permissions, name, fill=0, thread=None):
+    self.start = start
+    self.size = size
+    self.permissions = permissions
+    self.name = name
+    self.fill = fill
+    # The thread whose stack this is, if any.
+    self.thread = thread
+
+  @property
+  def end(self):
+    return self.start + self.size
+
+
+class Thread:
+  """
+  A thread stopped `depth` frames deep.
+
+  Frame i's frame pointer points at the saved frame pointer of frame i + 1,
+  followed by the return address into frame i + 1's module.
+  """
+
+  def __init__(self, tid, name, stack, modules, index, depth):
+    self.tid = tid
+    self.name = name
+    top = stack.end - 0x1000
+    self.frames = []
+    for i in range(depth):
+      fp = top - (depth - i) * _FRAME_SIZE
+      module = modules[(index + i + 1) % len(modules)]
+      return_address = module.start + 0x1000 + ((index * 31 + i * 17) % 0x800) * 8 + 5
+      self.frames.append((fp, return_address))
+    first_module = modules[index % len(modules)]
+    self.registers = [0] * len(REGISTERS)
+    self.registers[_REGISTER_NUMBERS['rip']] = first_module.start + 0x1000 + index * 16
+    self.registers[_REGISTER_NUMBERS['rbp']] = self.frames[0][0] if self.frames else 0
+    self.registers[_REGISTER_NUMBERS['rsp']] = (self.frames[0][0] if self.frames else top) - 0x20
+    self.registers[_REGISTER_NUMBERS['rflags']] = 0x246
+
+  @property
+  def pc(self):
+    return self.registers[_REGISTER_NUMBERS['rip']]
+
+  def stack_words(self):
+    """Returns the (address, value) of every saved frame pointer and return address."""
+    for i, (fp, return_address) in enumerate(self.frames):
+      next_fp = self.frames[i + 1][0] if i + 1 < len(self.frames) else 0
+      yield fp, next_fp
+      yield fp + 8, return_address
+
+
+class SyntheticProcess:
+  """
+  The debugged app: threads, modules and memory regions.
+
+  Args:
+    pid: The process id; the first thread has the same id.
+    name: The process name reported to pidof and process listings.
+    threads: The number of threads.
+    modules: The number of shared libraries.
+    regions: The number of extra heap regions.
+    depth: The number of frames of every thread.
+  """
+
+  def __init__(self, pid, name, threads=8, modules=16, regions=32, depth=16):
+    self.pid = pid
+    self.name = name
+    self.modules = [
+        Region(_MODULE_BASE + i * _MODULE_STRIDE, _MODULE_SIZE, 'rx',
+               f'/system/lib64/libstub{i}.so', fill=0x90)
+        for i in range(max(modules, 1))]
+    self.regions = list(self.modules)
+    self.threads = []
+    for i in range(max(threads, 1)):
+      stack = Region(_STACK_BASE + i * _STACK_STRIDE, _STACK_SIZE, 'rw',
+                     '[stack]' if i == 0 else f'[anon:thread stack {i}]')
+      thread = Thread(pid + i, 'main' if i == 0 else f'worker-{i}', stack,
+                      self.modules, i, depth)
+      stack.thread = thread
+      self.regions.append(stack)
+      self.threads.append(thread)
+    self.regions += [Region(_HEAP_BASE + i * _HEAP_STRIDE, _HEAP_SIZE, 'rw',
+                            '[anon:scudo:primary]', fill=0xab)
+                     for i in range(regions)]
+    self.regions.sort(key=lambda region: region.start)
+    self._starts = [region.start for region in self.regions]
+    self.lock = threading.Lock()
+    self.attached = False
+
+  def thread(self, tid):
+    for thread in self.threads:
+      if thread.tid == tid:
+        return thread
+    return None
+
+  def region_at(self, address):
+    """Returns the region containing `address`, or None."""
+    i = bisect.bisect_right(self._starts, address) - 1
+    if i >= 0 and address < self.regions[i].end:
+      return self.regions[i]
+    return None
+
+  def next_region(self, address):
+    """Returns the first region after `address`, or None."""
+    i = bisect.bisect_right(self._starts, address)
+    return self.regions[i] if i < len(self.regions) else None
+
+  def read_memory(self, address, length):
+    """
+    Returns the bytes at `address`, stopping at the end of its region, or
+    None if it is not mapped.
+    """
+    region = self.region_at(address)
+    if region is None:
+      return None
+    length = min(length, region.end - address)
+    data = bytearray([region.fill]) * length
+    if region.thread is not None:
+      for word_address, value in region.thread.stack_words():
+        offset = word_address - address
+        if -8 < offset < length:
+          word = struct.pack('<Q', value)
+          lo = max(offset, 0)
+          hi = min(offset + 8, length)
+          data[lo:hi] = word[lo - offset:hi - offset]
+    return bytes(data)
+
+  def libraries_svr4(self):
+    libraries = ''.join(
+        f'<library name="{module.name}" lm="0x{0x1000 + i * 0x28:x}" '
+        f'l_addr="0x{module.start:x}" l_ld="0x{module.start + 0x10000:x}"/>'
+        for i, module in enumerate(self.modules))
+    return f'<library-list-svr4 version="1.0">{libraries}</library-list-svr4>'
+
+
+class Device:
+  """One fake device: the app, other processes to list, and their state."""
+
+  def __init__(self, index, app_name, processes=30, **process_options):
+    self.name = f'stub-{index}'
+    app_pid = 10000 + index % 1000 * 50
+    self.app = SyntheticProcess(app_pid, app_name, **process_options)
+    # Other processes only show up in listings.
+    self.processes = [(1, 'init'), (300, 'zygote64')]
+    self.processes += [(400 + i, f'stub_daemon_{i}') for i in range(max(processes - 3, 0))]
+    self.processes.append((self.app.pid, self.app.name))
+    self.next_gdb_server_pid = 50000
+
+
+class Stats:
+  """Connection and packet counts over all devices, thread-safe."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.connections = collections.Counter()
+    self.packets = collections.Counter()
+    self.attaches = 0
+
+  def add_connection(self, kind):
+    with self._lock:
+      self.connections[kind] += 1
+
+  def add_packet(self, packet_type):
+    with self._lock:
+      self.packets[packet_type] += 1
+
+  def add_attach(self):
+    with self._lock:
+      self.attaches += 1
+
+  def summary(self):
+    with self._lock:
+      return {
+        'connections': dict(self.connections),
+        'attaches': self.attaches,
+        'packets': sum(self.packets.values()),
+        'packets_by_type': dict(self.packets.most_common(20)),
+      }
+
+
+def _host_info():
+  return (f'triple:{_hex(TRIPLE)};ptrsize:8;endian:little;ostype:linux;'
+          f'vendor:pc;hostname:{_hex("lldb-server-stub")};')
+
+
+class _Connection:
+  """
+  One gdb-remote connection: framing, acks and dispatch to handle_*().
+
+  Subclasses list their handlers in HANDLERS as (packet prefix, method name)
+  pairs; the first matching prefix wins. Unknown packets get an empty reply,
+  which tells LLDB they are not supported.
+  """
+  kind = None
+  HANDLERS = ()
+
+  def __init__(self, server, sock, device):
+    self.server = server
+    self.sock = sock
+    self.device = device
+    self.ack_mode = True
+
+  def send(self, payload):
+    if isinstance(payload, str):
+      payload = payload.encode('latin-1')
+    self.sock.sendall((b'+' if self.ack_mode else b'') + gdb_remote_proxy.make_packet(payload))
+
+  def run(self):
+    self.server.stats.add_connection(self.kind)
+    buffer = b''
+    try:
+      while True:
+        data = self.sock.recv(65536)
+        if not data:
+          break
+        packets, buffer = gdb_remote_proxy.split_packets(buffer + data)
+        for packet in packets:
+          if packet.startswith(b'$'):
+            reply = self.dispatch(packet)
+          elif packet == b'\x03':
+            reply = self.handle_interrupt()
+          else:
+            continue
+          if reply is not None:
+            self.send(reply)
+    except OSError:
+      pass
+    finally:
+      self.closed()
+      self.sock.close()
+
+  def dispatch(self, packet):
+    self.server.stats.add_packet(gdb_remote_proxy.packet_type(packet))
+    text = gdb_remote_proxy.payload_of(packet).decode('latin-1')
+    for prefix, method in self.HANDLERS:
+      if text.startswith(prefix):
+        return getattr(self, method)(text[len(prefix):])
+    return ''
+
+  def closed(self):
+    pass
+
+  def handle_interrupt(self):
+    return None
+
+  def handle_no_ack(self, args):
+    self.send('OK')
+    self.ack_mode = False
+    return None
+
+  def handle_host_info(self, args):
+    return _host_info()
+
+  def handle_ok(self, args):
+    return 'OK'
+
+  def handle_echo(self, args):
+    return 'qEcho' + args
+
+
+class _PlatformConnection(_Connection):
+  """The platform side: process listing, shell commands and gdb-server launch."""
+  kind = 'platform'
+  HANDLERS = (
+    ('QStartNoAckMode', 'handle_no_ack'),
+    ('qHostInfo', 'handle_host_info'),
+    ('qEcho', 'handle_echo'),
+    ('qGetWorkingDir', 'handle_working_dir'),
+    ('qPlatform_shell:', 'handle_shell'),
+    ('qfProcessInfo', 'handle_first_process'),
+    ('qsProcessInfo', 'handle_next_process'),
+    ('qProcessInfoPID:', 'handle_process_info_pid'),
+    ('qLaunchGDBServer', 'handle_launch_gdb_server'),
+    ('qKillSpawnedProcess', 'handle_ok'),
+    ('vFile:', 'handle_file'),
+  )
+
+  def __init__(self, server, sock, device):
+    super().__init__(server, sock, device)
+    self._listing = []
+
+  def handle_working_dir(self, args):
+    return _hex('/')
+
+  def handle_shell(self, args):
+    command = bytes.fromhex(args.split(',', 1)[0]).decode('utf-8', 'replace')
+    parts = command.split()
+    status, output = 127, f'{command}: not found\n'
+    if len(parts) == 2 and parts[0] == 'pidof':
+      pids = [str(pid) for pid, name in self.device.processes if name == parts[1]]
+      status, output = (0, ' '.join(pids) + '\n') if pids else (1, '')
+    return (f'F,{status:08x},{0:08x},'.encode() +
+            _escape_binary(output.encode())).decode('latin-1')
+
+  def _process_info(self, pid, name):
+    return (f'pid:{pid};ppid:1;uid:10123;gid:10123;euid:10123;egid:10123;'
+            f'name:{_hex(name)};triple:{_hex(TRIPLE)};')
+
+  def handle_first_process(self, args):
+    name_filter = None
+    for field in args.lstrip(':').split(';'):
+      key, _, value = field.partition(':')
+      if key == 'name' and value:
+        name_filter = bytes.fromhex(value).decode()
+    self._listing = [process for process in self.device.processes
+                     if name_filter is None or process[1] == name_filter]
+    return self.handle_next_process('')
+
+  def handle_next_process(self, args):
+    if not self._listing:
+      return 'E04'
+    pid, name = self._listing.pop(0)
+    return self._process_info(pid, name)
+
+  def handle_process_info_pid(self, args):
+    pid = int(args)
+    for process_pid, name in self.device.processes:
+      if process_pid == pid:
+        return self._process_info(pid, name)
+    return 'E01'
+
+  def handle_launch_gdb_server(self, args):
+    port, pid = self.server.launch_gdb_server(self.device)
+    return f'pid:{pid};port:{port};'
+
+  def handle_file(self, args):
+    # There are no files to serve; ENOENT for everything.
+    return 'F-1,2'
+
+
+class _GdbServerConnection(_Connection):
+  """The debug session of one attach to the device's app."""
+  kind = 'gdb-server'
+  HANDLERS = (
+    ('QStartNoAckMode', 'handle_no_ack'),
+    ('qSupported', 'handle_supported'),
+    ('qHostInfo', 'handle_host_info'),
+    ('qEcho', 'handle_echo'),
+    ('QThreadSuffixSupported', 'handle_ok'),
+    ('QListThreadsInStopReply', 'handle_ok'),
+    ('QEnableErrorStrings', 'handle_ok'),
+    ('QSetDetachOnError', 'handle_ok'),
+    ('QPassSignals', 'handle_ok'),
+    ('qSymbol', 'handle_ok'),
+    ('qProcessInfo', 'handle_process_info'),
+    ('qRegisterInfo', 'handle_register_info'),
+    ('qXfer:libraries-svr4:read::', 'handle_libraries'),
+    ('qMemoryRegionInfo:', 'handle_memory_region'),
+    ('qfThreadInfo', 'handle_first_thread'),
+    ('qsThreadInfo', 'handle_next_thread'),
+    ('qThreadStopInfo', 'handle_thread_stop_info'),
+    ('qC', 'handle_current_thread'),
+    ('vAttach;', 'handle_attach'),
+    ('vCont?', 'handle_vcont_actions'),
+    ('vCont;', 'handle_vcont'),
+    ('H', 'handle_ok'),
+    ('p', 'handle_read_register'),
+    ('g', 'handle_read_registers'),
+    ('m', 'handle_read_memory'),
+    ('c', 'handle_continue'),
+    ('s', 'handle_step'),
+    ('?', 'handle_stop_reason'),
+    ('D', 'handle_detach'),
+    ('k', 'handle_kill'),
+  )
+
+  def __init__(self, server, sock, device):
+    super().__init__(server, sock, device)
+    self.process = None
+    self.running = False
+    self.selected = None
+
+  def handle_supported(self, args):
+    return ('PacketSize=20000;QStartNoAckMode+;QThreadSuffixSupported+;'
+            'QListThreadsInStopReply+;qXfer:libraries-svr4:read+;qEcho+')
+
+  def handle_process_info(self, args):
+    if self.process is None:
+      return 'E01'
+    return (f'pid:{self.process.pid:x};parent-pid:1;real-uid:277b;real-gid:277b;'
+            f'effective-uid:277b;effective-gid:277b;triple:{_hex(TRIPLE)};'
+            f'ostype:linux;endian:little;ptrsize:8;')
+
+  def handle_register_info(self, args):
+    number = int(args, 16)
+    if number >= len(REGISTERS):
+      return 'E45'
+    name, dwarf, generic = REGISTERS[number]
+    info = (f'name:{name};bitsize:64;offset:{number * 8};encoding:uint;format:hex;'
+            f'set:General Purpose Registers;ehframe:{dwarf};dwarf:{dwarf};')
+    if generic:
+      info += f'generic:{generic};'
+    return info
+
+  def handle_libraries(self, args):
+    if self.process is None:
+      return 'E01'
+    offset, length = (int(value, 16) for value in args.split(','))
+    document = self.process.libraries_svr4()
+    chunk = document[offset:offset + length]
+    prefix = 'l' if offset + length >= len(document) else 'm'
+    return prefix + _escape_binary(chunk.encode()).decode('latin-1')
+
+  def handle_memory_region(self, args):
+    if self.process is None:
+      return 'E01'
+    address = int(args, 16)
+    region = self.process.region_at(address)
+    if region is None:
+      following = self.process.next_region(address)
+      end = following.start if following else 1 << 64
+      return f'start:{address:x};size:{end - address:x};'
+    return (f'start:{region.start:x};size:{region.size:x};'
+            f'permissions:{region.permissions};name:{_hex(region.name)};')
+
+  def _thread_from(self, args):
+    """Returns the thread named by a `;thread:<tid>;` suffix, or the selected one."""
+    for field in args.split(';'):
+      if field.startswith('thread:'):
+        return self.process.thread(int(field[len('thread:'):], 16))
+    return self.selected
+
+  def handle_first_thread(self, args):
+    if self.process is None:
+      return 'l'
+    return 'm' + ','.join(f'{thread.tid:x}' for thread in self.process.threads)
+
+  def handle_next_thread(self, args):
+    return 'l'
+
+  def handle_current_thread(self, args):
+    if self.selected is None:
+      return 'E01'
+    return f'QC{self.selected.tid:x}'
+
+  def _stop_reply(self, thread, signal_number, reason):
+    threads = self.process.threads
+    reply = (f'T{signal_number:02x}thread:{thread.tid:x};hexname:{_hex(thread.name)};'
+             f'threads:{",".join(f"{t.tid:x}" for t in threads)};'
+             f'thread-pcs:{",".join(f"{t.pc:x}" for t in threads)};')
+    for name in _EXPEDITED:
+      number = _REGISTER_NUMBERS[name]
+      reply += f'{number:02x}:{struct.pack("<Q", thread.registers[number]).hex()};'
+    if reason:
+      reply += f'reason:{reason};'
+    return reply
+
+  def handle_attach(self, args):
+    pid = int(args, 16)
+    process = self.device.app
+    if pid != process.pid:
+      return 'E01'
+    with process.lock:
+      if process.attached:
+        return 'E01'
+      process.attached = True
+    self.process = process
+    self.selected = process.threads[0]
+    self.server.stats.add_attach()
+    return self._stop_reply(self.selected, _SIGSTOP, 'signal')
+
+  def handle_stop_reason(self, args):
+    if self.process is None:
+      return 'W00'
+    return self._stop_reply(self.selected, _SIGSTOP, 'signal')
+
+  def handle_thread_stop_info(self, args):
+    thread = self.process and self.process.thread(int(args, 16))
+    if thread is None:
+      return 'E01'
+    if thread is self.selected:
+      return self._stop_reply(thread, _SIGSTOP, 'signal')
+    return self._stop_reply(thread, 0, None)
+
+  def handle_vcont_actions(self, args):
+    return 'vCont;c;C;s;S'
+
+  def handle_vcont(self, args):
+    action = args.split(';', 1)[0]
+    if action.startswith(('s', 'S')):
+      return self.handle_step(args)
+    return self.handle_continue(args)
+
+  def handle_continue(self, args):
+    self.running = True
+    # The reply is the stop reply sent when LLDB interrupts.
+    return None
+
+  def handle_step(self, args):
+    # The synthetic threads never move.
+    return self._stop_reply(self.selected, _SIGTRAP, 'trace')
+
+  def handle_interrupt(self):
+    self.server.stats.add_packet('\\x03')
+    if not self.running or self.process is None:
+      return None
+    self.running = False
+    return self._stop_reply(self.selected, _SIGSTOP, 'signal')
+
+  def handle_read_register(self, args):
+    number_text, _, suffix = args.partition(';')
+    number = int(number_text, 16)
+    thread = self._thread_from(suffix)
+    if thread is None or number >= len(REGISTERS):
+      return 'E01'
+    return struct.pack('<Q', thread.registers[number]).hex()
+
+  def handle_read_registers(self, args):
+    thread = self._thread_from(args)
+    if thread is None:
+      return 'E01'
+    return b''.join(struct.pack('<Q', value) for value in thread.registers).hex()
+
+  def handle_read_memory(self, args):
+    if self.process is None:
+      return 'E01'
+    address, length = (int(value, 16) for value in args.split(','))
+    data = self.process.read_memory(address, length)
+    if not data:
+      return 'E14'
+    return data.hex()
+
+  def handle_detach(self, args):
+    self.send('OK')
+    self.closed()
+    return None
+
+  def handle_kill(self, args):
+    self.closed()
+    return 'X09'
+
+  def closed(self):
+    if self.process is not None:
+      with self.process.lock:
+        self.process.attached = False
+      self.process = None
+
+
+class StubServer:
+  """
+  Serves the platform port of every device, and a gdb-server port per
+  attach, from one accept loop.
+  """
+
+  def __init__(self, devices, host='127.0.0.1'):
+    self.devices = devices
+    self.host = host
+    self.stats = Stats()
+    self._selector = selectors.DefaultSelector()
+    self._lock = threading.Lock()
+    self.ports = {}
+
+  def _listen(self, device, connection_class, one_shot=False):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((self.host, 0))
+    listener.listen(64)
+    listener.setblocking(False)
+    with self._lock:
+      self._selector.register(listener, selectors.EVENT_READ,
+                              (device, connection_class, one_shot))
+    return listener.getsockname()[1]
+
+  def start(self):
+    for device in self.devices:
+      self.ports[device.name] = self._listen(device, _PlatformConnection)
+    threading.Thread(target=self._accept_loop, daemon=True).start()
+
+  def launch_gdb_server(self, device):
+    """Opens a port for one debug session; returns (port, pid)."""
+    port = self._listen(device, _GdbServerConnection, one_shot=True)
+    with self._lock:
+      device.next_gdb_server_pid += 1
+      return port, device.next_gdb_server_pid
+
+  def _accept_loop(self):
+    while True:
+      for key, _ in self._selector.select(timeout=0.5):
+        device, connection_class, one_shot = key.data
+        try:
+          sock, _ = key.fileobj.accept()
+        except BlockingIOError:
+          continue
+        if one_shot:
+          with self._lock:
+            self._selector.unregister(key.fileobj)
+          key.fileobj.close()
+        sock.setblocking(True)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = connection_class(self, sock, device)
+        threading.Thread(target=connection.run, daemon=True).start()
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(
+    description="Serve synthetic devices over the lldb-server protocols.",
+    formatter_class=argparse.RawTextHelpFormatter
+  )
+  parser.add_argument('--devices', type=int, default=1, help="How many devices to serve.")
+  parser.add_argument('--app-name', default='com.example.hellojni',
+                      help="The process name of the app to attach to.")
+  parser.add_argument('--threads', type=int, default=8, help="Threads of the app.")
+  parser.add_argument('--modules', type=int, default=16, help="Shared libraries of the app.")
+  parser.add_argument('--regions', type=int, default=32,
+                      help="Extra heap regions of the app.")
+  parser.add_argument('--stack-depth', type=int, default=16,
+                      help="Frames on every thread's stack.")
+  parser.add_argument('--processes', type=int, default=30,
+                      help="Processes in each device's listing, including the app.")
+  parser.add_argument('--devices-json', default=None,
+                      help="Write the name and platform port of every device to this file.")
+  parser.add_argument('--summary-json', default=None,
+                      help="Write the summary to this file when the stub is stopped.")
+  return parser.parse_args()
+
+
+def main():
+  args = parse_args()
+  devices = [Device(i, args.app_name, args.processes, threads=args.threads,
+                    modules=args.modules, regions=args.regions, depth=args.stack_depth)
+             for i in range(args.devices)]
+  server = StubServer(devices)
+  server.start()
+  if args.devices_json:
+    with open(args.devices_json, 'w') as f:
+      json.dump([{'name': name, 'port': port} for name, port in server.ports.items()], f)
+  print(f'Serving {len(devices)} stub devices', flush=True)
+
+  stopped = threading.Event()
+  signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+  try:
+    stopped.wait()
+  except KeyboardInterrupt:
+    pass
+  summary = server.stats.summary()
+  if args.summary_json:
+    with open(args.summary_json, 'w') as f:
+      json.dump(summary, f, indent=2)
+  print(f'{summary["attaches"]} attaches, {summary["packets"]} packets, connections: '
+        f'{summary["connections"]}', flush=True)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,161 @@
+"""
+Timing and result records for test.py runs.
+
+Each run of the debug session pipeline produces one RunRecord: a set of
+metadata (device serial, ABI, SDK, llvm-project SHA, ...) plus the wall time of
+every pipeline phase, measured with a monotonic clock. Records are appended as
+one JSON object per line, so a results file can accumulate runs over time and
+be compared across llvm-project revisions.
+"""
+import contextlib
+import json
+import os
+import subprocess
+import time
+
+import trace_events
+
+
+class RunRecord:
+  """Collects phase timings and metadata for a single harness run."""
+
+  def __init__(self, **metadata):
+    self.metadata = dict(metadata)
+    self.phases = []
+    self.status = 'running'
+    self.error = None
+    self.started_at = time.time()
+    self._start = time.monotonic()
+    self.total_seconds = None
+    # Benchmark iterations and summary, for benchmark runs.
+    self.benchmark = None
+
+  @contextlib.contextmanager
+  def phase(self, name):
+    """
+    Times the enclosed block and records it as a phase named `name`.
+
+    The phase is recorded even if the block raises, and is marked as failed.
+    It also shows up as a span in the trace timeline, if tracing is enabled.
+    """
+    start = time.monotonic()
+    ok = False
+    try:
+      with trace_events.span(name, cat='phase'):
+        yield
+      ok = True
+    finally:
+      self.phases.append({
+        'name': name,
+        'seconds': time.monotonic() - start,
+        'ok': ok,
+      })
+
+  def finish(self, status, error=None):
+    """Marks the run as finished with the given status."""
+    self.status = status
+    self.error = error
+    self.total_seconds = time.monotonic() - self._start
+
+  def to_dict(self):
+    result = {
+      'metadata': self.metadata,
+      'started_at': self.started_at,
+      'status': self.status,
+      'error': self.error,
+      'total_seconds': self.total_seconds,
+      'phases': self.phases,
+    }
+    if self.benchmark is not None:
+      result['benchmark'] = self.benchmark
+    return result
+
+  def append_json(self, path):
+    """Appends this record as a single JSON line to `path`."""
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    with open(path, 'a') as f:
+      f.write(json.dumps(self.to_dict(), sort_keys=True) + '\n')
+
+
+def percentile(sorted_values, percent):
+  """Returns the `percent` percentile of sorted values, interpolated linearly."""
+  if not sorted_values:
+    return None
+  position = (len(sorted_values) - 1) * percent / 100
+  lower = int(position)
+  upper = min(lower + 1, len(sorted_values) - 1)
+  fraction = position - lower
+  return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+def summarize(values):
+  """Returns min/median/p90/p99/max/mean of a list of durations."""
+  ordered = sorted(values)
+  return {
+    'count': len(ordered),
+    'min': ordered[0],
+    'median': percentile(ordered, 50),
+    'p90': percentile(ordered, 90),
+    'p99': percentile(ordered, 99),
+    'max': ordered[-1],
+    'mean': sum(ordered) / len(ordered),
+  }
+
+
+def summarize_samples(samples):
+  """
+  Summarizes per-phase durations over benchmark iterations.
+
+  Args:
+    samples: A list of {phase name: seconds} dicts, one per iteration.
+
+  Returns:
+    A {phase name: summarize() result} dict, in first-seen phase order.
+  """
+  by_phase = {}
+  for sample in samples:
+    for name, seconds in sample.items():
+      by_phase.setdefault(name, []).append(seconds)
+  return {name: summarize(values) for name, values in by_phase.items()}
+
+
+def write_benchmark_json(path, records):
+  """
+  Writes the benchmark results of `records` to `path`.
+
+  The file holds one entry per device run, with its metadata, the raw
+  per-iteration phase timings and their summary. Two such files, e.g. from
+  two lldb builds, can be compared with bench_compare.py.
+  """
+  directory = os.path.dirname(path)
+  if directory:
+    os.makedirs(directory, exist_ok=True)
+  runs = [{'metadata': record.metadata, **record.benchmark}
+          for record in records if record.benchmark]
+  with open(path, 'w') as f:
+    json.dump({'runs': runs}, f, indent=2, sort_keys=True)
+
+
+def get_llvm_project_sha(repo_dir):
+  """Returns the checked-out commit of the llvm-project submodule, if known."""
+  llvm_project_dir = os.path.join(repo_dir, 'llvm-project')
+  try:
+    result = subprocess.run(
+      ['git', '-C', llvm_project_dir, 'rev-parse', 'HEAD'],
+      capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    pass
+
+  # The test job does not check out submodules, but the recorded gitlink of
+  # the parent repo still identifies the llvm-project revision under test.
+  try:
+    result = subprocess.run(
+      ['git', '-C', repo_dir, 'ls-files', '-s', 'llvm-project'],
+      capture_output=True, text=True, check=True)
+    parts = result.stdout.split()
+    return parts[1] if len(parts) > 1 else None
+  except (OSError, subprocess.CalledProcessError):
+    return None
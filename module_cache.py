@@ -0,0 +1,297 @@
+"""
+Host-side cache of device system libraries, keyed by build fingerprint.
+
+When LLDB attaches to an app it needs the app's dependent system libraries
+(libc, libart, linker64, ...). Without a local copy it downloads each one
+from the device over USB. Devices that share an `ro.build.fingerprint` run
+byte-identical system images, so one copy of those libraries can serve every
+such device and every later session.
+
+Layout of the cache directory:
+
+  <root>/stats.json                     cumulative hit/miss/eviction counts
+  <root>/lldb/                          LLDB's own platform module cache
+  <root>/lldb/last_used                 touched on every prewarm
+  <root>/<key>/fingerprint.txt          the build fingerprint of this entry
+  <root>/<key>/last_used                touched on every use, for LRU eviction
+  <root>/<key>/sysroot/<device path>    pulled libraries, e.g. sysroot/apex/...
+
+Each session sets its entry's sysroot as the SDK root of its own platform,
+and as image search path remappings of its target, so LLDB picks up the
+local copies instead of downloading them. Sessions against devices of
+different builds can therefore run side by side in one process.
+
+LLDB's platform module cache directory is a process-wide setting, so all
+sessions share <root>/lldb/. LLDB files modules there by UUID, which keeps
+different builds apart. It counts towards the size limit and is evicted as
+a whole, like an entry, once it is the least recently used; LLDB downloads
+the modules it needs into it again.
+"""
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import adb_client
+
+
+# Top-level device directories that libraries are mapped from.
+SYSTEM_ROOTS = ('/apex', '/system', '/system_ext', '/vendor', '/product')
+
+# Libraries every app process maps, pre-warmed even when the app's own
+# memory map cannot be read. '{lib}' is lib64 or lib, '{bits}' 64 or 32 and
+# '{bits_suffix}' 64 or empty.
+CORE_LIBRARIES = (
+  '/system/bin/app_process{bits}',
+  '/apex/com.android.runtime/bin/linker{bits_suffix}',
+  '/apex/com.android.runtime/{lib}/bionic/libc.so',
+  '/apex/com.android.runtime/{lib}/bionic/libm.so',
+  '/apex/com.android.runtime/{lib}/bionic/libdl.so',
+  '/apex/com.android.art/{lib}/libart.so',
+  '/system/{lib}/libandroid_runtime.so',
+  '/system/{lib}/libbinder.so',
+  '/system/{lib}/libutils.so',
+  '/system/{lib}/liblog.so',
+  '/system/{lib}/libc++.so',
+)
+
+
+def core_libraries(android_abi):
+  """Returns CORE_LIBRARIES for the bitness of `android_abi`."""
+  is_64_bit = android_abi in ('arm64-v8a', 'x86_64')
+  return [
+    path.format(lib='lib64' if is_64_bit else 'lib',
+                bits='64' if is_64_bit else '32',
+                bits_suffix='64' if is_64_bit else '')
+    for path in CORE_LIBRARIES
+  ]
+
+
+class CacheEntry:
+  """The cached files for one build fingerprint."""
+
+  def __init__(self, fingerprint, directory, lldb_cache_dir):
+    self.fingerprint = fingerprint
+    self.directory = directory
+    self.sysroot = os.path.join(directory, 'sysroot')
+    # Shared by every entry, see the module docstring.
+    self.lldb_cache_dir = lldb_cache_dir
+
+  def image_search_paths(self):
+    """Returns (device prefix, local directory) pairs present in the sysroot."""
+    return [(root, os.path.join(self.sysroot, root.lstrip('/')))
+            for root in SYSTEM_ROOTS
+            if os.path.isdir(os.path.join(self.sysroot, root.lstrip('/')))]
+
+
+def _directory_size(path):
+  total = 0
+  seen = set()
+  for directory, _, files in os.walk(path):
+    for name in files:
+      try:
+        st = os.lstat(os.path.join(directory, name))
+      except OSError:
+        continue
+      # LLDB hard links the modules in its cache; count each file once.
+      if (st.st_dev, st.st_ino) not in seen:
+        seen.add((st.st_dev, st.st_ino))
+        total += st.st_size
+  return total
+
+
+def _lock_file(path, blocking=True):
+  """
+  Opens `path` and takes an exclusive flock on it.
+
+  Returns:
+    The open file, which holds the lock until it is closed. None if `path`
+    was removed or replaced before the lock was taken, or if it is locked
+    and `blocking` is False.
+  """
+  try:
+    lock_file = open(path, 'a+')
+  except FileNotFoundError:
+    return None
+  try:
+    fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    # A lock taken on a file that was removed or replaced in the meantime
+    # protects nothing.
+    if os.fstat(lock_file.fileno()).st_ino != os.stat(path).st_ino:
+      raise FileNotFoundError(path)
+  except (BlockingIOError, FileNotFoundError):
+    lock_file.close()
+    return None
+  return lock_file
+
+
+def _lock_entry(entry, blocking=True):
+  """
+  Takes the exclusive lock of a cache entry, see ModuleCache._locked().
+
+  Eviction removes the lock file along with the entry, so None is also
+  returned if the entry was evicted before the lock was taken.
+  """
+  return _lock_file(os.path.join(entry, '.lock'), blocking)
+
+
+def parse_mapped_libraries(maps):
+  """Returns the system libraries and executables in /proc/<pid>/maps text."""
+  paths = []
+  seen = set()
+  for line in maps.splitlines():
+    parts = line.split(None, 5)
+    if len(parts) < 6:
+      continue
+    path = parts[5].strip()
+    if path in seen or not path.startswith(tuple(root + '/' for root in SYSTEM_ROOTS)):
+      continue
+    if path.endswith('.so') or '/bin/' in path:
+      seen.add(path)
+      paths.append(path)
+  return paths
+
+
+class ModuleCache:
+  """A size-bounded, LRU-evicted cache of device libraries per fingerprint."""
+
+  def __init__(self, root, max_bytes):
+    self.root = os.path.expanduser(root)
+    self.max_bytes = max_bytes
+    self.lldb_cache_dir = os.path.join(self.root, 'lldb')
+    os.makedirs(self.root, exist_ok=True)
+
+  def entry_dir(self, fingerprint):
+    key = hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(self.root, key)
+
+  def entry(self, fingerprint):
+    return CacheEntry(fingerprint, self.entry_dir(fingerprint), self.lldb_cache_dir)
+
+  @contextlib.contextmanager
+  def _locked(self, fingerprint):
+    """Serializes work on one entry, and its eviction, across threads and processes."""
+    with self._locked_directory(self.entry_dir(fingerprint)) as entry:
+      yield entry
+
+  @contextlib.contextmanager
+  def _locked_directory(self, entry):
+    while True:
+      os.makedirs(entry, exist_ok=True)
+      lock_file = _lock_entry(entry)
+      if lock_file is not None:
+        break
+    with lock_file:
+      yield entry
+
+  def prewarm(self, serial, fingerprint, remote_paths, client=None):
+    """
+    Makes sure every path in `remote_paths` is in the sysroot for `fingerprint`.
+
+    Missing files are pulled from the device; files already cached (e.g. by
+    another device with the same build) count as hits. Files the device
+    refuses to hand out are skipped.
+
+    Returns:
+      A (CacheEntry, stats) tuple; stats is a dict with the hits, misses,
+      skipped files and bytes downloaded.
+    """
+    client = client or adb_client.get_default_client()
+    stats = {'hits': 0, 'misses': 0, 'skipped': 0, 'bytes_downloaded': 0}
+    with self._locked(fingerprint) as entry:
+      with open(os.path.join(entry, 'fingerprint.txt'), 'w') as f:
+        f.write(fingerprint + '\n')
+      sysroot = self.entry(fingerprint).sysroot
+      for remote_path in remote_paths:
+        local_path = os.path.join(sysroot, remote_path.lstrip('/'))
+        if os.path.exists(local_path):
+          stats['hits'] += 1
+          continue
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        try:
+          stats['bytes_downloaded'] += client.pull(serial, remote_path, local_path)
+          stats['misses'] += 1
+        except adb_client.AdbSyncError:
+          stats['skipped'] += 1
+      self._touch(entry)
+    # The session will use LLDB's cache along with the entry.
+    with self._locked_directory(self.lldb_cache_dir) as lldb_cache_dir:
+      self._touch(lldb_cache_dir)
+    self._record_stats(stats)
+    self.evict(keep=fingerprint)
+    return self.entry(fingerprint), stats
+
+  def _touch(self, entry):
+    with open(os.path.join(entry, 'last_used'), 'w') as f:
+      f.write(f'{time.time()}\n')
+
+  def _last_used(self, entry):
+    try:
+      with open(os.path.join(entry, 'last_used')) as f:
+        return float(f.read().strip())
+    except (OSError, ValueError):
+      return 0.0
+
+  def evict(self, keep=None):
+    """
+    Removes least recently used entries until the cache fits in max_bytes.
+
+    LLDB's module cache directory competes with the entries. The entry for
+    `keep` is never removed, even if it alone is too large. Entries that are
+    locked, e.g. being prewarmed by another device, are skipped, as are
+    entries used since they were listed.
+    """
+    keep_entry = self.entry_dir(keep) if keep else None
+    entries = []
+    for name in os.listdir(self.root):
+      entry = os.path.join(self.root, name)
+      if os.path.isdir(entry):
+        entries.append((self._last_used(entry), _directory_size(entry), entry))
+    total = sum(size for _, size, _ in entries)
+    evicted = 0
+    for last_used, size, entry in sorted(entries):
+      if total <= self.max_bytes:
+        break
+      if entry == keep_entry:
+        continue
+      lock_file = _lock_entry(entry, blocking=False)
+      if lock_file is None:
+        continue
+      with lock_file:
+        if self._last_used(entry) != last_used:
+          continue
+        shutil.rmtree(entry, ignore_errors=True)
+      total -= size
+      evicted += 1
+    if evicted:
+      self._record_stats({'evictions': evicted})
+    return evicted
+
+  def _record_stats(self, delta):
+    path = os.path.join(self.root, 'stats.json')
+    # Updates replace stats.json; a lock on a replaced file is retaken.
+    lock_file = None
+    while lock_file is None:
+      lock_file = _lock_file(path)
+    with lock_file:
+      try:
+        lock_file.seek(0)
+        stats = json.load(lock_file)
+      except ValueError:
+        stats = {}
+      for key, value in delta.items():
+        stats[key] = stats.get(key, 0) + value
+      with open(path + '.tmp', 'w') as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
+      os.replace(path + '.tmp', path)
+
+  def stats(self):
+    """Returns the cumulative hit/miss/eviction counts of the cache."""
+    try:
+      with open(os.path.join(self.root, 'stats.json')) as f:
+        return json.load(f)
+    except (OSError, ValueError):
+      return {}
@@ -0,0 +1,158 @@
+"""
+Runs commands as an app's user with as few `run-as` launches as possible.
+
+Every `adb shell run-as <package> <cmd>` costs an adb round trip plus the
+start-up of run-as itself. run_batch() instead runs a whole list of commands
+in one `run-as <package> sh -c <script>` invocation. The script brackets each
+command's output with unique marker lines on both stdout and stderr, so the
+output and exit code of every command can be split back out afterwards.
+
+RunAsShell keeps a single `run-as <package> sh` open and feeds it commands
+over stdin, for sessions that issue commands over a longer period of time.
+Commands run in the same shell, so state like the working directory carries
+over between them.
+"""
+import re
+import shlex
+import uuid
+
+import adb_client
+
+
+class CommandResult:
+  """The outcome of one command run through run-as."""
+
+  def __init__(self, command, returncode, stdout, stderr):
+    self.command = command
+    self.returncode = returncode
+    self.stdout = stdout
+    self.stderr = stderr
+
+  def check(self):
+    """Raises AdbError if the command did not exit successfully."""
+    if self.returncode != 0:
+      raise adb_client.AdbError(
+        f"run-as command '{self.command}' failed with exit code {self.returncode}: "
+        f"{self.stderr.decode('utf-8', 'replace').strip()}")
+    return self
+
+  def __repr__(self):
+    return f'CommandResult({self.command!r}, returncode={self.returncode})'
+
+
+def _new_token():
+  return f'__run_as_{uuid.uuid4().hex}'
+
+
+def _command_script(token, index, command, subshell, mark_stderr=True):
+  """Returns the script fragment that runs one command between markers."""
+  body = f'( {command}\n)' if subshell else f'{{ {command}\n}}'
+  begin = f"printf '%s\\n' '{token}:begin:{index}'"
+  end = f"printf '\\n%s:end:{index}:%d\\n' '{token}' ${token}_rc"
+  if mark_stderr:
+    begin += f'; {begin} >&2'
+    end += f'; {end} >&2'
+  return f'{begin}\n{body}\n{token}_rc=$?\n{end}\n'
+
+
+def _split_output(token, output):
+  """Maps command index -> (output, exit code) from marked-up output."""
+  results = {}
+  pattern = re.compile(
+    re.escape(token).encode('utf-8') + rb':begin:(\d+)\n(.*?)\n' +
+    re.escape(token).encode('utf-8') + rb':end:(\d+):(\d+)\n',
+    re.DOTALL)
+  for match in pattern.finditer(output):
+    index = int(match.group(1))
+    results[index] = (match.group(2), int(match.group(4)))
+  return results
+
+
+def run_batch(serial, package, commands, stop_on_error=True, client=None):
+  """
+  Runs `commands` in a single run-as shell and returns a CommandResult each.
+
+  Each command runs in its own subshell, so `cd` or `exit` in one command
+  does not affect the others. With stop_on_error, the batch stops at the
+  first failing command and the remaining commands have no result.
+
+  Devices without shell_v2 merge stderr into stdout, so there each
+  command's stderr is part of its stdout and its stderr is empty.
+  """
+  client = client or adb_client.get_default_client()
+  # Stderr markers would end up in the middle of the merged output.
+  mark_stderr = 'shell_v2' in client.features(serial)
+  token = _new_token()
+  script = ''
+  for index, command in enumerate(commands):
+    script += _command_script(token, index, command, subshell=True, mark_stderr=mark_stderr)
+    if stop_on_error:
+      script += f'[ ${token}_rc -eq 0 ] || exit ${token}_rc\n'
+
+  result = client.shell(serial, ['run-as', package, 'sh', '-c', shlex.quote(script)])
+  stdout = _split_output(token, result.stdout)
+  stderr = _split_output(token, result.stderr)
+
+  results = []
+  for index, command in enumerate(commands):
+    if index not in stdout:
+      break
+    out, returncode = stdout[index]
+    err = stderr.get(index, (b'', returncode))[0]
+    results.append(CommandResult(command, returncode, out, err))
+  if commands and not results:
+    # run-as itself failed, e.g. because the package is not debuggable. The
+    # legacy shell has no exit code and puts the error message on stdout.
+    raise adb_client.AdbError(
+      f'run-as {package} failed with exit code {result.returncode}: '
+      f"{(result.stderr or result.stdout).decode('utf-8', 'replace').strip()}")
+  return results
+
+
+class RunAsShell:
+  """A persistent interactive `run-as <package> sh` on a device."""
+
+  def __init__(self, serial, package, client=None):
+    self.serial = serial
+    self.package = package
+    client = client or adb_client.get_default_client()
+    self._process = client.shell_popen(serial, ['run-as', package, 'sh'], capture=True)
+    self._token = _new_token()
+    self._next_index = 0
+
+  def run(self, command, timeout_seconds=None):
+    """Runs one command in the shell and returns its CommandResult."""
+    index = self._next_index
+    self._next_index += 1
+    script = _command_script(self._token, index, command, subshell=False)
+    self._process.write_stdin(script.encode('utf-8'))
+
+    streams = {}
+    for stream in ('stdout', 'stderr'):
+      # The end marker is unique per command; read_until() needs a literal, so
+      # wait for the fixed prefix and then the rest of the line.
+      prefix = f'\n{self._token}:end:{index}:'.encode('utf-8')
+      data = self._process.read_until(prefix, stream, timeout_seconds)
+      data += self._process.read_until(b'\n', stream, timeout_seconds)
+      streams[stream] = data
+
+    parsed = _split_output(self._token, streams['stdout'])
+    if index not in parsed:
+      raise adb_client.AdbError(f'Malformed output from run-as shell for: {command}')
+    out, returncode = parsed[index]
+    err = _split_output(self._token, streams['stderr']).get(index, (b'', returncode))[0]
+    return CommandResult(command, returncode, out, err)
+
+  def close(self):
+    try:
+      self._process.write_stdin(b'exit\n')
+      self._process.close_stdin()
+      self._process.wait(5)
+    except Exception:
+      self._process.terminate()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
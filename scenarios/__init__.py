@@ -0,0 +1,16 @@
+"""
+Debugging scenarios run against a shared session, see test.py --scenarios.
+
+Every scenario is a Scenario subclass in its own module of this package,
+registered by name with @register. To add one, create a module next to the
+existing ones and import it below.
+"""
+from scenarios.base import (RESUME_TIMEOUT_SECONDS, SCENARIOS, Scenario, ScenarioError,
+                            ScenarioTimeout, register, resume_and_wait, run_with_timeout)
+
+from scenarios import backtrace
+from scenarios import breakpoint
+from scenarios import expression
+from scenarios import memory_read
+from scenarios import memory_throughput
+from scenarios import step
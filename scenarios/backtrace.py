@@ -0,0 +1,18 @@
+import backtrace
+import trace_events
+from scenarios.base import Scenario, ScenarioError, register
+
+
+@register
+class Backtrace(Scenario):
+  """Unwinds every thread and checks that each has at least one frame."""
+  name = 'backtrace'
+  timeout_seconds = 30
+
+  def run(self, session):
+    with trace_events.span('backtrace.collect', cat='lldb'):
+      backtraces = backtrace.collect(session.process)
+    empty = [thread['tid'] for thread in backtraces['threads'] if not thread['frames']]
+    if empty:
+      raise ScenarioError(f'Threads without frames: {empty}')
+    return backtrace.summarize(backtraces)
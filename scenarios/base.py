@@ -0,0 +1,126 @@
+"""
+The Scenario base class, the scenario registry and helpers for scenarios.
+"""
+import threading
+import time
+
+import lldb
+
+# How long a scenario lets the process run before stopping it again.
+RESUME_TIMEOUT_SECONDS = 5
+
+# Scenario name -> Scenario subclass, filled in by @register.
+SCENARIOS = {}
+
+
+class ScenarioError(Exception):
+  """A scenario check failed."""
+
+
+class Scenario:
+  """
+  One check run against an attached, stopped app in a test.DebugSession.
+
+  Subclasses set `name` and implement run(). setup() and teardown() are
+  optional; teardown() runs whenever setup() succeeded, even if run() failed.
+  All three run on a worker thread. A scenario that takes longer than
+  `timeout_seconds` in total is abandoned there and reported as timed out,
+  and the harness starts a new session for the next scenario.
+  """
+  name = None
+  timeout_seconds = 30
+
+  def setup(self, session):
+    pass
+
+  def run(self, session):
+    """
+    Runs the check.
+
+    Returns:
+      A dict of details about what the scenario observed.
+
+    Raises:
+      ScenarioError: If the check failed.
+    """
+    raise NotImplementedError
+
+  def teardown(self, session):
+    pass
+
+
+def register(scenario_class):
+  """Class decorator that adds a Scenario to SCENARIOS under its name."""
+  SCENARIOS[scenario_class.name] = scenario_class
+  return scenario_class
+
+
+class ScenarioTimeout(Exception):
+  """A scenario did not finish within its timeout_seconds."""
+
+
+def run_with_timeout(function, timeout_seconds):
+  """
+  Runs `function` on a worker thread and waits for it at most `timeout_seconds`.
+
+  A scenario can hang where interrupting LLDB does not reach it, e.g. in a
+  Python wait loop. Python threads cannot be killed, so a worker that misses
+  the deadline is abandoned as a daemon thread; the caller must not reuse
+  anything it was working with.
+
+  Returns:
+    What `function` returned.
+
+  Raises:
+    ScenarioTimeout: If `function` did not return in time.
+    Whatever `function` raised.
+  """
+  outcome = {}
+
+  def work():
+    try:
+      outcome['result'] = function()
+    except BaseException as e:
+      outcome['error'] = e
+
+  worker = threading.Thread(target=work, name='scenario', daemon=True)
+  worker.start()
+  worker.join(timeout_seconds)
+  if worker.is_alive():
+    raise ScenarioTimeout(f'Timed out after {timeout_seconds} seconds')
+  if 'error' in outcome:
+    raise outcome['error']
+  return outcome['result']
+
+
+def resume_and_wait(session, resume, timeout_seconds=RESUME_TIMEOUT_SECONDS):
+  """
+  Resumes the process with `resume()` and waits for it to stop on its own.
+
+  The debugger is switched to asynchronous mode for the duration, so a
+  thread that never stops cannot hang the session: at the deadline the
+  process is interrupted instead.
+
+  Returns:
+    True if the process stopped by itself, False if it had to be interrupted.
+  """
+  process = session.process
+  listener = session.debugger.GetListener()
+  broadcaster = process.GetBroadcaster()
+  event = lldb.SBEvent()
+  session.debugger.SetAsync(True)
+  try:
+    resume()
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+      if listener.WaitForEventForBroadcasterWithType(
+          1, broadcaster, lldb.SBProcess.eBroadcastBitStateChanged, event):
+        state = lldb.SBProcess.GetStateFromEvent(event)
+        if state == lldb.eStateStopped and not lldb.SBProcess.GetRestartedFromEvent(event):
+          return True
+        if state in (lldb.eStateExited, lldb.eStateDetached, lldb.eStateCrashed):
+          raise ScenarioError(f'Process {lldb.SBDebugger.StateAsCString(state)} while resumed')
+    process.Stop()
+    return False
+  finally:
+    session.debugger.SetAsync(False)
@@ -0,0 +1,43 @@
+import lldb
+
+import trace_events
+from scenarios.base import Scenario, ScenarioError, register, resume_and_wait
+
+# Platform name of the target -> the function to break on there.
+BREAKPOINT_FUNCTIONS = {
+  # Every thread of an idle app waits in epoll, so a breakpoint here resolves
+  # in any app and is hit as soon as any looper wakes up.
+  'remote-android': '__epoll_pwait',
+  # glibc has no __epoll_pwait; every thread of host_fixture.c calls this
+  # once a second.
+  'remote-linux': 'fixture_nap',
+}
+
+
+@register
+class Breakpoint(Scenario):
+  """
+  Sets a breakpoint on a function every thread of the target calls, continues
+  until it is hit, and removes it.
+  """
+  name = 'breakpoint'
+  timeout_seconds = 20
+
+  def setup(self, session):
+    self.function = BREAKPOINT_FUNCTIONS[session.remote.platform_name]
+    self.bp = session.target.BreakpointCreateByName(self.function)
+
+  def run(self, session):
+    if not self.bp.IsValid() or self.bp.GetNumLocations() == 0:
+      raise ScenarioError(f'Breakpoint on {self.function} has no locations')
+    with trace_events.span('SBProcess.Continue', cat='lldb'):
+      stopped = resume_and_wait(session, session.process.Continue)
+    hit = stopped and any(
+        thread.GetStopReason() == lldb.eStopReasonBreakpoint
+        for thread in session.process)
+    session.log(f'Breakpoint on {self.function}: {self.bp.GetNumLocations()} locations, '
+                f'{"hit" if hit else "not hit"}')
+    return {'locations': self.bp.GetNumLocations(), 'hit': hit}
+
+  def teardown(self, session):
+    session.target.BreakpointDelete(self.bp.GetID())
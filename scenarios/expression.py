@@ -0,0 +1,23 @@
+import lldb
+
+import trace_events
+from scenarios.base import RESUME_TIMEOUT_SECONDS, Scenario, ScenarioError, register
+
+
+@register
+class Expression(Scenario):
+  """Evaluates an expression that calls into the process."""
+  name = 'expression'
+  timeout_seconds = 30
+
+  def run(self, session):
+    options = lldb.SBExpressionOptions()
+    options.SetTimeoutInMicroSeconds(RESUME_TIMEOUT_SECONDS * 1000000)
+    with trace_events.span('SBTarget.EvaluateExpression', cat='lldb'):
+      value = session.target.EvaluateExpression('(int)getpid()', options)
+    if value.GetError().Fail():
+      raise ScenarioError(f'Expression failed: {value.GetError().GetCString()}')
+    pid = value.GetValueAsSigned()
+    if pid != session.process.GetProcessID():
+      raise ScenarioError(f'getpid() returned {pid}, expected {session.process.GetProcessID()}')
+    return {'value': pid}
@@ -0,0 +1,25 @@
+import time
+
+import lldb
+
+import trace_events
+from scenarios.base import Scenario, ScenarioError, register
+
+
+@register
+class MemoryRead(Scenario):
+  """Reads a page of the selected thread's stack."""
+  name = 'memory_read'
+  timeout_seconds = 10
+  size = 4096
+
+  def run(self, session):
+    sp = session.process.GetSelectedThread().GetFrameAtIndex(0).GetSP()
+    error = lldb.SBError()
+    start = time.monotonic()
+    with trace_events.span('SBProcess.ReadMemory', cat='lldb', size=self.size):
+      data = session.process.ReadMemory(sp, self.size, error)
+    seconds = time.monotonic() - start
+    if error.Fail() or data is None or len(data) != self.size:
+      raise ScenarioError(f'Failed to read {self.size} bytes at {sp:#x}: {error.GetCString()}')
+    return {'address': sp, 'bytes': self.size, 'seconds': seconds}
@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import time
+
+import lldb
+
+import gdb_remote_log
+import trace_events
+from scenarios.base import Scenario, ScenarioError, register
+
+# Read sizes of the sweep, 16 bytes to 4 MiB in steps of 4x.
+BLOCK_SIZES = [16 * 4 ** i for i in range(10)]
+
+# Each size is read at least MIN_READS times, and then until MIN_SECONDS
+# have passed or MAX_READS reads were made.
+MIN_READS = 3
+MAX_READS = 50
+MIN_SECONDS = 0.2
+
+# gdb-remote commands that read memory.
+_READ_PACKET_TYPES = ('m', 'x')
+
+
+def _region_size(region):
+  return region.GetRegionEnd() - region.GetRegionBase()
+
+
+def _find_regions(process):
+  """Returns {region type: SBMemoryRegionInfo} of the sweep's regions."""
+  sp = process.GetSelectedThread().GetFrameAtIndex(0).GetSP()
+  regions = {}
+  heaps = []
+  region_list = process.GetMemoryRegions()
+  for i in range(region_list.GetSize()):
+    region = lldb.SBMemoryRegionInfo()
+    if not region_list.GetMemoryRegionAtIndex(i, region) or not region.IsReadable():
+      continue
+    name = region.GetName() or ''
+    if region.GetRegionBase() <= sp < region.GetRegionEnd():
+      regions['stack'] = region
+    elif 'malloc' in name or 'scudo' in name:
+      heaps.append(region)
+    elif name.endswith('libart.so') and region.IsExecutable():
+      regions.setdefault('so', region)
+  if heaps:
+    regions['heap'] = max(heaps, key=_region_size)
+  return regions
+
+
+def _count_read_packets(log_path):
+  """Returns the number of memory read requests LLDB sent, from its log."""
+  return sum(1 for packet in gdb_remote_log.parse_packets(gdb_remote_log.read_lines(log_path))
+             if packet.direction == 'send' and packet.type in _READ_PACKET_TYPES)
+
+
+@register
+class MemoryThroughput(Scenario):
+  """
+  Measures SBProcess.ReadMemory throughput over a sweep of block sizes.
+
+  Reads from the stack, the largest heap mapping and libart's code, with
+  LLDB's memory cache disabled so that every read goes to lldb-server. The
+  number of gdb-remote packets per read is counted from a client-side
+  packet log, enabled for one extra read of each size only, so that logging
+  does not slow down the timed reads.
+  """
+  name = 'memory_throughput'
+  timeout_seconds = 600
+
+  def setup(self, session):
+    self.log_dir = tempfile.mkdtemp(prefix='lldb-memory-throughput-')
+    session.debugger.HandleCommand('settings set target.process.disable-memory-cache true')
+
+  def run(self, session):
+    process = session.process
+    regions = _find_regions(process)
+    if not regions:
+      raise ScenarioError('Found no readable memory regions')
+
+    results = []
+    for region_type, region in sorted(regions.items()):
+      base = region.GetRegionBase()
+      region_size = _region_size(region)
+      for block_size in BLOCK_SIZES:
+        if block_size > region_size:
+          break
+        results.append(self._measure(session, region_type, base, block_size))
+
+    session.log(f'{"Region":<6} {"Block":>9} {"Reads":>6} {"MB/s":>9} {"Packets/read":>13}')
+    for result in results:
+      session.log(f'{result["region"]:<6} {result["block_bytes"]:>9} {result["reads"]:>6} '
+                  f'{result["mb_per_second"]:>9.2f} {result["packets_per_read"]:>13}')
+    return {'regions': {region_type: {'base': region.GetRegionBase(),
+                                      'size': _region_size(region),
+                                      'name': region.GetName()}
+                        for region_type, region in regions.items()},
+            'sweep': results}
+
+  def _measure(self, session, region_type, address, block_size):
+    process = session.process
+    error = lldb.SBError()
+    reads = 0
+    start = time.monotonic()
+    with trace_events.span('memory read sweep', cat='lldb', region=region_type,
+                           block_bytes=block_size):
+      while reads < MAX_READS and (reads < MIN_READS or
+                                   time.monotonic() - start < MIN_SECONDS):
+        data = process.ReadMemory(address, block_size, error)
+        if error.Fail() or data is None or len(data) != block_size:
+          raise ScenarioError(f'Failed to read {block_size} bytes of {region_type} '
+                              f'at {address:#x}: {error.GetCString()}')
+        reads += 1
+    seconds = time.monotonic() - start
+
+    log_path = os.path.join(self.log_dir, f'{region_type}-{block_size}.log')
+    session.debugger.HandleCommand(f'log enable -f "{log_path}" gdb-remote packets')
+    process.ReadMemory(address, block_size, error)
+    session.debugger.HandleCommand('log disable gdb-remote packets')
+
+    return {
+      'region': region_type,
+      'block_bytes': block_size,
+      'reads': reads,
+      'seconds': seconds,
+      'mb_per_second': block_size * reads / seconds / 1e6 if seconds else 0.0,
+      'packets_per_read': _count_read_packets(log_path),
+    }
+
+  def teardown(self, session):
+    session.debugger.HandleCommand('settings set target.process.disable-memory-cache false')
+    shutil.rmtree(self.log_dir, ignore_errors=True)
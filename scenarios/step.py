@@ -0,0 +1,27 @@
+import lldb
+
+import trace_events
+from scenarios.base import Scenario, ScenarioError, register, resume_and_wait
+
+
+@register
+class Step(Scenario):
+  """Single-steps one instruction on the selected thread."""
+  name = 'step'
+  timeout_seconds = 20
+
+  def run(self, session):
+    thread = session.process.GetSelectedThread()
+    pc_before = thread.GetFrameAtIndex(0).GetPC()
+    error = lldb.SBError()
+
+    def step_instruction():
+      thread.StepInstruction(False, error)
+    with trace_events.span('SBThread.StepInstruction', cat='lldb'):
+      stopped = resume_and_wait(session, step_instruction)
+    if error.Fail():
+      raise ScenarioError(f'Failed to step: {error.GetCString()}')
+    pc_after = thread.GetFrameAtIndex(0).GetPC()
+    # A thread blocked in a system call does not complete the step before the
+    # deadline; that still exercises the resume/interrupt path.
+    return {'completed': stopped, 'pc_before': pc_before, 'pc_after': pc_after}
@@ -0,0 +1,62 @@
+"""
+Shards scenarios over devices, with work stealing between devices.
+
+Every scenario runs once per ABI under test, on one of the devices assigned
+to that ABI. Scenarios are dealt round-robin into a queue per device up
+front. A device works through its own queue from the front; once it is
+empty, it steals from the back of the longest queue of another device with
+the same ABI. A slow or failed device therefore only delays the scenario it
+is running, not the rest of its share.
+"""
+import collections
+import threading
+
+
+class ScenarioScheduler:
+  """Hands out scenario names to the device workers of a multi-device run."""
+
+  def __init__(self, scenario_names, device_abis):
+    """
+    Args:
+      scenario_names: The scenarios to run on every ABI.
+      device_abis: A {serial: ABI} dict of the devices to run on.
+    """
+    self._lock = threading.Lock()
+    self._device_abis = dict(device_abis)
+    self._queues = {serial: collections.deque() for serial in device_abis}
+    self.steals = 0
+
+    serials_by_abi = {}
+    for serial, abi in device_abis.items():
+      serials_by_abi.setdefault(abi, []).append(serial)
+    for serials in serials_by_abi.values():
+      for i, name in enumerate(scenario_names):
+        self._queues[serials[i % len(serials)]].append(name)
+
+  def next(self, serial):
+    """Returns the next scenario for `serial` to run, or None if all are taken."""
+    with self._lock:
+      queue = self._queues[serial]
+      if queue:
+        return queue.popleft()
+      abi = self._device_abis[serial]
+      victims = [other for other, other_queue in self._queues.items()
+                 if other_queue and self._device_abis[other] == abi]
+      if not victims:
+        return None
+      victim = max(victims, key=lambda other: len(self._queues[other]))
+      self.steals += 1
+      return self._queues[victim].pop()
+
+  def take(self, serial):
+    """Yields scenarios for `serial` until there are none left for its ABI."""
+    while True:
+      name = self.next(serial)
+      if name is None:
+        return
+      yield name
+
+  def remaining(self):
+    """Returns {serial: [scenario, ...]} of the scenarios nobody ran."""
+    with self._lock:
+      return {serial: list(queue) for serial, queue in self._queues.items() if queue}
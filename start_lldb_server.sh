@@ -3,6 +3,14 @@
 # This script launches lldb-server on Android device from application subfolder - /data/data/$packageId/lldb/bin.
 # Native run configuration is expected to push this script along with lldb-server to the device prior to its execution.
 # Following command arguments are expected to be passed - lldb package directory and lldb-server listen port.
+#
+# LOG_MODE selects how much lldb-server logs, since logging every packet to flash slows down the
+# protocol:
+#   off     - no logging
+#   process - the lldb and gdb-remote process channels, without per-packet lines
+#   full    - LOG_CHANNELS logged to files (the default)
+#   ring    - LOG_CHANNELS logged through FIFOs; only the last RING_LINES lines of each log are
+#             kept in memory and written to the log files when lldb-server exits
 
 umask 0002
 
@@ -11,15 +19,26 @@ LISTENER_SCHEME=$2
 DOMAINSOCKET_DIR=$3
 PLATFORM_SOCKET=$4
 LOG_CHANNELS=$5
+LOG_MODE=${6:-full}
+RING_LINES=${7:-20000}
 
 BIN_DIR=$LLDB_DIR/bin
 LOG_DIR=$LLDB_DIR/log
 TMP_DIR=$LLDB_DIR/tmp
 PLATFORM_LOG_FILE=$LOG_DIR/platform.log
+GDB_SERVER_LOG_FILE=$LOG_DIR/gdb-server.log
+RING_DONE_FILE=$LOG_DIR/ring.done
+
+case $LOG_MODE in
+  off) LOG_CHANNELS= ;;
+  process) LOG_CHANNELS="lldb process:gdb-remote process" ;;
+esac
 
-export LLDB_DEBUGSERVER_LOG_FILE=$LOG_DIR/gdb-server.log
-export LLDB_SERVER_LOG_CHANNELS="$LOG_CHANNELS"
 export LLDB_DEBUGSERVER_DOMAINSOCKET_DIR=$DOMAINSOCKET_DIR
+if [ -n "$LOG_CHANNELS" ]; then
+  export LLDB_DEBUGSERVER_LOG_FILE=$GDB_SERVER_LOG_FILE
+  export LLDB_SERVER_LOG_CHANNELS="$LOG_CHANNELS"
+fi
 
 # This directory already exists. Make sure it has the right permissions.
 chmod 0775 "$LLDB_DIR"
@@ -34,8 +53,35 @@ mkdir $LOG_DIR
 # LLDB would create these files with more restrictive permissions than our umask above. Make sure
 # it doesn't get a chance.
 # "touch" does not exist on pre API-16 devices. This is a poor man's replacement
-cat </dev/null >"$LLDB_DEBUGSERVER_LOG_FILE" 2>"$PLATFORM_LOG_FILE"
+cat </dev/null >"$GDB_SERVER_LOG_FILE" 2>"$PLATFORM_LOG_FILE"
 
 cd $TMP_DIR # change cwd
 
-$BIN_DIR/lldb-server platform --server --listen $LISTENER_SCHEME://$DOMAINSOCKET_DIR/$PLATFORM_SOCKET --log-file "$PLATFORM_LOG_FILE" --log-channels "$LOG_CHANNELS" </dev/null >$LOG_DIR/platform-stdout.log 2>&1
+if [ -z "$LOG_CHANNELS" ]; then
+  $BIN_DIR/lldb-server platform --server --listen $LISTENER_SCHEME://$DOMAINSOCKET_DIR/$PLATFORM_SOCKET </dev/null >$LOG_DIR/platform-stdout.log 2>&1
+  exit
+fi
+
+if [ "$LOG_MODE" != ring ]; then
+  $BIN_DIR/lldb-server platform --server --listen $LISTENER_SCHEME://$DOMAINSOCKET_DIR/$PLATFORM_SOCKET --log-file "$PLATFORM_LOG_FILE" --log-channels "$LOG_CHANNELS" </dev/null >$LOG_DIR/platform-stdout.log 2>&1
+  exit
+fi
+
+# Ring mode: lldb-server writes into FIFOs, and "tail" keeps the last lines of each in memory. The
+# FIFOs are held open here so that every gdb-server can open its log without blocking, and so
+# that tail only sees the end of its input, and writes the log file, once lldb-server is gone.
+PLATFORM_FIFO=$TMP_DIR/platform.fifo
+GDB_SERVER_FIFO=$TMP_DIR/gdb-server.fifo
+mkfifo $PLATFORM_FIFO $GDB_SERVER_FIFO
+tail -n $RING_LINES <$PLATFORM_FIFO >"$PLATFORM_LOG_FILE" &
+PLATFORM_TAIL=$!
+tail -n $RING_LINES <$GDB_SERVER_FIFO >"$GDB_SERVER_LOG_FILE" &
+GDB_SERVER_TAIL=$!
+exec 3<>$PLATFORM_FIFO 4<>$GDB_SERVER_FIFO
+export LLDB_DEBUGSERVER_LOG_FILE=$GDB_SERVER_FIFO
+
+$BIN_DIR/lldb-server platform --server --listen $LISTENER_SCHEME://$DOMAINSOCKET_DIR/$PLATFORM_SOCKET --log-file "$PLATFORM_FIFO" --log-channels "$LOG_CHANNELS" </dev/null >$LOG_DIR/platform-stdout.log 2>&1
+
+exec 3>&- 4>&-
+wait $PLATFORM_TAIL $GDB_SERVER_TAIL
+cat </dev/null >"$RING_DONE_FILE"
@@ -1,174 +1,882 @@
 import lldb
-import subprocess
+import math
 import time
 import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
 
-def run_debugging_session(serial, package):
-    """
-    Runs a debugging session using the LLDB Python API.
+import adb_client
+import backtrace
+import build_id_index
+import gdb_remote_log
+import gdb_remote_proxy
+import gdb_remote_trace
+import metrics
+import module_cache
+import run_as_executor
+import scenarios
+import scheduler
+import trace_events
 
-    Args:
-        serial: The serial of the Android device to connect to.
-    """
-    # Create a new debugger instance.
-    debugger = lldb.SBDebugger.Create()
-    if not debugger:
-        print('Error: Failed to create SBDebugger.')
-        return
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-    # Tell the debugger to be in synchronous mode.
-    # This means commands will block until they are finished.
-    debugger.SetAsync(False)
+# How long to wait for lldb-server to accept platform connections after launch.
+LLDB_SERVER_START_TIMEOUT_SECONDS = 10
+LLDB_SERVER_POLL_INITIAL_DELAY_SECONDS = 0.02
+LLDB_SERVER_POLL_MAX_DELAY_SECONDS = 0.5
+
+# Per-thread device tag and log file used by log(), see device_log().
+_device_log_context = threading.local()
+
+# lldb-server packet logs written by start_lldb_server.sh, relative to the
+# app data dir.
+PACKET_LOGS = ('lldb/log/platform.log', 'lldb/log/gdb-server.log')
+# Created by start_lldb_server.sh once ring mode logs have been written out.
+RING_DONE_FILE = 'lldb/log/ring.done'
+
+# Logging modes of start_lldb_server.sh.
+LLDB_SERVER_LOG_MODES = ('off', 'process', 'full', 'ring')
+
+# Digests of the deployed lldb-server files, relative to the app data dir.
+DEPLOY_MANIFEST = 'lldb/bin/.deploy-manifest'
+
+# hash_file() digests by (path, size, mtime_ns).
+_file_digests = {}
+_file_digests_lock = threading.Lock()
+
+# The socket the lldb-server platform listens on, in its socket directory.
+PLATFORM_SOCKET = 'platform-156393867851.sock'
+
+# Where --target=host finds lldb-server, see build_lldb.sh, and the fixture
+# process it attaches to.
+HOST_LLDB_SERVER = os.path.join(SCRIPT_DIR, 'build-linux-x86_64/install/bin/lldb-server')
+HOST_FIXTURE_SOURCE = os.path.join(SCRIPT_DIR, 'host_fixture.c')
+HOST_FIXTURE_BINARY = os.path.join(SCRIPT_DIR, 'build-linux-x86_64/host_fixture/host_fixture')
+HOST_FIXTURE_NAME = 'host_fixture'
+
+# The ABI of --target=stub devices; the stub serves x86_64 processes.
+STUB_ABI = 'x86_64'
+
+
+class HarnessError(Exception):
+  """A step of the harness failed; the message says which and why."""
+
+
+class ProcessResolver:
+  """
+  Finds the pid of the app on a connected platform.
+
+  Asks the platform to run `pidof` for the app's process names first, which
+  only returns the matching processes. Only if that fails does it fall back
+  to listing every process on the device and scanning it. The pid found is
+  cached, so later attaches in the same session skip the lookup.
+  """
+
+  def __init__(self, process_names):
+    self.process_names = list(process_names)
+    self.pid = None
+    self.method = None
+
+  def invalidate(self):
+    self.pid = None
+    self.method = None
+
+  def resolve(self, platform):
+    if self.pid is not None:
+      log(f'Using cached pid {self.pid}')
+      return self.pid
+
+    pid = self._pidof(platform)
+    if pid is not None:
+      self.method = 'pidof'
+    else:
+      pid = self._scan(platform)
+      self.method = 'scan'
+    if pid is None:
+      raise HarnessError(f'Failed to find a process named any of {self.process_names}')
+    self.pid = pid
+    return pid
 
-    # Select and set the platform to 'remote-android'.
-    # This is required for debugging on an Android device.
-    platform = lldb.SBPlatform('remote-android')
-    if not platform:
-        print('Error: Failed to create remote-android platform.')
-        return
-
-    debugger.SetSelectedPlatform(platform)
-    print('Platform set to remote-android')
-
-    # Connect to the remote platform on the lldb-server.
-    platform_connect_options = lldb.SBPlatformConnectOptions(
-        f'unix-abstract-connect://[{serial}]/{package}-0/platform-156393867851.sock')
-    print(f'Connecting to URL: {platform_connect_options.GetURL()}')
-    connect_error = platform.ConnectRemote(platform_connect_options)
-    if connect_error.Fail():
-        print(f'Error: Failed to connect to remote platform: {connect_error.GetCString()}')
-        exit(1)
-    print('Connected to remote platform successfully.')
-
-    print('Listing pids on device...')
+  def _pidof(self, platform):
+    """Returns the pid reported by `pidof` on the device, or None."""
+    for name in self.process_names:
+      command = lldb.SBPlatformShellCommand(f'pidof {name}')
+      command.SetTimeoutSeconds(5)
+      with trace_events.span('SBPlatform.Run', cat='lldb', command=f'pidof {name}'):
+        error = platform.Run(command)
+      if error.Fail() or command.GetStatus() != 0:
+        continue
+      pids = (command.GetOutput() or '').split()
+      if len(pids) == 1 and pids[0].isdigit():
+        log(f'Found process {name} with pidof')
+        return int(pids[0])
+      if len(pids) > 1:
+        log(f'pidof {name} is ambiguous ({pids}), falling back to a full scan')
+        return None
+    return None
+
+  def _scan(self, platform):
+    """Returns the pid of the last matching process in a full listing."""
+    log('Listing pids on device...')
     error = lldb.SBError()
-    processes = platform.GetAllProcesses(error)
+    with trace_events.span('SBPlatform.GetAllProcesses', cat='lldb'):
+      processes = platform.GetAllProcesses(error)
     if error.Fail():
-      print(f'Error listing process ids')
-      exit(1)
-    pid = 0
+      raise HarnessError(f'Error listing process ids: {error.GetCString()}')
+    pid = None
     for i in range(0, processes.GetSize()):
       info = lldb.SBProcessInfo()
-      if processes.GetProcessInfoAtIndex(i, info) and info.GetName() in ['app_process64', 'com.example.hellojni']:
-          pid = info.GetProcessID()
-          print(f'Match, process: {info.GetName()}')
-      else:
-        print(f'Not match, process: {info.GetName()}')
-    if pid == 0:
-      print('Failed to find matching pid')
-      exit(1)
-    print(f'Selected pid = {str(pid)}')
+      if processes.GetProcessInfoAtIndex(i, info) and info.GetName() in self.process_names:
+        pid = info.GetProcessID()
+        log(f'Match, process: {info.GetName()}')
+    log(f'Scanned {processes.GetSize()} processes')
+    return pid
 
-    # Attach to the process by its PID.
-    error = lldb.SBError()
-    target = debugger.CreateTarget(
-        None,           # executable_file
-        None,           # triple
-        None,           # platform_name
-        True,           # add_dependent_modules
-        error           # error
-    )
-    if not error.Success():
-      print(f"Error creating target: {error.GetCString()}")
-      exit(1)
 
-    print(f'Attaching to process {pid}...')
-    attach_info = lldb.SBAttachInfo()
-    attach_info.SetProcessID(pid)
-    error = lldb.SBError()
-    process = platform.Attach(attach_info, debugger, target, error)
-    if not process or error.Fail():
-        print(f'Error: Failed to attach to process with PID {pid}: {error.GetCString()}')
-        return
+def create_debugger(cache_entry=None):
+  """
+  Creates a synchronous SBDebugger for one session.
+
+  With a module_cache.CacheEntry, LLDB's platform module cache is pointed at
+  the module cache, so modules it downloads are shared with later sessions.
+  The setting is process-wide; it names the same directory for every entry.
+  """
+  # Create a new debugger instance.
+  with trace_events.span('SBDebugger.Create', cat='lldb'):
+    debugger = lldb.SBDebugger.Create()
+  if not debugger:
+    raise HarnessError('Failed to create SBDebugger.')
+
+  # Tell the debugger to be in synchronous mode.
+  # This means commands will block until they are finished.
+  debugger.SetAsync(False)
+
+  if cache_entry is not None:
+    lldb.SBDebugger.SetInternalVariable(
+        'platform.module-cache-directory', cache_entry.lldb_cache_dir,
+        debugger.GetInstanceName())
+
+  # In multi-device runs, keep command output with the device's own log.
+  log_file = current_device_log_file()
+  if log_file is not None:
+    debugger.SetOutputFileHandle(log_file, False)
+    debugger.SetErrorFileHandle(log_file, False)
+  return debugger
+
+
+def attach_to_app(debugger, remote, record, resolver=None, cache_entry=None,
+                  symbol_index=None):
+  """
+  Connects to the lldb-server of `remote` and attaches to its process.
+
+  `remote` is the AndroidTarget or HostTarget the session runs against.
+  `resolver` is the ProcessResolver used to find the process's pid. Pass the
+  same one across attaches to reuse its cached pid; by default a new one is
+  created.
+
+  With a module_cache.CacheEntry, the target looks up system libraries in
+  the entry's sysroot before downloading them from the device. With a
+  build_id_index.BuildIdIndex, symbol files are attached to the loaded
+  modules by build-id once the process has stopped.
+
+  Each step is timed into `record`: connect_platform, list_processes,
+  create_target, attach, wait_for_stop and add_symbols.
+
+  Returns:
+    A (platform, target, process) tuple, with the process stopped.
+  """
+  platform = connect_platform(debugger, remote, record, cache_entry)
+  target, process = attach_process(debugger, platform, remote, record,
+                                   resolver, cache_entry, symbol_index)
+  return platform, target, process
+
+
+def connect_platform(debugger, remote, record, cache_entry=None):
+  """
+  Selects the platform of `remote` and connects it to its lldb-server.
+
+  With a module_cache.CacheEntry, the entry's sysroot is the platform's SDK
+  root, so LLDB looks for the device's modules there first. Every session has
+  its own platform, so devices of different builds do not share a sysroot.
+
+  Returns:
+    The connected SBPlatform.
+  """
+  # Select and set the platform, e.g. 'remote-android' for an Android device.
+  platform = lldb.SBPlatform(remote.platform_name)
+  if not platform:
+    raise HarnessError(f'Failed to create {remote.platform_name} platform.')
+
+  if cache_entry is not None:
+    platform.SetSDKRoot(cache_entry.sysroot)
+  debugger.SetSelectedPlatform(platform)
+  log(f'Platform set to {remote.platform_name}')
+
+  # Connect to the remote platform on the lldb-server.
+  platform_connect_options = lldb.SBPlatformConnectOptions(remote.connect_url())
+  log(f'Connecting to URL: {platform_connect_options.GetURL()}')
+  with record.phase('connect_platform'):
+    wait_for_platform(platform, platform_connect_options,
+                      LLDB_SERVER_START_TIMEOUT_SECONDS, remote.server_process)
+  log('Connected to remote platform successfully.')
+  return platform
+
 
-    print(f'Attached to process with PID {process.GetProcessID()}')
+def attach_process(debugger, platform, remote, record, resolver=None,
+                   cache_entry=None, symbol_index=None):
+  """
+  Attaches to the process of `remote` through an already connected platform.
 
+  See attach_to_app() for the arguments.
+
+  Returns:
+    A (target, process) tuple, with the process stopped.
+  """
+  if resolver is None:
+    resolver = ProcessResolver(remote.process_names)
+
+  with record.phase('list_processes'):
+    pid = resolver.resolve(platform)
+  record.metadata['pid_lookup'] = resolver.method
+  log(f'Selected pid = {str(pid)}')
+
+  # Attach to the process by its PID.
+  error = lldb.SBError()
+  with record.phase('create_target'):
+    with trace_events.span('SBDebugger.CreateTarget', cat='lldb'):
+      target = debugger.CreateTarget(
+          None,           # executable_file
+          None,           # triple
+          None,           # platform_name
+          True,           # add_dependent_modules
+          error           # error
+      )
+  if not error.Success():
+    raise HarnessError(f"Error creating target: {error.GetCString()}")
+  if cache_entry is not None:
+    for device_path, local_path in cache_entry.image_search_paths():
+      target.AppendImageSearchPath(device_path, local_path, error)
+
+  log(f'Attaching to process {pid}...')
+  attach_info = lldb.SBAttachInfo()
+  attach_info.SetProcessID(pid)
+  error = lldb.SBError()
+  with record.phase('attach'):
+    with trace_events.span('SBPlatform.Attach', cat='lldb', pid=pid):
+      process = platform.Attach(attach_info, debugger, target, error)
+  if not process or error.Fail():
+    raise HarnessError(f'Failed to attach to process with PID {pid}: {error.GetCString()}')
+
+  log(f'Attached to process with PID {process.GetProcessID()}')
+
+  with record.phase('wait_for_stop'):
     wait_for_stop(debugger.GetListener(), process, 10)
 
-    print('Getting stack backtrace')
-    debugger.HandleCommand('bt')
+  if symbol_index is not None:
+    with record.phase('add_symbols'):
+      record.metadata['symbols_added'] = add_symbols_by_build_id(
+          debugger, target, symbol_index)
+  return target, process
 
-    # TODO:
-    #print('Continuing process')
-    #process.Continue()
-    #print('Sleeping for 2 seconds')
-    #time.sleep(2)
-    #process.Stop()
-    #wait_for_stop(debugger.GetListener(), process, 10)
 
-    print('Test finished. Exiting.')
+def add_symbols_by_build_id(debugger, target, symbol_index):
+  """
+  Attaches host symbol files to the target's modules by build-id.
 
-def wait_for_stop(listener, process, timeout_seconds):
+  Returns:
+    The number of modules symbol files were added for.
+  """
+  interpreter = debugger.GetCommandInterpreter()
+  added = 0
+  for i in range(target.GetNumModules()):
+    module = target.GetModuleAtIndex(i)
+    uuid = module.GetUUIDString()
+    if not uuid:
+      continue
+    for path in symbol_index.lookup(uuid):
+      result = lldb.SBCommandReturnObject()
+      with trace_events.span('target symbols add', cat='lldb', path=path):
+        interpreter.HandleCommand(f'target symbols add "{path}"', result)
+      if result.Succeeded():
+        added += 1
+        break
+  log(f'Added symbols for {added} of {target.GetNumModules()} modules by build-id')
+  return added
+
+
+def print_backtrace(serial, process, record, options=None):
+  """
+  Collects the backtraces of all threads and logs the selected thread's.
+
+  A summary (thread and frame counts, unwind times) is stored in `record`.
+  With options.json_dir, the full backtraces are written there as JSON.
+  Without options.symbolicate, only the logged thread is symbolicated,
+  after the timed walk.
+  """
+  options = options or backtrace.Options()
+  log('Getting stack backtraces')
+  with record.phase('backtrace'):
+    with trace_events.span('backtrace.collect', cat='lldb',
+                           threads=process.GetNumThreads()):
+      backtraces = backtrace.collect(process, options.max_depth, options.symbolicate)
+  record.metadata['backtrace'] = backtrace.summarize(backtraces)
+
+  selected_tid = process.GetSelectedThread().GetThreadID()
+  if not options.symbolicate:
+    backtrace.symbolicate(process.GetTarget(), backtraces, tids={selected_tid})
+  for thread in backtraces['threads']:
+    if thread['tid'] == selected_tid:
+      for line in backtrace.format_thread(thread):
+        log(line)
+  summary = record.metadata['backtrace']
+  log(f'Unwound {summary["frames"]} frames of {summary["threads"]} threads '
+      f'in {summary["seconds"]:.3f} seconds')
+
+  if options.json_dir:
+    path = os.path.join(options.json_dir, f'{serial}-backtrace.json')
+    backtrace.write_json(path, backtraces)
+    log(f'Backtraces written to {path}')
+
+
+def run_debugging_session(remote, record, cache_entry=None, symbol_index=None,
+                          continue_stop_cycles=0, run_seconds=0.5,
+                          backtrace_options=None):
+    """
+    Runs a debugging session using the LLDB Python API.
+
+    Args:
+        remote: The AndroidTarget or HostTarget to connect to, set up.
+        record: The RunRecord that the session phases are timed into.
+        cache_entry: The module_cache.CacheEntry of the device's build, if any.
+        symbol_index: The BuildIdIndex to look up symbol files in, if any.
+        continue_stop_cycles: How many continue/interrupt cycles to time
+            after the backtrace, see run_continue_stop_benchmark().
+        run_seconds: How long the app runs in each of those cycles.
+        backtrace_options: The backtrace.Options of the backtrace.
+    """
+    debugger = create_debugger(cache_entry)
+    platform, target, process = attach_to_app(
+        debugger, remote, record, cache_entry=cache_entry,
+        symbol_index=symbol_index)
+
+    print_backtrace(remote.name, process, record, backtrace_options)
+
+    if continue_stop_cycles:
+      with record.phase('continue_stop_cycles'):
+        run_continue_stop_benchmark(debugger, process, record,
+                                    continue_stop_cycles, run_seconds)
+
+    log('Test finished. Exiting.')
+
+
+def run_continue_stop_benchmark(debugger, process, record, cycles, run_seconds):
+  """
+  Times `cycles` continue -> running -> interrupt -> stopped transitions.
+
+  The debugger runs in asynchronous mode for the cycles, so each transition
+  is timed from the SB API call to the state-changed event:
+
+    continue: SBProcess.Continue() until the process is running.
+    interrupt: SBProcess.Stop() until the process is stopped.
+
+  The thread count at every stop is recorded as well. The samples and their
+  percentiles are stored in `record.benchmark`, so they can be compared with
+  bench_compare.py like attach benchmarks.
+  """
+  listener = debugger.GetListener()
+  samples = []
+  thread_counts = []
+  debugger.SetAsync(True)
+  try:
+    for cycle in range(cycles):
+      with trace_events.span('continue/stop cycle', cycle=cycle):
+        start = time.monotonic()
+        with trace_events.span('SBProcess.Continue', cat='lldb'):
+          error = process.Continue()
+        if error.Fail():
+          raise HarnessError(f'Failed to continue: {error.GetCString()}')
+        wait_for_state(listener, process, (lldb.eStateRunning,), 10)
+        continue_seconds = time.monotonic() - start
+
+        time.sleep(run_seconds)
+
+        start = time.monotonic()
+        with trace_events.span('SBProcess.Stop', cat='lldb'):
+          error = process.Stop()
+        if error.Fail():
+          raise HarnessError(f'Failed to interrupt: {error.GetCString()}')
+        wait_for_state(listener, process, (lldb.eStateStopped,), 10)
+        interrupt_seconds = time.monotonic() - start
+
+      samples.append({'continue': continue_seconds, 'interrupt': interrupt_seconds})
+      thread_counts.append(process.GetNumThreads())
+  finally:
+    debugger.SetAsync(False)
+
+  record.benchmark = {
+      'iterations': samples,
+      'summary': metrics.summarize_samples(samples),
+      'thread_counts': thread_counts,
+  }
+  for name, stats in record.benchmark['summary'].items():
+    log(f'{name:<10} min {stats["min"] * 1000:9.2f} ms  '
+        f'median {stats["median"] * 1000:9.2f} ms  '
+        f'p90 {stats["p90"] * 1000:9.2f} ms  '
+        f'p99 {stats["p99"] * 1000:9.2f} ms')
+  log(f'Threads at stop: min {min(thread_counts)}, max {max(thread_counts)}')
+
+
+def run_attach_benchmark(remote, record, iterations, cache_entry=None,
+                         symbol_index=None, backtrace_options=None):
+  """
+  Runs `iterations` connect/attach/stop/backtrace/detach cycles.
+
+  Every cycle uses a fresh SBDebugger and platform connection against the
+  same running process and lldb-server of `remote`, and times each phase separately. The
+  per-iteration timings and their percentiles are stored in
+  `record.benchmark`.
+  """
+  samples = []
+  for iteration in range(iterations):
+    log(f'Benchmark iteration {iteration + 1}/{iterations}')
+    cycle = metrics.RunRecord(iteration=iteration)
+    with trace_events.span('benchmark iteration', iteration=iteration):
+      debugger = create_debugger(cache_entry)
+      platform, target, process = attach_to_app(
+          debugger, remote, cycle, cache_entry=cache_entry,
+          symbol_index=symbol_index)
+      print_backtrace(remote.name, process, cycle, backtrace_options)
+      with cycle.phase('detach'):
+        with trace_events.span('SBProcess.Detach', cat='lldb'):
+          error = process.Detach()
+      if error.Fail():
+        raise HarnessError(f'Failed to detach: {error.GetCString()}')
+      platform.DisconnectRemote()
+      lldb.SBDebugger.Destroy(debugger)
+    samples.append({phase['name']: phase['seconds'] for phase in cycle.phases})
+
+  record.benchmark = {
+      'iterations': samples,
+      'summary': metrics.summarize_samples(samples),
+  }
+  for name, stats in record.benchmark['summary'].items():
+    log(f'{name:<18} min {stats["min"] * 1000:9.2f} ms  '
+        f'median {stats["median"] * 1000:9.2f} ms  '
+        f'p90 {stats["p90"] * 1000:9.2f} ms  '
+        f'p99 {stats["p99"] * 1000:9.2f} ms')
+
+
+class DebugSession:
+  """
+  A platform connection and attached process shared by a list of scenarios.
+
+  The platform is connected and the process attached once. Between scenarios,
+  the process is only stopped again if a scenario left it running, and only
+  re-attached (through the same platform connection) if it was detached or
+  exited.
+  """
+
+  def __init__(self, remote, record, cache_entry=None, symbol_index=None):
+    self.remote = remote
+    self.record = record
+    self.cache_entry = cache_entry
+    self.symbol_index = symbol_index
+    self.resolver = ProcessResolver(remote.process_names)
+    self.debugger = None
+    self.platform = None
+    self.target = None
+    self.process = None
+    self.reattach_count = 0
+
+  def log(self, message):
+    log(message)
+
+  def connect(self):
+    self.debugger = create_debugger(self.cache_entry)
+    self.platform, self.target, self.process = attach_to_app(
+        self.debugger, self.remote, self.record, self.resolver,
+        self.cache_entry, self.symbol_index)
+
+  def ensure_ready(self):
+    """
+    Brings the process back to an attached, stopped state.
+
+    Returns:
+      True if the app had to be re-attached.
+    """
+    if self.debugger is None:
+      log('Starting a new session after the previous scenario timed out')
+      trace_events.instant('new session', reason='timeout')
+      self.connect()
+      self.reattach_count += 1
+      return True
+    state = self.process.GetState() if self.process else lldb.eStateInvalid
+    if state == lldb.eStateStopped:
+      return False
+    if state in (lldb.eStateRunning, lldb.eStateStepping):
+      log('Stopping process left running by the previous scenario')
+      with self.record.phase('stop'):
+        self.process.Stop()
+        wait_for_stop(self.debugger.GetListener(), self.process, 10)
+      return False
+
+    log(f'Process is {lldb.SBDebugger.StateAsCString(state)}, re-attaching')
+    trace_events.instant('re-attach', state=lldb.SBDebugger.StateAsCString(state))
+    if state in (lldb.eStateExited, lldb.eStateInvalid):
+      # The process may have been restarted under a new pid.
+      self.resolver.invalidate()
+    elif state != lldb.eStateDetached:
+      self.process.Detach()
+    if self.target:
+      self.debugger.DeleteTarget(self.target)
+    self.target, self.process = attach_process(
+        self.debugger, self.platform, self.remote, self.record,
+        self.resolver, self.cache_entry, self.symbol_index)
+    self.reattach_count += 1
+    return True
+
+  def interrupt(self):
+    """Interrupts whatever a timed out scenario is waiting for in LLDB."""
+    if hasattr(self.debugger, 'RequestInterrupt'):
+      self.debugger.RequestInterrupt()
+    if self.process:
+      self.process.SendAsyncInterrupt()
+
+  def reset(self):
+    """
+    Abandons the session after a scenario timed out in it.
+
+    The scenario may still be running on its abandoned thread and using the
+    debugger, so nothing is detached, disconnected or destroyed under it:
+    the references are only dropped, and the next ensure_ready() connects a
+    new debugger and platform.
+    """
+    self.interrupt()
+    self.debugger = self.platform = self.target = self.process = None
+
+  def close(self):
+    if self.process and self.process.GetState() not in (
+        lldb.eStateDetached, lldb.eStateExited, lldb.eStateInvalid):
+      with trace_events.span('SBProcess.Detach', cat='lldb'):
+        self.process.Detach()
+    if self.platform:
+      self.platform.DisconnectRemote()
+    if self.debugger:
+      lldb.SBDebugger.Destroy(self.debugger)
+
+
+def run_scenario(session, record, name):
+  """
+  Runs one scenario with its setup and teardown on a worker thread.
+
+  If the scenario does not finish within its timeout_seconds, the session is
+  reset, see DebugSession.reset().
+
+  Returns:
+    A result dict with the scenario's name, status (passed, failed, timeout
+    or error), duration and details or error message.
+  """
+  scenario = scenarios.SCENARIOS[name]()
+  log(f'Running scenario {name}')
+  result = {'name': name, 'serial': session.remote.name, 'status': 'passed'}
+
+  def run():
+    scenario.setup(session)
+    try:
+      return scenario.run(session)
+    finally:
+      scenario.teardown(session)
+
+  start = time.monotonic()
+  try:
+    with record.phase(f'scenario_{name}'):
+      result['details'] = scenarios.run_with_timeout(
+          in_current_context(run), scenario.timeout_seconds)
+  except scenarios.ScenarioTimeout as e:
+    result.update(status='timeout', error=str(e))
+    trace_events.instant('scenario timeout', scenario=name)
+    session.reset()
+  except scenarios.ScenarioError as e:
+    result.update(status='failed', error=str(e))
+  except Exception as e:
+    result.update(status='error', error=repr(e))
+  result['seconds'] = time.monotonic() - start
+  if result['status'] != 'passed':
+    log(f'Scenario {name} {result["status"]}: {result["error"]}')
+  return result
+
+
+def run_scenarios(remote, record, names, cache_entry=None, symbol_index=None):
+  """
+  Runs the named scenarios one after another in a single DebugSession.
+
+  `names` may be any iterable, e.g. a ScenarioScheduler.take() generator.
+  The outcome of every scenario is stored in `record.metadata['scenarios']`.
+  A failing scenario does not stop the ones after it, but fails the run.
+  """
+  session = DebugSession(remote, record, cache_entry, symbol_index)
+  results = []
+  try:
+    session.connect()
+    for name in names:
+      try:
+        reattached = session.ensure_ready()
+      except HarnessError as e:
+        # The session is unusable; leave the remaining scenarios to other
+        # devices.
+        results.append({'name': name, 'serial': remote.name, 'status': 'error',
+                        'error': str(e), 'seconds': 0.0})
+        raise
+      result = run_scenario(session, record, name)
+      result['reattached'] = reattached
+      results.append(result)
+  finally:
+    record.metadata['scenarios'] = results
+    record.metadata['reattach_count'] = session.reattach_count
+    session.close()
+
+  failed = [result['name'] for result in results if result['status'] != 'passed']
+  log(f'{len(results) - len(failed)}/{len(results)} scenarios passed')
+  if failed:
+    raise HarnessError(f'Failed scenarios: {", ".join(failed)}')
+
+
+def log(message):
+  """
+  Prints a message, tagged with the device the current thread works on.
+
+  Inside device_log(), the message is also written to that device's log file.
+  """
+  serial = getattr(_device_log_context, 'serial', None)
+  if serial is not None:
+    message = f'[{serial}] {message}'
+  print(message, flush=True)
+  log_file = getattr(_device_log_context, 'file', None)
+  if log_file is not None:
+    log_file.write(message + '\n')
+    log_file.flush()
+
+
+def in_current_context(function):
+  """
+  Wraps `function` to log and trace like the calling thread when run on another.
+
+  The device log of device_log() and the trace track are per thread.
+  """
+  serial = getattr(_device_log_context, 'serial', None)
+  log_file = current_device_log_file()
+  track = trace_events.tracer.current_track()
+
+  def run():
+    _device_log_context.serial = serial
+    _device_log_context.file = log_file
+    with trace_events.tracer.on_track(track):
+      return function()
+  return run
+
+
+def current_device_log_file():
+  """Returns the log file of the device the current thread works on, if any."""
+  return getattr(_device_log_context, 'file', None)
+
+
+@contextlib.contextmanager
+def device_log(serial, log_dir):
+  """Tags log() output of the current thread with a device serial.
+
+  The output is also copied to `<log_dir>/<serial>.log`.
+  """
+  os.makedirs(log_dir, exist_ok=True)
+  with open(os.path.join(log_dir, f'{serial}.log'), 'w') as log_file:
+    _device_log_context.serial = serial
+    _device_log_context.file = log_file
+    try:
+      yield log_file
+    finally:
+      _device_log_context.serial = None
+      _device_log_context.file = None
+
+
+def wait_for_platform(platform, connect_options, timeout_seconds,
+                      server_process=None):
+  """
+  Connects to a remote platform, retrying until lldb-server is listening.
+
+  lldb-server needs a moment after launch before its socket accepts
+  connections. Instead of sleeping for a fixed time, retry ConnectRemote with
+  a short, growing backoff until it succeeds or the deadline expires. This
+  works for any platform and URL, so it can be exercised against a host
+  lldb-server as well as one on a device.
+
+  Args:
+    platform: The SBPlatform to connect.
+    connect_options: The SBPlatformConnectOptions with the server URL.
+    timeout_seconds: The overall deadline for the server to come up.
+    server_process: The process that launched lldb-server, if any. If it
+      exits before a connection succeeds, fail without waiting out the
+      deadline.
+
+  Returns:
+    The time spent waiting for the server, in seconds.
+  """
+  start = time.monotonic()
+  deadline = start + timeout_seconds
+  delay = LLDB_SERVER_POLL_INITIAL_DELAY_SECONDS
+  attempts = 0
+  while True:
+    attempts += 1
+    with trace_events.span('SBPlatform.ConnectRemote', cat='lldb',
+                           attempt=attempts):
+      error = platform.ConnectRemote(connect_options)
+    if error.Success():
+      elapsed = time.monotonic() - start
+      log(f'lldb-server ready after {elapsed:.3f} seconds ({attempts} attempts)')
+      return elapsed
+
+    if server_process is not None and server_process.poll() is not None:
+      raise HarnessError(f'lldb-server exited with code {server_process.returncode} '
+                         f'before accepting connections: {error.GetCString()}')
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+      raise HarnessError(f'lldb-server did not start listening at '
+                         f'{connect_options.GetURL()} within {timeout_seconds} seconds '
+                         f'({attempts} attempts): {error.GetCString()}')
+    time.sleep(min(delay, remaining))
+    delay = min(delay * 2, LLDB_SERVER_POLL_MAX_DELAY_SECONDS)
+
+
+def wait_for_state(listener, process, states, timeout_seconds):
+  """
+  Blocks until the process reaches one of `states` or the deadline expires.
+
+  Rather than polling, this waits on state-changed events from the process
+  broadcaster and returns as soon as one of the states is observed. Stops
+  that LLDB resumes from by itself are skipped.
+
+  Args:
+    listener: The SBListener that receives the process events.
+    process: The SBProcess to wait for.
+    states: The lldb.eState* values to wait for.
+    timeout_seconds: The overall deadline for the wait, in seconds.
+
+  Returns:
+    A (state, seconds) tuple of the state reached and the time spent waiting.
+  """
+  start = time.monotonic()
+  deadline = start + timeout_seconds
+  broadcaster = process.GetBroadcaster()
   event = lldb.SBEvent()
-  # Loop until the process is Running/Suspended or timeout.
-  for i in range(timeout_seconds):
-    listener.WaitForEvent(1, event) # Wait up to 1 second per loop iteration
-    if event.IsValid() and lldb.SBProcess.EventIsProcessEvent(event):
-      # We got a process event, check the state
-      state_enum = process.GetState()
-      print(f'Process state after waiting: {lldb.SBDebugger.StateAsCString(state_enum)}')
-      if state_enum == lldb.eStateStopped:
-        return
-      time.sleep(1)
-  print('Timed out while waiting for process to reach stopped state')
-  exit(1)
+
+  # A synchronous attach may already have consumed the event.
+  state = process.GetState()
+  while state not in states:
+    if state in (lldb.eStateExited, lldb.eStateDetached, lldb.eStateCrashed):
+      raise HarnessError(
+          f'Process {lldb.SBDebugger.StateAsCString(state)} while waiting for '
+          f'{", ".join(lldb.SBDebugger.StateAsCString(s) for s in states)}')
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+      raise HarnessError(
+          f'Timed out while waiting for process to reach state '
+          f'{", ".join(lldb.SBDebugger.StateAsCString(s) for s in states)}')
+    # WaitForEvent* only accepts whole seconds; the deadline check above
+    # keeps the total wait bounded.
+    with trace_events.span('SBListener.WaitForEventForBroadcasterWithType',
+                           cat='lldb'):
+      got_event = listener.WaitForEventForBroadcasterWithType(
+          math.ceil(remaining),
+          broadcaster,
+          lldb.SBProcess.eBroadcastBitStateChanged,
+          event)
+    if got_event:
+      if lldb.SBProcess.GetRestartedFromEvent(event):
+        continue
+      state = lldb.SBProcess.GetStateFromEvent(event)
+    else:
+      state = process.GetState()
+
+  return state, time.monotonic() - start
+
+
+def wait_for_stop(listener, process, timeout_seconds):
+  """
+  Blocks until the process reaches the stopped state or the deadline expires.
+
+  See wait_for_state().
+
+  Returns:
+    The time spent waiting, in seconds.
+  """
+  _, elapsed = wait_for_state(listener, process, (lldb.eStateStopped,),
+                              timeout_seconds)
+  log(f'Process stopped after {elapsed:.3f} seconds')
+  return elapsed
+
+
+def get_device_prop(serial, prop):
+  with trace_events.span('adb getprop', cat='adb', serial=serial, prop=prop):
+    return adb_client.get_default_client().getprop(serial, prop)
 
 
 def get_device_abis(serial):
-  cmd = [
-    'adb',
-    '-s',
-    serial,
-    'shell',
-    'getprop',
-    'ro.product.cpu.abilist'
-  ]
-  result = subprocess.run(cmd, check=True, capture_output=True)
-  out = result.stdout.decode('utf-8')
-  abis = out.strip().split(',')
+  abis = get_device_prop(serial, 'ro.product.cpu.abilist').split(',')
   return abis
 
 
-def get_serial(android_abi):
-  cmd = [
-      'adb',
-      'devices',
-  ]
-  result = subprocess.run(cmd, check=True, capture_output=True)
-  out = result.stdout.decode('utf-8')
-  devices = list(filter(str.strip, out.splitlines()[1:]))
-  print(f'Devices found: {str(devices)}')
-  if len(devices) == 0:
-    print('No devices found!')
-    exit(1)
+def get_serials(android_abi, limit=None):
+  """Returns the serials of online devices that support `android_abi`."""
+  return list(get_device_assignments([android_abi], limit))
 
-  serial = None
-  found = False
-  for device in devices:
-    parts = device.split()
-    if len(parts) != 2:
-      print(f'Failed to parse device line:\n{device}\nSkipping device.')
-      continue
 
-    serial, state = parts[0], parts[1]
+def get_device_assignments(android_abis, limit=None):
+  """
+  Returns {serial: ABI} for the online devices that support any of the ABIs.
+
+  Each device is assigned the first ABI of `android_abis` that it supports.
+  """
+  with trace_events.span('adb devices', cat='adb'):
+    devices = adb_client.get_default_client().devices()
+  log(f'Devices found: {str(devices)}')
+  if len(devices) == 0:
+    raise HarnessError('No devices found!')
+
+  assignments = {}
+  for serial, state in devices:
     if state != 'device':
       continue
 
     # Compare the ABI of the device against what we are looking for.
     abis = get_device_abis(serial)
-    print(f'Target ABI={android_abi} Device ABIs: {str(abis)}')
-    if android_abi not in abis:
-      print(f'Skipping device: Requested ABI={android_abi} not found in device ABIs={str(abis)}')
+    log(f'Target ABIs={android_abis} Device ABIs: {str(abis)}')
+    matching = [abi for abi in android_abis if abi in abis]
+    if not matching:
+      log(f'Skipping device: Requested ABIs={android_abis} not found in device ABIs={str(abis)}')
       continue
 
-    found = True
-    break
+    assignments[serial] = matching[0]
+    if limit is not None and len(assignments) >= limit:
+      break
+
+  if not assignments:
+    raise HarnessError('No online devices found')
+
+  return assignments
 
-  if not found:
-    print('No online devices found')
-    exit(1)
 
-  print(f'Using device serial = {serial}')
+def get_serial(android_abi):
+  serial = get_serials(android_abi, limit=1)[0]
+  log(f'Using device serial = {serial}')
   return serial
 
 
@@ -177,53 +885,45 @@ def get_pid():
 
 
 def install_apk():
-  print('Installing APK: [not implemented]...')
+  log('Installing APK: [not implemented]...')
   pass
 
 
 def run_as(serial, package, cmd):
   new_cmd = [
-      'adb',
-      '-s',
-      serial,
-      'shell',
       'run-as',
       package
   ] + cmd
-  print('Launching command: ' + str(cmd))
-  return subprocess.Popen(new_cmd)
+  log('Launching command: ' + str(cmd))
+  return adb_client.get_default_client().shell_popen(serial, new_cmd)
 
-def launch_lldb_server(serial, package):
-  print('Launching lldb-server on device...')
+def launch_lldb_server(serial, package, log_mode='full'):
+  log(f'Launching lldb-server on device (log mode {log_mode})...')
   cmd = [
       f'/data/data/{package}/lldb/bin/start_lldb_server.sh',
       f'/data/data/{package}/lldb',
       'unix-abstract',
       f'/{package}-0',
-      'platform-156393867851.sock',
-      '\'lldb process:gdb-remote packets\''
+      PLATFORM_SOCKET,
+      '\'lldb process:gdb-remote packets\'',
+      log_mode,
   ]
-  process = run_as(serial, package, cmd)
-  time.sleep(1)
-  return process
+  # The caller waits for the server to accept connections, see
+  # wait_for_platform().
+  with trace_events.span('run-as start_lldb_server.sh', cat='adb'):
+    return run_as(serial, package, cmd)
 
 def launch_app(serial, package, activity):
-  print('Stopping and re-launching app...')
+  log('Stopping and re-launching app...')
+  adb = adb_client.get_default_client()
   cmd = [
-      'adb',
-      '-s',
-      serial,
-      'shell',
       'am',
       'force-stop',
       package
   ]
-  subprocess.run(cmd, check=True)
+  with trace_events.span('am force-stop', cat='adb', package=package):
+    adb.shell(serial, cmd).check(' '.join(cmd))
   cmd = [
-      'adb',
-      '-s',
-      serial,
-      'shell',
       'am',
       'start',
       activity,
@@ -232,69 +932,1200 @@ def launch_app(serial, package, activity):
       '-c',
       'android.intent.category.LAUNCHER'
   ]
-  subprocess.run(cmd, check=True)
+  with trace_events.span('am start', cat='adb', activity=activity):
+    adb.shell(serial, cmd).check(' '.join(cmd))
 
 def push_file(serial, local_path, remote_path):
-  cmd = [
-      'adb',
-      '-s',
-      serial,
-      'push',
-      local_path,
-      remote_path
-  ]
-  subprocess.run(cmd, check=True)
+  with trace_events.span('adb push', cat='adb', local_path=local_path,
+                         bytes=os.path.getsize(local_path)):
+    adb_client.get_default_client().push(serial, local_path, remote_path)
+
+
+def hash_file(path):
+  """
+  Returns the SHA-256 of a local file.
+
+  Digests are cached in memory keyed by the file's path, size and mtime, so
+  each device of a multi-device run does not re-hash the same build.
+  """
+  st = os.stat(path)
+  key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+  with _file_digests_lock:
+    digest = _file_digests.get(key)
+  if digest is not None:
+    return digest
+
+  sha256 = hashlib.sha256()
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+      sha256.update(chunk)
+  digest = sha256.hexdigest()
+  with _file_digests_lock:
+    _file_digests[key] = digest
+  return digest
 
 
 def push_lldb_server(serial, package, android_abi):
-  print('Pushing lldb-server to device...')
+  """
+  Stops any running lldb-server and deploys lldb-server and its launcher
+  script into the app's data directory.
+
+  The deployed files are described by a manifest of their SHA-256 digests,
+  stored next to the device copy. If the manifest on the device matches the
+  local files, the push and copies are skipped entirely. The kill and the
+  manifest read share one run-as batch, so an up-to-date device costs a
+  single round trip.
 
-  push_file(
-      serial,
+  Returns:
+    A dict with the number of bytes transferred and skipped.
+  """
+  files = [
       f'build-{android_abi}/out/bin/lldb-server',
-      '/data/local/tmp/')
-  push_file(
-      serial,
       'start_lldb_server.sh',
-      '/data/local/tmp/')
+  ]
+  total_bytes = sum(os.path.getsize(path) for path in files)
+  manifest = ''.join(
+      f'{hash_file(path)}  {os.path.basename(path)}\n' for path in files)
+
+  subcmds = ['pkill -9 lldb-server', f'cat {DEPLOY_MANIFEST}']
+  with trace_events.span('run-as batch', cat='adb', commands=len(subcmds)):
+    # pkill fails if no lldb-server is running, and cat if nothing is deployed.
+    results = run_as_executor.run_batch(serial, package, subcmds, stop_on_error=False)
+  read_manifest = results[1] if len(results) == len(subcmds) else None
+  if (read_manifest is not None and read_manifest.returncode == 0 and
+      read_manifest.stdout.decode('utf-8') == manifest):
+    log(f'lldb-server on device is up to date, skipped {total_bytes} bytes')
+    return {'bytes_transferred': 0, 'bytes_skipped': total_bytes}
+
+  log('Pushing lldb-server to device...')
+  for path in files:
+    push_file(serial, path, '/data/local/tmp/')
 
-  for subcmd in [
+  manifest_lines = ' '.join(shlex.quote(line) for line in manifest.splitlines())
+  subcmds = [
       'mkdir -p lldb/bin',
       'cp /data/local/tmp/lldb-server lldb/bin',
       'cp /data/local/tmp/start_lldb_server.sh lldb/bin/',
       'chmod +x lldb/bin/lldb-server',
       'chmod +x lldb/bin/start_lldb_server.sh',
-  ]:
-    return_code = run_as(serial, package, [subcmd]).wait()
-    assert return_code == 0
+      # Written last, so an interrupted deploy is never considered current.
+      f"printf '%s\\n' {manifest_lines} > {DEPLOY_MANIFEST}",
+  ]
+  log('Launching commands: ' + str(subcmds))
+  with trace_events.span('run-as batch', cat='adb', commands=len(subcmds)):
+    results = run_as_executor.run_batch(serial, package, subcmds)
+  for result in results:
+    result.check()
+  assert len(results) == len(subcmds)
+
+  log(f'Pushed {total_bytes} bytes of lldb-server files to device')
+  return {'bytes_transferred': total_bytes, 'bytes_skipped': 0}
 
 
 def kill_lldb_server(serial, package):
-  run_as(serial, package, ['pkill', '-9', 'lldb-server']).wait()
+  with trace_events.span('run-as', cat='adb', cmd='pkill -9 lldb-server'):
+    run_as(serial, package, ['pkill', '-9', 'lldb-server']).wait()
+
+
+def prewarm_module_cache(serial, package, android_abi, cache):
+  """
+  Fills the module cache with the libraries the running app has mapped.
+
+  Returns:
+    A (CacheEntry, stats) tuple, see ModuleCache.prewarm().
+  """
+  fingerprint = get_device_prop(serial, 'ro.build.fingerprint')
+  remote_paths = module_cache.core_libraries(android_abi)
+  with trace_events.span('run-as', cat='adb', cmd='cat /proc/<pid>/maps'):
+    results = run_as_executor.run_batch(
+        serial, package, [f'cat /proc/$(pidof {package})/maps'],
+        stop_on_error=False)
+  if results and results[0].returncode == 0:
+    mapped = module_cache.parse_mapped_libraries(
+        results[0].stdout.decode('utf-8', 'replace'))
+    remote_paths += [path for path in mapped if path not in remote_paths]
+  else:
+    log('Could not read the app memory map, pre-warming core libraries only')
+
+  with trace_events.span('module cache prewarm', cat='adb', files=len(remote_paths)):
+    entry, stats = cache.prewarm(serial, fingerprint, remote_paths)
+  log(f'Module cache: {stats["hits"]} hits, {stats["misses"]} misses, '
+      f'{stats["bytes_downloaded"]} bytes downloaded')
+  return entry, stats
+
+
+def pull_packet_logs(serial, package, log_dir, wait_for_ring=False):
+  """
+  Copies the lldb-server packet logs of the session to `log_dir`.
+
+  The logs are private to the app, so they cannot be pulled with sync; each
+  one is streamed into its local file from a run-as cat instead, as they can
+  grow to several MB.
+
+  With wait_for_ring, first waits briefly for start_lldb_server.sh to write
+  out its ring mode logs after lldb-server was killed.
+
+  Returns:
+    The local paths of PACKET_LOGS, None for logs that do not exist.
+  """
+  os.makedirs(log_dir, exist_ok=True)
+  commands = [f'test -f {path}' for path in PACKET_LOGS]
+  if wait_for_ring:
+    commands.insert(0, f'i=0; while [ ! -e {RING_DONE_FILE} ] && [ $i -lt 50 ]; do '
+                       f'sleep 0.1; i=$((i + 1)); done')
+  with trace_events.span('run-as batch', cat='adb', commands=len(commands)):
+    results = run_as_executor.run_batch(serial, package, commands,
+                                        stop_on_error=False)
+  if wait_for_ring:
+    results = results[1:]
+  adb = adb_client.get_default_client()
+  local_paths = []
+  for path, result in zip(PACKET_LOGS, results):
+    if result.returncode != 0:
+      local_paths.append(None)
+      continue
+    local_path = os.path.join(log_dir, f'{serial}-{os.path.basename(path)}')
+    with open(local_path, 'wb') as f:
+      with trace_events.span('run-as cat', cat='adb', path=path):
+        returncode = adb.shell_popen(serial, ['run-as', package, 'cat', path],
+                                     stdout=f).wait()
+    if returncode != 0:
+      os.remove(local_path)
+      raise adb_client.AdbError(f"'cat {path}' failed with exit code {returncode}")
+    local_paths.append(local_path)
+  local_paths += [None] * (len(PACKET_LOGS) - len(local_paths))
+  return local_paths
+
+
+def collect_packet_logs(remote, record, log_dir, wait_for_ring=False):
+  """Fetches and analyzes the packet logs, storing the report in `record`."""
+  try:
+    with record.phase('pull_packet_logs'):
+      platform_log, gdb_server_log = remote.fetch_packet_logs(log_dir, wait_for_ring)
+  except (adb_client.AdbError, OSError) as e:
+    # Don't hide the outcome of the session behind a log collection error.
+    log(f'Failed to pull packet logs: {e}')
+    return
+  report = gdb_remote_log.analyze(platform_log, gdb_server_log)
+  record.metadata['gdb_remote'] = report
+  for line in gdb_remote_log.format_report(report).splitlines():
+    log(line)
+
+
+def build_host_fixture():
+  """
+  Compiles host_fixture.c with the host C compiler, unless it is up to date.
+
+  Returns:
+    The path of the fixture binary.
+  """
+  if (os.path.exists(HOST_FIXTURE_BINARY) and
+      os.path.getmtime(HOST_FIXTURE_BINARY) >= os.path.getmtime(HOST_FIXTURE_SOURCE)):
+    return HOST_FIXTURE_BINARY
+  os.makedirs(os.path.dirname(HOST_FIXTURE_BINARY), exist_ok=True)
+  # Frame pointers and no optimization keep every frame of the fixture's
+  # call chains on the stack.
+  cmd = [os.environ.get('CC', 'cc'), '-g', '-O0', '-fno-omit-frame-pointer',
+         '-pthread', '-o', HOST_FIXTURE_BINARY, HOST_FIXTURE_SOURCE]
+  log('Building host fixture: ' + ' '.join(cmd))
+  with trace_events.span('cc host_fixture.c', cat='host'):
+    result = subprocess.run(cmd, capture_output=True, text=True)
+  if result.returncode != 0:
+    raise HarnessError(f'Failed to build the host fixture: {result.stderr.strip()}')
+  return HOST_FIXTURE_BINARY
+
+
+def launch_host_fixture(path, threads):
+  """Starts the host fixture and waits until all of its threads are running."""
+  log(f'Launching host fixture with {threads} threads...')
+  process = subprocess.Popen([path, str(threads)], stdin=subprocess.DEVNULL,
+                             stdout=subprocess.PIPE, text=True)
+  line = process.stdout.readline().strip()
+  if line != 'ready':
+    process.kill()
+    process.wait()
+    raise HarnessError(f'Host fixture exited with code {process.returncode} before it was ready')
+  log(f'Host fixture running with pid {process.pid}')
+  return process
+
+
+def launch_host_lldb_server(lldb_server, data_dir, socket_dir, log_mode='full'):
+  """
+  Starts lldb-server on this machine through start_lldb_server.sh.
+
+  `data_dir` stands in for the app data directory: lldb-server is linked
+  into its lldb/bin and logs to its lldb/log, like on a device. The script
+  runs in its own session, see kill_host_lldb_server().
+  """
+  if not os.path.exists(lldb_server):
+    raise HarnessError(f'{lldb_server} not found, build it with build_lldb.sh')
+  lldb_dir = os.path.join(data_dir, 'lldb')
+  for name in ('bin', 'log', 'tmp'):
+    os.makedirs(os.path.join(lldb_dir, name), exist_ok=True)
+  os.symlink(os.path.abspath(lldb_server), os.path.join(lldb_dir, 'bin', 'lldb-server'))
+
+  log(f'Launching host lldb-server (log mode {log_mode})...')
+  cmd = [
+      'sh',
+      os.path.join(SCRIPT_DIR, 'start_lldb_server.sh'),
+      lldb_dir,
+      'unix-abstract',
+      socket_dir,
+      PLATFORM_SOCKET,
+      'lldb process:gdb-remote packets',
+      log_mode,
+  ]
+  with trace_events.span('start_lldb_server.sh', cat='host'):
+    return subprocess.Popen(cmd, stdin=subprocess.DEVNULL, start_new_session=True)
+
+
+def start_tool(cmd, description):
+  """
+  Starts one of the gdb_remote_*.py servers.
+
+  Returns once it prints its first line, which it does once it accepts
+  connections.
+  """
+  process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                             text=True)
+  if not process.stdout.readline():
+    process.wait()
+    raise HarnessError(f'{description} exited with code {process.returncode}')
+  return process
+
+
+def stop_tool(process, summary_path=None):
+  """
+  Stops a server started with start_tool() and returns its --summary-json,
+  or None if it wrote none.
+  """
+  process.terminate()
+  output, _ = process.communicate()
+  for line in output.splitlines():
+    log(line)
+  if summary_path is None:
+    return None
+  try:
+    with open(summary_path) as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return None
+
+
+def launch_gdb_remote_proxy(listen_url, connect_url, link, log_path, summary_path,
+                            trace_path=None, trace_metadata=None):
+  """
+  Starts gdb_remote_proxy.py between LLDB and lldb-server.
+
+  With trace_path, the proxy records the session into that trace.
+  """
+  log(f'Launching gdb-remote proxy ({link.latency_ms} ms latency, {link.jitter_ms} ms '
+      f'jitter, {link.bandwidth_kbps or "unlimited"} kbps)...')
+  cmd = [
+      sys.executable,
+      os.path.join(SCRIPT_DIR, 'gdb_remote_proxy.py'),
+      '--listen', listen_url,
+      '--connect', connect_url,
+      '--latency-ms', str(link.latency_ms),
+      '--jitter-ms', str(link.jitter_ms),
+      '--bandwidth-kbps', str(link.bandwidth_kbps),
+      '--log', log_path,
+      '--summary-json', summary_path,
+  ]
+  if link.seed is not None:
+    cmd += ['--seed', str(link.seed)]
+  if trace_path:
+    cmd += ['--trace', trace_path, '--trace-metadata', json.dumps(trace_metadata or {})]
+  return start_tool(cmd, 'gdb-remote proxy')
+
+
+def launch_gdb_remote_replay(trace_path, listen_url, summary_path, realtime=False):
+  """Starts gdb_remote_replay.py to serve a recorded trace."""
+  log(f'Launching gdb-remote replay of {trace_path}...')
+  cmd = [
+      sys.executable,
+      os.path.join(SCRIPT_DIR, 'gdb_remote_replay.py'),
+      '--trace', trace_path,
+      '--listen', listen_url,
+      '--summary-json', summary_path,
+  ]
+  if realtime:
+    cmd.append('--realtime')
+  return start_tool(cmd, 'gdb-remote replay')
+
+
+def launch_lldb_server_stub(devices, app_name, args, data_dir):
+  """
+  Starts lldb_server_stub.py serving `devices` synthetic devices.
+
+  Returns:
+    A (process, targets) tuple of the stub process and a StubTarget per device.
+  """
+  log(f'Launching lldb-server stub with {devices} devices...')
+  devices_path = os.path.join(data_dir, 'devices.json')
+  cmd = [
+      sys.executable,
+      os.path.join(SCRIPT_DIR, 'lldb_server_stub.py'),
+      '--devices', str(devices),
+      '--app-name', app_name,
+      '--threads', str(args.stub_threads),
+      '--modules', str(args.stub_modules),
+      '--regions', str(args.stub_regions),
+      '--stack-depth', str(args.stub_stack_depth),
+      '--devices-json', devices_path,
+  ]
+  process = start_tool(cmd, 'lldb-server stub')
+  with open(devices_path) as f:
+    served = json.load(f)
+  return process, [StubTarget(device['name'], device['port'], app_name, process)
+                   for device in served]
+
+
+@contextlib.contextmanager
+def lldb_server_stub(devices, app_name, args):
+  """Runs lldb_server_stub.py for the duration of a --target=stub run; yields its StubTargets."""
+  data_dir = tempfile.mkdtemp(prefix='lldb-testing-stub-')
+  try:
+    process, targets = launch_lldb_server_stub(devices, app_name, args, data_dir)
+    try:
+      yield targets
+    finally:
+      stop_tool(process)
+  finally:
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def _session_processes(session_id, name):
+  """Returns the pids of the processes named `name` in a session."""
+  pids = []
+  for entry in os.listdir('/proc'):
+    if not entry.isdigit():
+      continue
+    try:
+      with open(f'/proc/{entry}/stat') as f:
+        stat = f.read()
+    except OSError:
+      continue
+    # The name is in parentheses and may itself contain spaces.
+    comm = stat[stat.index('(') + 1:stat.rindex(')')]
+    fields = stat[stat.rindex(')') + 2:].split()
+    if comm == name and int(fields[3]) == session_id:
+      pids.append(int(entry))
+  return pids
+
+
+def kill_host_lldb_server(server_process, timeout_seconds=5):
+  """
+  Kills the lldb-server processes started by launch_host_lldb_server().
+
+  Like `pkill -9 lldb-server` on a device, only lldb-server itself is
+  killed, so that start_lldb_server.sh can still write out ring mode logs.
+  If the script has not exited by the deadline, its whole session is killed.
+  """
+  for pid in _session_processes(server_process.pid, 'lldb-server'):
+    try:
+      os.kill(pid, signal.SIGKILL)
+    except ProcessLookupError:
+      pass
+  try:
+    server_process.wait(timeout_seconds)
+  except subprocess.TimeoutExpired:
+    log('start_lldb_server.sh did not exit, killing its session')
+    os.killpg(server_process.pid, signal.SIGKILL)
+    server_process.wait()
+
+
+class AndroidTarget:
+  """
+  An app on an Android device, debugged through lldb-server over adb.
+
+  lldb-server is deployed into the app's data directory and run as the app
+  with run-as, listening on an abstract socket that LLDB reaches through
+  adb's forwarding of the remote-android platform.
+  """
+  platform_name = 'remote-android'
+
+  def __init__(self, serial, package, activity, android_abi, trace_path=None):
+    self.name = serial
+    self.serial = serial
+    self.package = package
+    self.activity = activity
+    self.android_abi = android_abi
+    # Before the app renames itself, its process still shows up under the
+    # name of the zygote binary.
+    self.process_names = [package, 'app_process64']
+    self.trace_path = trace_path
+    self.server_process = None
+
+  def connect_url(self):
+    return f'unix-abstract-connect://[{self.serial}]/{self.package}-0/{PLATFORM_SOCKET}'
+
+  def setup(self, record, cache=None, log_mode='full'):
+    """
+    Launches the app and lldb-server on the device.
+
+    With a ModuleCache, the device's system libraries are pre-warmed into it.
+
+    Returns:
+      The module_cache.CacheEntry of the device's build, or None.
+    """
+    serial, package = self.serial, self.package
+    record.metadata['serial'] = serial
+    record.metadata['sdk'] = get_device_prop(serial, 'ro.build.version.sdk')
+    install_apk()
+    with record.phase('launch_app'):
+      launch_app(serial, package, self.activity)
+    cache_entry = None
+    if cache is not None:
+      with record.phase('prewarm_module_cache'):
+        cache_entry, stats = prewarm_module_cache(serial, package, self.android_abi, cache)
+      record.metadata['module_cache'] = dict(stats, fingerprint=cache_entry.fingerprint)
+    with record.phase('push_lldb_server'):
+      record.metadata['deploy'] = push_lldb_server(serial, package, self.android_abi)
+    record.metadata['lldb_server_log_mode'] = log_mode
+    with record.phase('launch_lldb_server'):
+      self.server_process = launch_lldb_server(serial, package, log_mode)
+    return cache_entry
+
+  def teardown(self, record):
+    log('Killing all lldb-server processes on device')
+    kill_lldb_server(self.serial, self.package)
+
+  def cleanup(self):
+    pass
+
+  def fetch_packet_logs(self, log_dir, wait_for_ring=False):
+    """
+    Pulls the packet logs of the session from the device, see
+    pull_packet_logs(). With a trace_path, they are also converted into a
+    gdb_remote_trace.py trace for gdb_remote_replay.py.
+    """
+    platform_log, gdb_server_log = pull_packet_logs(self.serial, self.package, log_dir,
+                                                    wait_for_ring)
+    if self.trace_path and platform_log:
+      metadata = {'target': 'android', 'serial': self.serial, 'package': self.package,
+                  'process_names': self.process_names}
+      connections = gdb_remote_trace.from_logs(self.trace_path, platform_log,
+                                               gdb_server_log, metadata)
+      log(f'Recorded {connections} connections to {self.trace_path}')
+    return platform_log, gdb_server_log
+
+
+class HostTarget:
+  """
+  A fixture process on this machine, debugged through a host lldb-server.
+
+  The fixture is built from host_fixture.c, and lldb-server from the
+  build-linux-x86_64 install is started with start_lldb_server.sh in a
+  scratch directory laid out like an app data directory, so log modes and
+  packet logs work as on a device. LLDB connects to it with the remote-linux
+  platform over an abstract unix socket.
+
+  With a gdb_remote_proxy.LinkConfig, LLDB connects through
+  gdb_remote_proxy.py instead, which simulates a slower link to the server.
+  With a trace_path, the session is recorded through the proxy into that
+  gdb_remote_trace.py trace.
+  """
+  name = 'host'
+  platform_name = 'remote-linux'
+  process_names = [HOST_FIXTURE_NAME]
+
+  def __init__(self, lldb_server=HOST_LLDB_SERVER, fixture_threads=4, link=None,
+               trace_path=None):
+    self.lldb_server = lldb_server
+    self.fixture_threads = fixture_threads
+    if trace_path and link is None:
+      # Record through a proxy that adds no delay.
+      link = gdb_remote_proxy.LinkConfig()
+    self.link = link
+    self.trace_path = trace_path
+    # Abstract sockets are shared by the whole machine; keep concurrent runs
+    # apart.
+    self.socket_dir = f'/lldb-testing-{os.getpid()}'
+    self.proxy_socket_dir = f'{self.socket_dir}-proxy'
+    self.data_dir = None
+    self.fixture_process = None
+    self.server_process = None
+    self.proxy_process = None
+
+  def connect_url(self):
+    socket_dir = self.proxy_socket_dir if self.link else self.socket_dir
+    return f'unix-abstract-connect://{socket_dir}/{PLATFORM_SOCKET}'
+
+  def _data_path(self, name):
+    return os.path.join(self.data_dir, name)
+
+  def setup(self, record, cache=None, log_mode='full'):
+    """
+    Builds and launches the fixture, then launches lldb-server.
+
+    Returns:
+      None; the module cache only applies to Android devices.
+    """
+    record.metadata['serial'] = self.name
+    record.metadata['kernel'] = os.uname().release
+    if cache is not None:
+      log('The module cache only applies to Android devices, not using it')
+    self.data_dir = tempfile.mkdtemp(prefix='lldb-testing-host-')
+    try:
+      with record.phase('build_fixture'):
+        fixture = build_host_fixture()
+      with record.phase('launch_fixture'):
+        self.fixture_process = launch_host_fixture(fixture, self.fixture_threads)
+      record.metadata['lldb_server_log_mode'] = log_mode
+      with record.phase('launch_lldb_server'):
+        self.server_process = launch_host_lldb_server(
+            self.lldb_server, self.data_dir, self.socket_dir, log_mode)
+      if self.link:
+        record.metadata['proxy_link'] = self.link.to_dict()
+        with record.phase('launch_proxy'):
+          self.proxy_process = launch_gdb_remote_proxy(
+              f'unix-abstract://{self.proxy_socket_dir}/{PLATFORM_SOCKET}',
+              f'unix-abstract://{self.socket_dir}/{PLATFORM_SOCKET}',
+              self.link, self._data_path('proxy.log'),
+              self._data_path('proxy.json'), self.trace_path,
+              {'target': 'host', 'process_names': self.process_names})
+    except BaseException:
+      self.teardown(record)
+      self.cleanup()
+      raise
+    return None
+
+  def teardown(self, record):
+    if self.proxy_process is not None:
+      summary = stop_tool(self.proxy_process, self._data_path('proxy.json'))
+      if summary is not None:
+        record.metadata['proxy'] = summary
+    if self.server_process is not None:
+      log('Killing host lldb-server')
+      kill_host_lldb_server(self.server_process)
+    if self.fixture_process is not None:
+      self.fixture_process.kill()
+      self.fixture_process.wait()
+
+  def cleanup(self):
+    """Removes the scratch directory, once the packet logs are fetched."""
+    if self.data_dir is not None:
+      shutil.rmtree(self.data_dir, ignore_errors=True)
+
+  def fetch_packet_logs(self, log_dir, wait_for_ring=False):
+    """
+    Copies the packet logs of the session to `log_dir`.
+
+    kill_host_lldb_server() waits for start_lldb_server.sh to exit, so ring
+    mode logs are complete by the time this runs. The proxy's packet log, if
+    any, is copied as well.
+
+    Returns:
+      The local paths of PACKET_LOGS, None for logs that do not exist.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    if os.path.exists(self._data_path('proxy.log')):
+      shutil.copyfile(self._data_path('proxy.log'),
+                      os.path.join(log_dir, f'{self.name}-proxy.log'))
+    local_paths = []
+    for path in PACKET_LOGS:
+      source = self._data_path(path)
+      if not os.path.exists(source):
+        local_paths.append(None)
+        continue
+      local_path = os.path.join(log_dir, f'{self.name}-{os.path.basename(path)}')
+      shutil.copyfile(source, local_path)
+      local_paths.append(local_path)
+    return local_paths
+
+
+class ReplayTarget:
+  """
+  A recorded session, served by gdb_remote_replay.py instead of lldb-server.
+
+  The trace is recorded with --record_trace, from a host or device session.
+  LLDB always connects with the remote-linux platform, since remote-android
+  would forward the connection to a device over adb; where that changes
+  LLDB's requests, the replay's fallbacks answer them.
+  """
+  name = 'replay'
+  platform_name = 'remote-linux'
+
+  def __init__(self, trace_path, realtime=False):
+    self.trace_path = trace_path
+    self.realtime = realtime
+    self.metadata = gdb_remote_trace.read_metadata(trace_path)
+    self.process_names = self.metadata.get('process_names') or [HOST_FIXTURE_NAME]
+    self.socket_dir = f'/lldb-testing-{os.getpid()}-replay'
+    self.data_dir = None
+    self.server_process = None
+
+  def connect_url(self):
+    return f'unix-abstract-connect://{self.socket_dir}/{PLATFORM_SOCKET}'
+
+  def setup(self, record, cache=None, log_mode='full'):
+    """Starts the replay server. Returns None, as there is no module cache."""
+    record.metadata['serial'] = self.name
+    record.metadata['replay_trace'] = self.trace_path
+    record.metadata['recorded'] = self.metadata
+    self.data_dir = tempfile.mkdtemp(prefix='lldb-testing-replay-')
+    with record.phase('launch_replay'):
+      self.server_process = launch_gdb_remote_replay(
+          self.trace_path, f'unix-abstract://{self.socket_dir}/{PLATFORM_SOCKET}',
+          os.path.join(self.data_dir, 'replay.json'), self.realtime)
+    return None
+
+  def teardown(self, record):
+    if self.server_process is not None:
+      summary = stop_tool(self.server_process, os.path.join(self.data_dir, 'replay.json'))
+      if summary is not None:
+        record.metadata['replay'] = summary
+
+  def cleanup(self):
+    if self.data_dir is not None:
+      shutil.rmtree(self.data_dir, ignore_errors=True)
+
+  def fetch_packet_logs(self, log_dir, wait_for_ring=False):
+    # There is no lldb-server to log packets.
+    return None, None
+
+
+class StubTarget:
+  """
+  A synthetic device served by lldb_server_stub.py instead of lldb-server.
+
+  One stub process serves every device of a run, see lldb_server_stub(), so
+  a run of hundreds of devices load tests the harness, the scheduler and the
+  results on one machine. The stub is started and stopped around the run,
+  so setup and teardown have nothing to do.
+  """
+  platform_name = 'remote-linux'
+
+  def __init__(self, name, port, app_name, server_process):
+    self.name = name
+    self.port = port
+    self.process_names = [app_name]
+    self.server_process = server_process
+
+  def connect_url(self):
+    return f'connect://localhost:{self.port}'
+
+  def setup(self, record, cache=None, log_mode='full'):
+    """Returns None, as there is no module cache."""
+    record.metadata['serial'] = self.name
+    return None
+
+  def teardown(self, record):
+    pass
+
+  def cleanup(self):
+    pass
+
+  def fetch_packet_logs(self, log_dir, wait_for_ring=False):
+    # There is no lldb-server to log packets.
+    return None, None
+
+
+def run_device_session(remote, record, benchmark_iterations=0, cache=None,
+                       symbol_index=None, scenario_names=None,
+                       packet_log_dir=None, log_mode='full',
+                       continue_stop_cycles=0, run_seconds=0.5,
+                       backtrace_options=None):
+  """
+  Sets up `remote` and runs the debug pipeline against it.
+
+  `remote` is an AndroidTarget, whose setup launches the app and deploys
+  lldb-server, a HostTarget, a ReplayTarget or a StubTarget. With
+  benchmark_iterations, the single debug session is replaced by that many
+  timed attach cycles, see
+  run_attach_benchmark(). With scenario_names, it is replaced by those
+  scenarios, see run_scenarios(). With a ModuleCache, the device's system
+  libraries are pre-warmed into it before attaching. With a BuildIdIndex,
+  symbol files are added to the modules by build-id. log_mode is the
+  start_lldb_server.sh logging mode. With packet_log_dir, the lldb-server
+  packet logs are fetched there and analyzed after the session; in ring
+  mode, only if the session failed. continue_stop_cycles and run_seconds are
+  passed on to run_debugging_session(), and backtrace_options to the
+  backtraces of the session or benchmark.
+  """
+  cache_entry = remote.setup(record, cache, log_mode)
+  failed = True
+  try:
+    log('This is where the debug session will start')
+    if benchmark_iterations:
+      run_attach_benchmark(remote, record, benchmark_iterations, cache_entry,
+                           symbol_index, backtrace_options)
+    elif scenario_names:
+      run_scenarios(remote, record, scenario_names, cache_entry, symbol_index)
+    else:
+      run_debugging_session(remote, record, cache_entry, symbol_index,
+                            continue_stop_cycles, run_seconds, backtrace_options)
+    # time.sleep(1000)
+    failed = False
+  finally:
+    remote.teardown(record)
+    if (packet_log_dir is not None and log_mode != 'off' and
+        (failed or log_mode != 'ring')):
+      collect_packet_logs(remote, record, packet_log_dir,
+                          wait_for_ring=log_mode == 'ring')
+    remote.cleanup()
+
+
+def proxy_link(args):
+  """Returns the gdb_remote_proxy.LinkConfig of the --proxy_* flags, if any."""
+  if (args.proxy_latency_ms is None and args.proxy_jitter_ms is None and
+      args.proxy_bandwidth_kbps is None):
+    return None
+  return gdb_remote_proxy.LinkConfig(args.proxy_latency_ms or 0.0,
+                                     args.proxy_jitter_ms or 0.0,
+                                     args.proxy_bandwidth_kbps or 0.0,
+                                     args.proxy_seed)
+
+
+def packet_log_dir(args):
+  if args.no_packet_logs or args.target in ('replay', 'stub'):
+    return None
+  return args.log_dir
+
+
+def backtrace_options(args):
+  return backtrace.Options(args.backtrace_depth, not args.lazy_symbols,
+                           args.log_dir)
+
+
+def lldb_server_log_mode(args):
+  """Returns the log mode to run lldb-server with.
+
+  Benchmarks default to no logging, so they measure the protocol rather than
+  writing logs to flash; other runs log every packet.
+  """
+  if args.lldb_server_log_mode:
+    return args.lldb_server_log_mode
+  return 'off' if args.benchmark_iterations or args.continue_stop_cycles else 'full'
+
+
+def new_run_record(package, android_abi, target='android'):
+  return metrics.RunRecord(
+      target=target,
+      android_abi=android_abi,
+      package=package,
+      llvm_project_sha=metrics.get_llvm_project_sha(SCRIPT_DIR))
+
+
+def run_on_device(remote, android_abi, package, args, cache=None, symbol_index=None,
+                  scenario_scheduler=None):
+  """
+  Runs the session on one device as part of a multi-device run.
+
+  Output goes to the device's own log file as well as the console. Failures
+  are recorded in the returned RunRecord instead of being raised, so one bad
+  device does not stop the others. With a ScenarioScheduler, the device runs
+  the scenarios it hands out instead of all of --scenarios.
+  """
+  record = new_run_record(package, android_abi, args.target)
+  scenario_names = args.scenarios
+  if scenario_scheduler is not None:
+    scenario_names = scenario_scheduler.take(remote.name)
+  with device_log(remote.name, args.log_dir), trace_events.tracer.on_track(remote.name):
+    try:
+      run_device_session(remote, record, args.benchmark_iterations, cache,
+                         symbol_index, scenario_names, packet_log_dir(args),
+                         lldb_server_log_mode(args), args.continue_stop_cycles,
+                         args.continue_run_seconds, backtrace_options(args))
+      record.finish('passed')
+    except HarnessError as e:
+      log(f'Session failed: {e}')
+      record.finish('failed', error=str(e))
+    except Exception as e:
+      log(f'Session failed: {e!r}')
+      record.finish('failed', error=repr(e))
+  return record
+
+
+def run_all_devices(package, activity, args, cache=None, symbol_index=None,
+                    stub_targets=None):
+  """
+  Runs the session concurrently on every device matching the ABIs, or on
+  every StubTarget of a --target=stub run.
+
+  With --scenarios, the scenarios are sharded over the devices of each ABI
+  by a ScenarioScheduler rather than all run on every device.
+  """
+  start = time.monotonic()
+  if stub_targets is not None:
+    remotes = {remote.name: remote for remote in stub_targets}
+    assignments = {name: STUB_ABI for name in remotes}
+  else:
+    assignments = get_device_assignments(args.android_abi.split(','))
+    remotes = {serial: AndroidTarget(serial, package, activity, android_abi)
+               for serial, android_abi in assignments.items()}
+  discovery_seconds = time.monotonic() - start
+  if len(assignments) > 20:
+    log(f'Running on {len(assignments)} devices')
+  else:
+    log(f'Running on {len(assignments)} devices: {assignments}')
+
+  scenario_scheduler = None
+  if args.scenarios:
+    scenario_scheduler = scheduler.ScenarioScheduler(args.scenarios, assignments)
+
+  max_workers = args.jobs or len(assignments)
+  with concurrent.futures.ThreadPoolExecutor(
+      max_workers=max_workers, thread_name_prefix='device') as pool:
+    records = list(pool.map(
+        lambda serial: run_on_device(remotes[serial], assignments[serial], package,
+                                     args, cache, symbol_index, scenario_scheduler),
+        assignments))
+
+  for record in records:
+    record.phases.insert(
+        0, {'name': 'get_serial', 'seconds': discovery_seconds, 'ok': True})
+
+  if scenario_scheduler is not None:
+    log(f'Scenario scheduler: {scenario_scheduler.steals} scenarios stolen')
+    # Scenarios left over when every device of an ABI failed.
+    records_by_serial = {record.metadata['serial']: record for record in records}
+    for serial, names in scenario_scheduler.remaining().items():
+      record = records_by_serial[serial]
+      record.metadata.setdefault('scenarios', []).extend(
+          {'name': name, 'serial': serial, 'status': 'not_run', 'seconds': 0.0}
+          for name in names)
+      if record.status == 'passed':
+        record.finish('failed', error=f'Scenarios not run: {", ".join(names)}')
+  return records
+
+
+def print_summary(records):
+  log('')
+  log(f'{"Device":<24} {"Status":<8} {"Total (s)":>10}  Error')
+  for record in records:
+    total = f'{record.total_seconds:.2f}' if record.total_seconds is not None else '-'
+    log(f'{record.metadata.get("serial", "?"):<24} {record.status:<8} {total:>10}  '
+        f'{record.error or ""}')
+  passed = sum(1 for record in records if record.status == 'passed')
+  log(f'{passed}/{len(records)} devices passed')
+
+  results = [result for record in records
+             for result in record.metadata.get('scenarios', [])]
+  if results:
+    log('')
+    log(f'{"Scenario":<16} {"Device":<24} {"Status":<8} {"Time (s)":>9}')
+    for result in results:
+      log(f'{result["name"]:<16} {result["serial"]:<24} {result["status"]:<8} '
+          f'{result["seconds"]:>9.2f}')
+
 
 def main(args):
-  serial = get_serial(args.android_abi)
   # package = 'com.example.myapplication'
   package = 'com.example.hellojni'
   activity = f'{package}/{package}.MainActivity'
-  install_apk()
-  launch_app(serial, package, activity)
-  kill_lldb_server(serial, package)
-  push_lldb_server(serial, package, args.android_abi)
-  process = launch_lldb_server(serial, package)
+  if args.trace_json:
+    trace_events.tracer.enable()
+  cache = None
+  if not args.no_module_cache and args.target == 'android':
+    cache = module_cache.ModuleCache(args.module_cache_dir,
+                                     args.module_cache_max_mb * 1024 * 1024)
+  symbol_index = None
+  if args.symbol_dirs:
+    symbol_index = build_id_index.BuildIdIndex(args.build_id_index)
+    stats = symbol_index.scan(args.symbol_dirs)
+    symbol_index.save()
+    log(f'Indexed {stats["files"]} files for build-ids in {stats["seconds"]:.3f} seconds '
+        f'({stats["read"]} read, {stats["reused"]} unchanged)')
+
+  if args.all_devices:
+    try:
+      if args.target == 'stub':
+        with lldb_server_stub(args.stub_devices, package, args) as stub_targets:
+          records = run_all_devices(package, activity, args, cache, symbol_index,
+                                    stub_targets)
+      else:
+        records = run_all_devices(package, activity, args, cache, symbol_index)
+    except HarnessError as e:
+      log(f'Error: {e}')
+      exit(1)
+    finally:
+      if args.trace_json:
+        trace_events.tracer.write(args.trace_json)
+        log(f'Trace written to {args.trace_json}')
+    if args.results_json:
+      for record in records:
+        record.append_json(args.results_json)
+      log(f'Results appended to {args.results_json}')
+    if args.benchmark_json:
+      metrics.write_benchmark_json(args.benchmark_json, records)
+      log(f'Benchmark results written to {args.benchmark_json}')
+    print_summary(records)
+    if any(record.status != 'passed' for record in records):
+      exit(1)
+    return
+
+  if args.target == 'host':
+    record = new_run_record(HOST_FIXTURE_NAME, None, args.target)
+  elif args.target == 'replay':
+    record = new_run_record(None, None, args.target)
+  elif args.target == 'stub':
+    record = new_run_record(package, STUB_ABI, args.target)
+  else:
+    # A single device run uses the first of the requested ABIs.
+    android_abi = args.android_abi.split(',')[0]
+    record = new_run_record(package, android_abi, args.target)
   try:
-    print('This is where the debug session will start')
-    run_debugging_session(serial, package)
-    # time.sleep(1000)
+    with contextlib.ExitStack() as stack:
+      if args.target == 'host':
+        remote = HostTarget(args.host_lldb_server, args.host_fixture_threads,
+                            proxy_link(args), args.record_trace)
+      elif args.target == 'replay':
+        remote = ReplayTarget(args.replay_trace, args.replay_realtime)
+      elif args.target == 'stub':
+        remote, = stack.enter_context(lldb_server_stub(1, package, args))
+      else:
+        with record.phase('get_serial'):
+          serial = get_serial(android_abi)
+        remote = AndroidTarget(serial, package, activity, android_abi, args.record_trace)
+      with trace_events.tracer.on_track(remote.name):
+        run_device_session(remote, record, args.benchmark_iterations, cache,
+                           symbol_index, args.scenarios, packet_log_dir(args),
+                           lldb_server_log_mode(args), args.continue_stop_cycles,
+                           args.continue_run_seconds, backtrace_options(args))
+    record.finish('passed')
+  except HarnessError as e:
+    log(f'Error: {e}')
+    record.finish('failed', error=str(e))
+  except BaseException as e:
+    record.finish('failed', error=repr(e))
+    raise
   finally:
-    print('Killing all lldb-server processes on device')
-    kill_lldb_server(serial, package)
+    if args.results_json:
+      record.append_json(args.results_json)
+      log(f'Results appended to {args.results_json}')
+    if args.benchmark_json and record.benchmark:
+      metrics.write_benchmark_json(args.benchmark_json, [record])
+      log(f'Benchmark results written to {args.benchmark_json}')
+    if args.trace_json:
+      trace_events.tracer.write(args.trace_json)
+      log(f'Trace written to {args.trace_json}')
+  if record.status != 'passed':
+    exit(1)
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser()
+  parser.add_argument(
+      "--target",
+      choices=('android', 'host', 'replay', 'stub'),
+      default="android",
+      help="Debug an app on an adb-connected Android device, a fixture process on this "
+           "machine through a host lldb-server, a session recorded with --record_trace, or "
+           "synthetic devices served by lldb_server_stub.py"
+  )
+  parser.add_argument(
+      "--record_trace",
+      default=None,
+      help="Record the gdb-remote session into this trace for --target=replay. On Android, "
+           "the trace is converted from the lldb-server packet logs"
+  )
+  parser.add_argument(
+      "--replay_trace",
+      default=None,
+      help="With --target=replay, the trace to serve"
+  )
+  parser.add_argument(
+      "--replay_realtime",
+      action="store_true",
+      help="With --target=replay, delay replies as much as the recorded lldb-server did"
+  )
+  parser.add_argument(
+      "--host_lldb_server",
+      default=HOST_LLDB_SERVER,
+      help="With --target=host, the lldb-server to run"
+  )
+  parser.add_argument(
+      "--host_fixture_threads",
+      type=int,
+      default=4,
+      help="With --target=host, how many threads the fixture process starts"
+  )
+  parser.add_argument(
+      "--stub_devices",
+      type=int,
+      default=100,
+      help="With --target=stub --all_devices, how many synthetic devices to serve"
+  )
+  parser.add_argument(
+      "--stub_threads",
+      type=int,
+      default=8,
+      help="With --target=stub, the threads of the synthetic app"
+  )
+  parser.add_argument(
+      "--stub_modules",
+      type=int,
+      default=16,
+      help="With --target=stub, the shared libraries of the synthetic app"
+  )
+  parser.add_argument(
+      "--stub_regions",
+      type=int,
+      default=32,
+      help="With --target=stub, the extra heap regions of the synthetic app"
+  )
+  parser.add_argument(
+      "--stub_stack_depth",
+      type=int,
+      default=16,
+      help="With --target=stub, the frames on each thread's stack"
+  )
+  parser.add_argument(
+      "--proxy_latency_ms",
+      type=float,
+      default=None,
+      help="With --target=host, connect through gdb_remote_proxy.py, delaying every packet "
+           "by this much each way"
+  )
+  parser.add_argument(
+      "--proxy_jitter_ms",
+      type=float,
+      default=None,
+      help="With the proxy, up to this much more delay per packet"
+  )
+  parser.add_argument(
+      "--proxy_bandwidth_kbps",
+      type=float,
+      default=None,
+      help="With the proxy, the link capacity in each direction in kilobits per second"
+  )
+  parser.add_argument(
+      "--proxy_seed",
+      type=int,
+      default=None,
+      help="With the proxy, the seed of the jitter"
+  )
   parser.add_argument(
       "--android_abi",
       default="arm64-v8a",
-      help="The ABI of the target Android device"
+      help="The ABI of the target Android device. With --all_devices, a comma-separated "
+           "list; each device runs the first listed ABI it supports"
+  )
+  parser.add_argument(
+      "--results_json",
+      default=None,
+      help="Append a JSON record with per-phase timings of this run to this file"
+  )
+  parser.add_argument(
+      "--trace_json",
+      default=None,
+      help="Write a Chrome trace-event timeline of this run to this file"
+  )
+  parser.add_argument(
+      "--benchmark_iterations",
+      type=int,
+      default=0,
+      help="Instead of a single session, run this many timed connect/attach/detach cycles"
+  )
+  parser.add_argument(
+      "--continue_stop_cycles",
+      type=int,
+      default=0,
+      help="After the backtrace, time this many continue/interrupt cycles of the app"
+  )
+  parser.add_argument(
+      "--continue_run_seconds",
+      type=float,
+      default=0.5,
+      help="With --continue_stop_cycles, how long the app runs in each cycle"
+  )
+  parser.add_argument(
+      "--backtrace_depth",
+      type=int,
+      default=64,
+      help="Unwind at most this many frames of each thread"
+  )
+  parser.add_argument(
+      "--lazy_symbols",
+      action="store_true",
+      help="Don't look up symbols while unwinding; only the logged thread is symbolicated"
+  )
+  parser.add_argument(
+      "--benchmark_json",
+      default=None,
+      help="With --benchmark_iterations or --continue_stop_cycles, write the benchmark "
+           "results to this file "
+           "(compare two files with bench_compare.py)"
+  )
+  parser.add_argument(
+      "--all_devices",
+      action="store_true",
+      help="Run the session concurrently on every online device matching the ABI"
+  )
+  parser.add_argument(
+      "--jobs",
+      type=int,
+      default=0,
+      help="With --all_devices, the maximum number of devices to run on at once (0: all)"
+  )
+  parser.add_argument(
+      "--log_dir",
+      default="logs",
+      help="The directory for packet logs, backtrace JSON and, with --all_devices, "
+           "per-device log files"
+  )
+  parser.add_argument(
+      "--module_cache_dir",
+      default="~/.cache/lldb-testing/modules",
+      help="Host directory for device system libraries, shared by devices of the same build"
+  )
+  parser.add_argument(
+      "--module_cache_max_mb",
+      type=int,
+      default=2048,
+      help="Evict the least recently used builds when the module cache grows past this size"
+  )
+  parser.add_argument(
+      "--no_module_cache",
+      action="store_true",
+      help="Let LLDB download system libraries from the device on every attach"
+  )
+  parser.add_argument(
+      "--symbol_dirs",
+      action="append",
+      default=[],
+      help="Directory of unstripped ELF files to attach as symbols by build-id "
+           "(can be repeated)"
+  )
+  parser.add_argument(
+      "--build_id_index",
+      default="~/.cache/lldb-testing/build-ids.json",
+      help="With --symbol_dirs, the persistent build-id index to update"
+  )
+  parser.add_argument(
+      "--lldb_server_log_mode",
+      choices=LLDB_SERVER_LOG_MODES,
+      default=None,
+      help="How much lldb-server logs: off, process (process channels, no packets), full, or "
+           "ring (last lines kept in memory, pulled only on failure). "
+           "(Default: off for benchmarks, else full)"
+  )
+  parser.add_argument(
+      "--no_packet_logs",
+      action="store_true",
+      help="Don't pull and analyze the lldb-server packet logs after the session"
+  )
+  parser.add_argument(
+      "--scenarios",
+      type=lambda value: value.split(','),
+      default=None,
+      help="Instead of a single backtrace, run these comma-separated scenarios in one "
+           f"session. Available: {', '.join(scenarios.SCENARIOS)}"
   )
-  main(parser.parse_args())
+  args = parser.parse_args()
+  for name in args.scenarios or []:
+    if name not in scenarios.SCENARIOS:
+      parser.error(f'unknown scenario: {name}')
+  if args.target not in ('android', 'stub') and args.all_devices:
+    parser.error('--all_devices only applies to --target=android and --target=stub')
+  if args.target == 'replay' and not args.replay_trace:
+    parser.error('--target=replay needs --replay_trace')
+  if args.record_trace and (args.all_devices or args.target in ('replay', 'stub')):
+    parser.error('--record_trace records a single device or host session')
+  if (args.record_trace and args.target == 'android' and
+      (args.no_packet_logs or lldb_server_log_mode(args) != 'full')):
+    parser.error('--record_trace on Android needs the full lldb-server packet logs')
+  if args.target != 'host' and proxy_link(args):
+    parser.error('--proxy_* only apply to --target=host')
+  main(args)
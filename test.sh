@@ -1,6 +1,11 @@
 #!/bin/bash
 
 ANDROID_ABI=${ANDROID_ABI:-arm64-v8a}
+# Set TARGET=host to debug a local fixture process instead of a device.
+TARGET=${TARGET:-android}
+RESULTS_JSON=${RESULTS_JSON:-results/results.jsonl}
+# Set TRACE_JSON to a file path to record a Chrome trace-event timeline.
+TRACE_JSON=${TRACE_JSON:-}
 
 echo ""
 echo "=============================="
@@ -22,7 +27,12 @@ PYTHON="${PYTHON_DIR}/bin/python3"
 # We set PYTHONPATH this way so that Python can execute `import lldb`
 export PYTHONPATH=$("${LLDB}" -P)
 
-"$PYTHON" test.py --android_abi="${ANDROID_ABI}"
+TEST_ARGS=(--target="${TARGET}" --android_abi="${ANDROID_ABI}" --results_json="${RESULTS_JSON}")
+if [[ -n "${TRACE_JSON}" ]]; then
+  TEST_ARGS+=(--trace_json="${TRACE_JSON}")
+fi
+
+"$PYTHON" test.py "${TEST_ARGS[@]}"
 
 
 
@@ -0,0 +1,43 @@
+"""
+Shared fixtures for the harness tests.
+
+The tests run on the host without devices: adb is played by
+fake_adb_server.FakeAdbServer and lldb-server by lldb_server_stub. Tests of
+test.py itself need LLDB's Python bindings and are skipped without them.
+"""
+import importlib.util
+import os
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import adb_client
+import fake_adb_server
+
+
+@pytest.fixture(scope='session')
+def harness():
+  """test.py, loaded as a module. Its name would clash with the stdlib test package."""
+  pytest.importorskip('lldb')
+  spec = importlib.util.spec_from_file_location('harness', os.path.join(REPO_DIR, 'test.py'))
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  return module
+
+
+@pytest.fixture
+def adb_server():
+  """A running FakeAdbServer with one device, FAKE0001."""
+  with fake_adb_server.FakeAdbServer([fake_adb_server.FakeDevice('FAKE0001')]) as server:
+    yield server
+
+
+@pytest.fixture
+def adb(adb_server):
+  """An AdbClient talking to adb_server."""
+  client = adb_client.AdbClient(port=adb_server.port, start_server=False, timeout_seconds=5)
+  yield client
+  client.close()
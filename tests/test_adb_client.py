@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+import adb_client
+import fake_adb_server
+
+
+def test_host_services(adb, adb_server):
+  adb_server.add_device(fake_adb_server.FakeDevice('FAKE0002', state='offline'))
+  assert adb.version() == fake_adb_server.ADB_SERVER_VERSION
+  assert adb.devices() == [('FAKE0001', 'device'), ('FAKE0002', 'offline')]
+  assert adb.online_devices() == ['FAKE0001']
+  assert 'shell_v2' in adb.features('FAKE0001')
+
+
+def test_unknown_device_is_an_error(adb):
+  with pytest.raises(adb_client.AdbError, match='not found'):
+    adb.shell('NOPE', ['true'])
+
+
+def test_shell_v2_separates_streams_and_exit_code(adb):
+  result = adb.shell('FAKE0001', ['echo', 'hello'])
+  assert (result.returncode, result.stdout, result.stderr) == (0, b'hello\n', b'')
+
+  result = adb.shell('FAKE0001', 'cat /no/such/file')
+  assert result.returncode == 1
+  assert result.stdout == b''
+  assert b'No such file' in result.stderr
+  with pytest.raises(adb_client.AdbError, match='exit code 1'):
+    result.check('cat')
+
+  assert adb.getprop('FAKE0001', 'ro.build.version.sdk') == '34'
+
+
+def test_legacy_shell_has_one_stream_and_no_exit_code(adb, adb_server):
+  adb_server.add_device(fake_adb_server.FakeDevice('OLD0001', features=()))
+  result = adb.shell('OLD0001', 'cat /no/such/file')
+  assert result.returncode == 0
+  assert result.stderr == b''
+  assert b'No such file' in result.stdout
+
+
+def test_push_and_pull_over_one_sync_session(adb, adb_server, tmp_path):
+  # Larger than one sync DATA chunk.
+  data = bytes(range(256)) * (adb_client.SYNC_DATA_MAX // 128 + 3)
+  local = tmp_path / 'blob'
+  local.write_bytes(data)
+  local.chmod(0o751)
+
+  assert adb.push('FAKE0001', str(local), '/data/local/tmp/') == len(data)
+  mode, size, _ = adb.sync('FAKE0001').stat('/data/local/tmp/blob')
+  assert (mode & 0o777, size) == (0o751, len(data))
+
+  pulled = tmp_path / 'pulled'
+  assert adb.pull('FAKE0001', '/data/local/tmp/blob', str(pulled)) == len(data)
+  assert pulled.read_bytes() == data
+  assert adb_server.find_device('FAKE0001').files['/data/local/tmp/blob'][1] == data
+
+
+def test_shell_streams_stdout_into_a_file(adb, adb_server, tmp_path):
+  data = bytes(range(256)) * (adb_client.SYNC_DATA_MAX // 128 + 3)
+  adb_server.find_device('FAKE0001').files['/data/local/tmp/blob'] = (0o100644, data, 0)
+  with open(tmp_path / 'out', 'wb') as f:
+    process = adb.shell_popen('FAKE0001', 'cat /data/local/tmp/blob', stdout=f)
+    assert process.wait(5) == 0
+  assert (tmp_path / 'out').read_bytes() == data
+  assert process.communicate() == (b'', b'')
+
+
+def test_failed_pull_keeps_the_session_and_leaves_no_file(adb, tmp_path):
+  session = adb.sync('FAKE0001')
+  target = tmp_path / 'missing'
+  with pytest.raises(adb_client.AdbSyncError, match='No such file'):
+    adb.pull('FAKE0001', '/no/such/file', str(target))
+  assert list(tmp_path.iterdir()) == []
+  assert adb.sync('FAKE0001') is session
+  assert session.stat('/no/such/file') == (0, 0, 0)
+
+
+def test_track_devices_sends_every_change(adb, adb_server):
+  updates = adb.track_devices()
+  assert next(updates) == [('FAKE0001', 'device')]
+  adb_server.add_device(fake_adb_server.FakeDevice('FAKE0002'))
+  assert next(updates) == [('FAKE0001', 'device'), ('FAKE0002', 'device')]
+  adb_server.set_state('FAKE0001', 'offline')
+  assert next(updates) == [('FAKE0001', 'offline'), ('FAKE0002', 'device')]
+  adb_server.remove_device('FAKE0002')
+  assert next(updates) == [('FAKE0001', 'offline')]
+  updates.close()
+
+
+def test_track_devices_ends_when_the_server_goes_away(adb, adb_server):
+  updates = adb.track_devices()
+  next(updates)
+  adb_server.stop()
+  started = time.monotonic()
+  assert list(updates) == []
+  assert time.monotonic() - started < 5
@@ -0,0 +1,102 @@
+import os
+import struct
+
+import build_id_index
+
+BUILD_ID = bytes(range(20))
+NT_GNU_ABI_TAG = 1
+
+
+def note(byte_order, name, note_type, desc, align=4):
+  def pad(data):
+    return data + b'\0' * (-len(data) % align)
+  return struct.pack(byte_order + 'III', len(name), len(desc), note_type) + pad(name) + pad(desc)
+
+
+def write_elf(path, notes, elf_class=2, byte_order='<', sections=False, align=4):
+  """Writes an ELF file whose only program or section header covers `notes`."""
+  header_format, phdr_format, shdr_format = build_id_index._HEADER_FORMATS[elf_class]
+  ehsize = 16 + struct.calcsize(byte_order + header_format)
+  entry_format = shdr_format if sections else phdr_format
+  entsize = struct.calcsize(byte_order + entry_format)
+  notes_offset = ehsize + entsize
+
+  if sections:
+    entry = struct.pack(byte_order + shdr_format, 0, build_id_index.SHT_NOTE, 2, 0,
+                        notes_offset, len(notes), 0, 0, align, 0)
+    header = (2, 62, 1, 0, 0, ehsize, 0, ehsize, 0, 0, entsize, 1, 0)
+  else:
+    if elf_class == 2:
+      entry = struct.pack(byte_order + phdr_format, build_id_index.PT_NOTE, 4,
+                          notes_offset, 0, 0, len(notes), len(notes), align)
+    else:
+      entry = struct.pack(byte_order + phdr_format, build_id_index.PT_NOTE,
+                          notes_offset, 0, 0, len(notes), len(notes), 4, align)
+    header = (2, 62, 1, 0, ehsize, 0, 0, ehsize, entsize, 1, 0, 0, 0)
+  ident = build_id_index.ELF_MAGIC + bytes([elf_class, 1 if byte_order == '<' else 2, 1])
+  with open(path, 'wb') as f:
+    f.write(ident.ljust(16, b'\0'))
+    f.write(struct.pack(byte_order + header_format, *header))
+    f.write(entry)
+    f.write(notes)
+  return str(path)
+
+
+def test_build_id_from_program_headers(tmp_path):
+  notes = (note('<', b'GNU\0', NT_GNU_ABI_TAG, bytes(16)) +
+           note('<', b'GNU\0', build_id_index.NT_GNU_BUILD_ID, BUILD_ID))
+  path = write_elf(tmp_path / 'lib.so', notes)
+  assert build_id_index.read_build_id(path) == BUILD_ID.hex()
+
+
+def test_build_id_from_sections_of_big_endian_elf32(tmp_path):
+  notes = note('>', b'GNU\0', build_id_index.NT_GNU_BUILD_ID, BUILD_ID[:8])
+  path = write_elf(tmp_path / 'lib.debug', notes, elf_class=1, byte_order='>', sections=True)
+  assert build_id_index.read_build_id(path) == BUILD_ID[:8].hex()
+
+
+def test_notes_with_eight_byte_alignment(tmp_path):
+  notes = (note('<', b'Android\0', 1, bytes(5), align=8) +
+           note('<', b'GNU\0', build_id_index.NT_GNU_BUILD_ID, BUILD_ID, align=8))
+  path = write_elf(tmp_path / 'lib.so', notes, align=8)
+  assert build_id_index.read_build_id(path) == BUILD_ID.hex()
+
+
+def test_files_without_a_build_id(tmp_path):
+  other_note = note('<', b'GNU\0', NT_GNU_ABI_TAG, bytes(16))
+  assert build_id_index.read_build_id(write_elf(tmp_path / 'no-id.so', other_note)) is None
+
+  # A note whose descriptor runs past the end of the segment is ignored.
+  truncated = note('<', b'GNU\0', build_id_index.NT_GNU_BUILD_ID, BUILD_ID)[:-4]
+  assert build_id_index.read_build_id(write_elf(tmp_path / 'truncated.so', truncated)) is None
+
+  text = tmp_path / 'readme.txt'
+  text.write_text('not an ELF file, but long enough to have an ELF header' * 2)
+  assert build_id_index.read_build_id(str(text)) is None
+  assert build_id_index.read_build_id(str(tmp_path / 'missing.so')) is None
+
+
+def test_index_lookup_and_rescan(tmp_path):
+  symbols = tmp_path / 'symbols'
+  os.makedirs(symbols / 'lib')
+  notes = note('<', b'GNU\0', build_id_index.NT_GNU_BUILD_ID, BUILD_ID[:16])
+  library = write_elf(symbols / 'lib' / 'libfoo.so', notes)
+  (symbols / 'notes.txt').write_text('')
+
+  index = build_id_index.BuildIdIndex(str(tmp_path / 'index.json'))
+  stats = index.scan([str(symbols)])
+  assert (stats['files'], stats['read'], stats['reused']) == (2, 2, 0)
+  # LLDB prints UUIDs in upper case with dashes.
+  uuid = '00010203-0405-0607-0809-0A0B0C0D0E0F'
+  assert index.lookup(uuid) == [library]
+  index.save()
+
+  reloaded = build_id_index.BuildIdIndex(str(tmp_path / 'index.json'))
+  stats = reloaded.scan([str(symbols)])
+  assert (stats['read'], stats['reused']) == (0, 2)
+  assert reloaded.lookup(uuid) == [library]
+
+  os.remove(library)
+  stats = reloaded.scan([str(symbols)])
+  assert stats['removed'] == 1
+  assert reloaded.lookup(uuid) == []
@@ -0,0 +1,14 @@
+import hashlib
+import os
+
+
+def test_hash_file_caches_outside_the_source_tree(harness, tmp_path):
+  path = tmp_path / 'lldb-server'
+  path.write_bytes(b'first build')
+  assert harness.hash_file(str(path)) == hashlib.sha256(b'first build').hexdigest()
+  assert harness.hash_file(str(path)) == hashlib.sha256(b'first build').hexdigest()
+  assert os.listdir(tmp_path) == ['lldb-server']
+
+  path.write_bytes(b'second build, a different size')
+  assert harness.hash_file(str(path)) == hashlib.sha256(
+      b'second build, a different size').hexdigest()
@@ -0,0 +1,93 @@
+import pytest
+
+import adb_client
+import fake_adb_server
+import run_as_executor
+
+
+@pytest.fixture
+def device():
+  return fake_adb_server.FakeDevice('FAKE0001')
+
+
+def test_shell_sees_the_device_file_system(device):
+  device.files['/data/local/tmp/in'] = (0o100644, b'pushed\n', 0)
+  code, out, err = device.run_shell(
+    'cat /data/local/tmp/in; cp /data/local/tmp/in /data/local/tmp/out; '
+    'echo more >> /data/local/tmp/out; cat /data/local/tmp/missing')
+  assert (code, out) == (1, b'pushed\n')
+  assert err.endswith(b'/data/local/tmp/missing: No such file or directory\n')
+  assert device.files['/data/local/tmp/out'][1] == b'pushed\nmore\n'
+  assert '/data/local/tmp/out' in set(device.files)
+  del device.files['/data/local/tmp/out']
+  assert device.files.get('/data/local/tmp/out') is None
+  assert device.to_host('cat /data/x /database 2>/dev/null >a/data') == (
+    f'cat {device.root}/data/x /database 2>/dev/null >a/data')
+
+
+def test_shell_has_device_commands(device):
+  device.props['ro.test'] = "it's here"
+  assert device.run_shell('getprop ro.test; getprop ro.missing') == (0, b"it's here\n\n", b'')
+  assert b'[ro.test]: [it\'s here]\n' in device.run_shell('getprop')[1]
+  assert device.run_shell('pkill -9 lldb-server')[0] == 1
+  assert device.run_shell('pidof com.example.app')[0] == 1
+
+
+def test_run_as_runs_in_the_app_data_directory(device):
+  code, out, _ = device.run_shell("run-as com.example.app sh -c 'pwd; echo x > f'")
+  assert (code, out) == (0, b'/data/data/com.example.app\n')
+  assert device.files['/data/data/com.example.app/f'][1] == b'x\n'
+  assert device.run_shell('run-as')[0] == 1
+
+
+def test_run_batch_splits_every_command(adb):
+  results = run_as_executor.run_batch(
+      'FAKE0001', 'com.example.app',
+      ['echo one', 'cat /missing', 'printf "%s-%s\\n" a b'],
+      stop_on_error=False, client=adb)
+  assert [(r.command, r.returncode, r.stdout) for r in results] == [
+    ('echo one', 0, b'one\n'),
+    ('cat /missing', 1, b''),
+    ('printf "%s-%s\\n" a b', 0, b'a-b\n'),
+  ]
+  assert b'No such file' in results[1].stderr
+
+
+def test_run_batch_stops_on_error(adb):
+  results = run_as_executor.run_batch(
+      'FAKE0001', 'com.example.app', ['true', 'cat /missing', 'echo never'], client=adb)
+  assert [result.returncode for result in results] == [0, 1]
+
+
+def test_run_batch_deploys_like_push_lldb_server(adb, adb_server):
+  device = adb_server.find_device('FAKE0001')
+  device.files['/data/local/tmp/lldb-server'] = (0o100755, b'ELF', 0)
+  results = run_as_executor.run_batch('FAKE0001', 'com.example.app', [
+    'pkill -9 lldb-server',
+    'mkdir -p lldb/bin',
+    'cp /data/local/tmp/lldb-server lldb/bin',
+    "printf '%s\\n' 'abc  lldb-server' 'def  start_lldb_server.sh' > lldb/bin/.deploy-manifest",
+    'cat lldb/bin/.deploy-manifest',
+  ], stop_on_error=False, client=adb)
+  assert [result.returncode for result in results] == [1, 0, 0, 0, 0]
+  assert device.files['/data/data/com.example.app/lldb/bin/lldb-server'][1] == b'ELF'
+  assert results[-1].stdout == b'abc  lldb-server\ndef  start_lldb_server.sh\n'
+
+
+def test_run_batch_without_shell_v2(adb, adb_server):
+  adb_server.add_device(fake_adb_server.FakeDevice('OLD0001', features=()))
+  results = run_as_executor.run_batch('OLD0001', 'com.example.app', [
+    "printf '%s\\n' 'abc  lldb-server' > manifest",
+    'cat manifest',
+    'echo out; cat missing; echo more',
+  ], stop_on_error=False, client=adb)
+  assert [(r.returncode, r.stdout, r.stderr) for r in results[:2]] == [
+    (0, b'', b''), (0, b'abc  lldb-server\n', b'')]
+  # stderr is merged into stdout, without any markers in between.
+  assert results[2].returncode == 0
+  assert results[2].stdout.startswith(b'out\ncat: ')
+  assert results[2].stdout.endswith(b'missing: No such file or directory\nmore\n')
+  assert results[2].stderr == b''
+
+  with pytest.raises(adb_client.AdbError, match='unknown package: no/such'):
+    run_as_executor.run_batch('OLD0001', 'no/such', ['true'], client=adb)
@@ -0,0 +1,91 @@
+import gdb_remote_log
+
+GDB_SERVER_LOG = """\
+lldb             Some other log line
+1700000000.000 <   1> send packet: +
+1700000000.001 <  49> read packet: $qSupported:xmlRegisters=i386,arm,mips,arc#f9
+1700000000.002 < 100> send packet: $PacketSize=20000;QStartNoAckMode+#8b
+1700000000.003 <  19> read packet: $QStartNoAckMode#b0
+1700000000.004 <   6> send packet: $OK#9a
+1700000000.010 <  18> read packet: $vAttach;1234#xx
+1700000000.200 <  30> send packet: $T13thread:4d2;#xx
+1700000000.210 <  20> read packet: $qfThreadInfo#bb
+1700000000.211 <  20> send packet: $m4d2#xx
+1700000000.212 <  21> read packet: $m7fff0000,200#xx
+1700000000.213 <  21> read packet: $m7fff0200,200#xx
+1700000000.300 <   5> read packet: \x03
+"""
+
+PLATFORM_LOG = """\
+<  30> read packet: $qLaunchGDBServer;host:localhost;#xx
+<  40> send packet: $pid:5;port:4000;#xx
+"""
+
+
+def test_packet_type():
+  assert gdb_remote_log.packet_type('$qXfer:libraries-svr4:read::0,fff#xx') == 'qXfer:libraries-svr4'
+  assert gdb_remote_log.packet_type('$vAttach;1234#xx') == 'vAttach'
+  assert gdb_remote_log.packet_type('$m7fff0000,200#xx') == 'm'
+  assert gdb_remote_log.packet_type('$qSupported:xmlRegisters=arm#f9') == 'qSupported'
+  assert gdb_remote_log.packet_type('$#00') == '<empty>'
+  assert gdb_remote_log.packet_type('+') == '+'
+
+
+def test_parse_packets_skips_other_lines():
+  packets = list(gdb_remote_log.parse_packets(GDB_SERVER_LOG.splitlines()))
+  assert len(packets) == 12
+  first = packets[0]
+  assert (first.timestamp, first.direction, first.size, first.type) == (
+      1700000000.0, 'send', 1, '+')
+  assert not first.is_request
+  assert packets[1].is_request
+  assert packets[-1].type == '\x03' and not packets[-1].is_request
+
+
+def test_parse_packets_without_timestamps():
+  packets = list(gdb_remote_log.parse_packets(PLATFORM_LOG.splitlines()))
+  assert [(p.timestamp, p.size, p.type) for p in packets] == [
+      (None, 30, 'qLaunchGDBServer'), (None, 40, 'p')]
+
+
+def test_phases_split_at_attach_and_its_stop_reply():
+  packets = gdb_remote_log.assign_phases(
+      gdb_remote_log.parse_packets(GDB_SERVER_LOG.splitlines()))
+  phases = [(packet.type, packet.phase) for packet in packets]
+  assert phases == [
+    ('+', 'handshake'),
+    ('qSupported', 'handshake'),
+    ('P', 'handshake'),
+    ('QStartNoAckMode', 'handshake'),
+    ('O', 'handshake'),
+    ('vAttach', 'attach'),
+    ('T', 'attach'),
+    ('qfThreadInfo', 'inspect'),
+    # A reply that looks like a stop reply after the attach is not special.
+    ('m', 'inspect'),
+    ('m', 'inspect'),
+    ('m', 'inspect'),
+    ('\x03', 'inspect'),
+  ]
+
+
+def test_platform_packets_are_all_in_the_platform_phase():
+  packets = gdb_remote_log.assign_phases(
+      gdb_remote_log.parse_packets(PLATFORM_LOG.splitlines()), platform=True)
+  assert {packet.phase for packet in packets} == {'platform'}
+
+
+def test_analyze(tmp_path):
+  platform_log = tmp_path / 'platform.log'
+  platform_log.write_text(PLATFORM_LOG)
+  gdb_server_log = tmp_path / 'gdb-server.log'
+  gdb_server_log.write_text(GDB_SERVER_LOG)
+
+  report = gdb_remote_log.analyze(str(platform_log), str(gdb_server_log))
+  assert report['packets'] == 14
+  assert report['round_trips'] == {'platform': 1, 'handshake': 2, 'attach': 1, 'inspect': 3}
+  assert report['bytes'] == {'read': 30 + 49 + 19 + 18 + 20 + 21 + 21 + 5,
+                             'send': 40 + 1 + 100 + 6 + 30 + 20}
+  assert report['seconds_by_phase']['attach'] == 1700000000.200 - 1700000000.010
+  assert report['longest_runs']['m'] == 2
+  assert report['counts_by_type']['m'] == 2
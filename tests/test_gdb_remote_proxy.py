@@ -0,0 +1,147 @@
+import socket
+import threading
+import time
+
+import gdb_remote_proxy
+
+
+def test_split_packets_frames_packets_and_keeps_the_rest():
+  buffer = b'+$qC#b4\x03%Stop:T05#xx-junk$m10,4#'
+  packets, rest = gdb_remote_proxy.split_packets(buffer)
+  assert packets == [b'+', b'$qC#b4', b'\x03', b'%Stop:T05#xx', b'-', b'junk']
+  assert rest == b'$m10,4#'
+  # The checksum completes the packet.
+  packets, rest = gdb_remote_proxy.split_packets(rest + b'9')
+  assert (packets, rest) == ([], b'$m10,4#9')
+  packets, rest = gdb_remote_proxy.split_packets(rest + b'8+')
+  assert (packets, rest) == ([b'$m10,4#98', b'+'], b'')
+
+
+def test_launch_reply_port_is_rewritten():
+  reply = gdb_remote_proxy.make_packet(b'pid:1234;port:5039;')
+  assert gdb_remote_proxy.launch_reply_target(reply) == ('port', 5039)
+  rewritten = gdb_remote_proxy.retarget_launch_reply(reply, 'port', 6000)
+  assert rewritten == gdb_remote_proxy.make_packet(b'pid:1234;port:6000;')
+
+
+def test_launch_reply_socket_name_is_rewritten():
+  name = '/com.example.app/gdbserver.1'
+  reply = gdb_remote_proxy.make_packet(
+      b'pid:1234;port:0;socket_name:' + name.encode().hex().encode() + b';')
+  assert gdb_remote_proxy.launch_reply_target(reply) == ('socket_name', name)
+  rewritten = gdb_remote_proxy.retarget_launch_reply(reply, 'socket_name', name + '.proxy')
+  assert gdb_remote_proxy.launch_reply_target(rewritten) == ('socket_name', name + '.proxy')
+  assert b'pid:1234;port:0;' in rewritten
+
+
+def test_launch_reply_without_a_target():
+  assert gdb_remote_proxy.launch_reply_target(b'$pid:1234;port:0;#00') is None
+  assert gdb_remote_proxy.launch_reply_target(b'$E01#a6') is None
+
+
+class PacketServer:
+  """A TCP server that acks every packet and replies with reply(payload)."""
+
+  def __init__(self, reply):
+    self.reply = reply
+    self.listener = socket.socket()
+    self.listener.bind(('127.0.0.1', 0))
+    self.listener.listen(4)
+    self.port = self.listener.getsockname()[1]
+    threading.Thread(target=self._accept, daemon=True).start()
+
+  def _accept(self):
+    while True:
+      try:
+        sock, _ = self.listener.accept()
+      except OSError:
+        return
+      threading.Thread(target=self._serve, args=(sock,), daemon=True).start()
+
+  def _serve(self, sock):
+    buffer = b''
+    with sock:
+      while True:
+        data = sock.recv(4096)
+        if not data:
+          return
+        packets, buffer = gdb_remote_proxy.split_packets(buffer + data)
+        for packet in packets:
+          if packet.startswith(b'$'):
+            payload = gdb_remote_proxy.payload_of(packet)
+            sock.sendall(b'+' + gdb_remote_proxy.make_packet(self.reply(payload)))
+
+  def close(self):
+    self.listener.close()
+
+
+def request(sock, payload):
+  """Sends a packet and returns the payload of the reply, after its ack."""
+  sock.sendall(gdb_remote_proxy.make_packet(payload))
+  buffer = b''
+  while True:
+    packets, buffer = gdb_remote_proxy.split_packets(buffer + sock.recv(4096))
+    for packet in packets:
+      if packet.startswith(b'$'):
+        return gdb_remote_proxy.payload_of(packet)
+
+
+def round_trips(proxy, count):
+  """Returns the proxy's round trips once it has recorded `count` of them."""
+  # The proxy records a round trip right after the reply went out.
+  deadline = time.monotonic() + 5
+  while True:
+    summary = proxy.summary()
+    if (sum(stats['count'] for stats in summary['round_trips'].values()) >= count or
+        time.monotonic() > deadline):
+      return summary['round_trips']
+
+
+def start_proxy(server, latency_ms=0.0):
+  proxy = gdb_remote_proxy.Proxy(
+      gdb_remote_proxy.Address('tcp://127.0.0.1:0'),
+      gdb_remote_proxy.Address(f'tcp://127.0.0.1:{server.port}'),
+      gdb_remote_proxy.LinkConfig(latency_ms=latency_ms, seed=1))
+  proxy.start()
+  return proxy, proxy._listeners[0].getsockname()[1]
+
+
+def test_launched_gdb_server_is_reached_through_the_proxy():
+  gdb_server = PacketServer(lambda payload: b'gdb-server:' + payload)
+  platform = PacketServer(
+      lambda payload: b'pid:42;port:%d;' % gdb_server.port
+      if payload.startswith(b'qLaunchGDBServer') else b'OK')
+  proxy, port = start_proxy(platform)
+  try:
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+      kind, proxy_port = gdb_remote_proxy.launch_reply_target(
+          b'$' + request(sock, b'qLaunchGDBServer;host:localhost;') + b'#00')
+    assert kind == 'port' and proxy_port not in (gdb_server.port, port)
+    with socket.create_connection(('127.0.0.1', proxy_port)) as sock:
+      assert request(sock, b'qC') == b'gdb-server:qC'
+    assert set(round_trips(proxy, 2)) == {'qLaunchGDBServer', 'qC'}
+    assert proxy.summary()['connections'] == 2
+  finally:
+    proxy.close()
+    platform.close()
+    gdb_server.close()
+
+
+def test_link_latency_delays_both_directions():
+  server = PacketServer(lambda payload: b'OK')
+  proxy, port = start_proxy(server, latency_ms=20)
+  try:
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+      sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+      seconds = []
+      for _ in range(5):
+        start = time.monotonic()
+        assert request(sock, b'qC') == b'OK'
+        seconds.append(time.monotonic() - start)
+    # 20 ms each way: the request, then the ack and reply.
+    assert 0.040 <= min(seconds) < 0.080
+    assert round_trips(proxy, 5)['qC']['count'] == 5
+    assert proxy.summary()['delay_seconds']['read'] >= 5 * 0.020
+  finally:
+    proxy.close()
+    server.close()
@@ -0,0 +1,108 @@
+import socket
+
+import gdb_remote_proxy
+import gdb_remote_replay
+import gdb_remote_trace
+
+
+class FakeServer:
+  """The parts of a ReplayServer a _Replayer uses."""
+  realtime = False
+
+  def __init__(self):
+    self.stats = gdb_remote_replay.ReplayStats()
+
+
+def recorded(*exchanges):
+  """Returns a recorded Connection of (request, reply) payload pairs."""
+  connection = gdb_remote_trace.Connection(0, 'gdb-server')
+  for i, (request, reply) in enumerate(exchanges):
+    connection.records.append((gdb_remote_trace.CLIENT, gdb_remote_proxy.make_packet(request), i))
+    connection.records.append((gdb_remote_trace.SERVER, gdb_remote_proxy.make_packet(reply), i))
+  return connection
+
+
+def test_match_falls_back_in_order():
+  server = FakeServer()
+  replayer = gdb_remote_replay._Replayer(server, None, recorded(
+      (b'qA', b'1'), (b'qB', b'2'), (b'm1000,4', b'3'), (b'qC', b'4'), (b'm2000,4', b'5')))
+
+  def match(payload):
+    exchange = replayer._match(gdb_remote_proxy.make_packet(payload))
+    return gdb_remote_proxy.payload_of(exchange.replies[0][0]) if exchange else None
+
+  assert match(b'qA') == b'1'
+  assert match(b'm1000,4') == b'3'
+  assert replayer.cursor == 3
+  assert match(b'qA') == b'1'
+  assert replayer.cursor == 3
+  # A memory read at another address: the next read ahead, then any read.
+  assert match(b'm3000,4') == b'5'
+  assert match(b'm4000,4') == b'3'
+  assert match(b'qUnknown') is None
+  assert server.stats.summary() == {
+    'connections': {},
+    'matches': {'exact': 1, 'skipped': 1, 'repeated': 1, 'same_type': 2, 'unmatched': 1},
+    'unmatched_types': {'qUnknown': 1},
+  }
+
+
+def test_lookahead_is_limited(monkeypatch):
+  monkeypatch.setattr(gdb_remote_replay, 'LOOKAHEAD', 2)
+  server = FakeServer()
+  replayer = gdb_remote_replay._Replayer(server, None, recorded(
+      (b'qA', b'1'), (b'qB', b'2'), (b'qC', b'3')))
+  # Out of reach of the lookahead, so it counts as a repeat and keeps the cursor.
+  assert replayer._match(gdb_remote_proxy.make_packet(b'qC')) is not None
+  assert replayer.cursor == 0
+  assert server.stats.summary()['matches'] == {'repeated': 1}
+
+
+def read_packet(sock, buffer):
+  while True:
+    packets, rest = gdb_remote_proxy.split_packets(buffer)
+    if packets:
+      return packets[0], b''.join(packets[1:]) + rest
+    buffer += sock.recv(65536)
+
+
+def test_replay_over_a_socket(tmp_path):
+  path = str(tmp_path / 'trace.bin')
+  writer = gdb_remote_trace.TraceWriter(path, {'process_names': ['com.example.app']})
+  platform = writer.open_connection('platform', 0.0)
+  for data, from_client in ((b'$QStartNoAckMode#b0', True), (b'+', False),
+                            (b'$OK#9a', False),
+                            (b'$qLaunchGDBServer;host:localhost;#xx', True),
+                            (b'$pid:5;port:4000;#xx', False)):
+    writer.packet(platform, from_client, data, 0.0)
+  gdb_server = writer.open_connection('gdb-server', 0.0)
+  writer.packet(gdb_server, True, b'$qC#b4', 0.0)
+  writer.packet(gdb_server, False, b'+$QC5#ca', 0.0)
+  writer.close()
+
+  server = gdb_remote_replay.ReplayServer(
+      path, gdb_remote_proxy.Address('tcp://127.0.0.1:0'))
+  server.start()
+  try:
+    with socket.create_connection(('127.0.0.1', server._listeners[0].getsockname()[1]),
+                                  timeout=5) as sock:
+      sock.sendall(b'$QStartNoAckMode#b0')
+      packet, buffer = read_packet(sock, b'')
+      assert packet == b'+'
+      packet, buffer = read_packet(sock, buffer)
+      assert packet == b'$OK#9a'
+      # Not in the trace: an empty reply, without an ack in no-ack mode.
+      sock.sendall(b'$qUnknown#xx')
+      packet, buffer = read_packet(sock, buffer)
+      assert packet == b'$#00'
+      sock.sendall(b'$qLaunchGDBServer;host:localhost;#xx')
+      packet, buffer = read_packet(sock, buffer)
+      kind, port = gdb_remote_proxy.launch_reply_target(packet)
+      assert kind == 'port' and port != 4000
+
+    with socket.create_connection(('127.0.0.1', port), timeout=5) as sock:
+      sock.sendall(b'$qC#b4')
+      assert read_packet(sock, b'') == (b'+', b'$QC5#ca')
+    assert server.summary()['connections'] == {'platform': 1, 'gdb-server': 1}
+  finally:
+    server.close()
@@ -0,0 +1,91 @@
+import pytest
+
+import gdb_remote_trace
+
+GDB_SERVER_LOG = """\
+1700000000.000 <   1> read packet: +
+1700000000.001 <  19> read packet: $QStartNoAckMode#b0
+1700000000.002 <   1> send packet: +
+1700000000.003 <   6> send packet: $OK#9a
+1700000000.250 <   5> read packet: \\x03
+1700000000.300 <  19> read packet: $QStartNoAckMode#b0
+1700000000.301 <   6> send packet: $OK#9a
+"""
+
+PLATFORM_LOG = """\
+<  30> read packet: $qLaunchGDBServer;host:localhost;#xx
+<  40> send packet: $pid:5;port:4000;#xx
+"""
+
+
+def test_trace_round_trip(tmp_path):
+  path = str(tmp_path / 'trace.bin')
+  writer = gdb_remote_trace.TraceWriter(path, {'process_names': ['com.example.app']})
+  platform = writer.open_connection('platform', timestamp=10.0)
+  writer.packet(platform, True, b'$qC#b4', timestamp=10.5)
+  gdb_server = writer.open_connection('gdb-server', timestamp=11.0)
+  writer.packet(platform, False, b'$QC1#c5', timestamp=12.0)
+  writer.packet(gdb_server, True, b'\x03', timestamp=11.25)
+  writer.close_connection(platform, timestamp=12.0)
+  writer.close()
+
+  metadata, records = gdb_remote_trace.read_records(path)
+  assert metadata == {'process_names': ['com.example.app']}
+  assert list(records) == [
+    (gdb_remote_trace.OPEN, 0, 0.0, b'platform'),
+    (gdb_remote_trace.CLIENT, 0, 0.5, b'$qC#b4'),
+    (gdb_remote_trace.OPEN, 1, 1.0, b'gdb-server'),
+    (gdb_remote_trace.SERVER, 0, 2.0, b'$QC1#c5'),
+    (gdb_remote_trace.CLIENT, 1, 0.25, b'\x03'),
+    (gdb_remote_trace.CLOSE, 0, 2.0, b''),
+  ]
+  assert gdb_remote_trace.info(path)['connections'] == [
+    {'id': 0, 'kind': 'platform', 'client_packets': 1, 'server_packets': 1, 'bytes': 13},
+    {'id': 1, 'kind': 'gdb-server', 'client_packets': 1, 'server_packets': 0, 'bytes': 1},
+  ]
+
+
+def test_truncated_and_foreign_files_are_rejected(tmp_path):
+  path = tmp_path / 'trace.bin'
+  writer = gdb_remote_trace.TraceWriter(str(path))
+  writer.packet(writer.open_connection('platform', timestamp=1.0), True, b'$qC#b4', 1.0)
+  writer.close()
+  path.write_bytes(path.read_bytes()[:-1])
+  _, records = gdb_remote_trace.read_records(str(path))
+  with pytest.raises(gdb_remote_trace.TraceError, match='truncated'):
+    list(records)
+
+  path.write_bytes(b'1700000000.000 <   1> read packet: +\n')
+  with pytest.raises(gdb_remote_trace.TraceError, match='not a version'):
+    gdb_remote_trace.read_metadata(str(path))
+
+
+def test_from_logs_splits_connections_at_no_ack_mode(tmp_path):
+  platform_log = tmp_path / 'platform.log'
+  platform_log.write_text(PLATFORM_LOG)
+  gdb_server_log = tmp_path / 'gdb-server.log'
+  gdb_server_log.write_text(GDB_SERVER_LOG)
+  path = str(tmp_path / 'trace.bin')
+
+  assert gdb_remote_trace.from_logs(
+      path, str(platform_log), str(gdb_server_log), {'serial': 'FAKE0001'}) == 3
+  metadata, connections = gdb_remote_trace.load(path)
+  assert metadata == {'serial': 'FAKE0001', 'source': 'lldb-server logs'}
+  assert [connection.kind for connection in connections] == [
+    'platform', 'gdb-server', 'gdb-server']
+
+  platform, first, second = connections
+  # Logs without timestamps give a trace without timing.
+  assert platform.records == [
+    (gdb_remote_trace.CLIENT, b'$qLaunchGDBServer;host:localhost;#xx', 0.0),
+    (gdb_remote_trace.SERVER, b'$pid:5;port:4000;#xx', 0.0),
+  ]
+  assert [(kind, data) for kind, data, _ in first.records] == [
+    (gdb_remote_trace.CLIENT, b'+'),
+    (gdb_remote_trace.CLIENT, b'$QStartNoAckMode#b0'),
+    (gdb_remote_trace.SERVER, b'+'),
+    (gdb_remote_trace.SERVER, b'$OK#9a'),
+    (gdb_remote_trace.CLIENT, b'\x03'),
+  ]
+  assert first.records[-1][2] == pytest.approx(0.25, abs=1e-5)
+  assert [data for _, data, _ in second.records] == [b'$QStartNoAckMode#b0', b'$OK#9a']
@@ -0,0 +1,83 @@
+import argparse
+import queue
+import threading
+
+import pytest
+
+import adb_client
+import gh_test_runner_manager
+
+
+def test_wait_for_device_change_returns_the_newest_event():
+  events = queue.Queue()
+  assert gh_test_runner_manager.wait_for_device_change(events, 0.01) is None
+  events.put(['A'])
+  events.put(['A', 'B'])
+  assert gh_test_runner_manager.wait_for_device_change(events, None) == ['A', 'B']
+  events.put(['A'])
+  events.put(gh_test_runner_manager.TRACKING_LOST)
+  assert (gh_test_runner_manager.wait_for_device_change(events, None) is
+          gh_test_runner_manager.TRACKING_LOST)
+
+
+def test_tracking_reports_changes_and_a_lost_stream_once(adb, adb_server, monkeypatch):
+  monkeypatch.setattr(gh_test_runner_manager, 'log', lambda message: None)
+  resubscribed = threading.Event()
+
+  class Client:
+    subscriptions = 0
+
+    def track_devices(self):
+      Client.subscriptions += 1
+      if Client.subscriptions > 1:
+        # Stay on the resubscription for the rest of the test run.
+        resubscribed.set()
+        threading.Event().wait()
+      return adb.track_devices()
+
+  monkeypatch.setattr(adb_client, 'get_default_client', Client)
+  events = queue.Queue()
+  threading.Thread(target=gh_test_runner_manager.track_online_devices,
+                   args=(events,), daemon=True).start()
+
+  assert events.get(timeout=5) == ['FAKE0001']
+  adb_server.set_state('FAKE0001', 'offline')
+  assert events.get(timeout=5) == []
+  adb_server.stop()
+  assert events.get(timeout=5) is gh_test_runner_manager.TRACKING_LOST
+  assert resubscribed.wait(5)
+  assert events.empty()
+
+
+def test_failed_runner_start_is_retried_while_tracking(monkeypatch):
+  manager = gh_test_runner_manager
+  monkeypatch.setattr(manager, 'log', lambda message: None)
+  monkeypatch.setattr(manager, 'parse_args', lambda: argparse.Namespace(
+    github_url='', runner_base_dir='', poll_interval_seconds=7, no_track_devices=False))
+  # Tracking is up, but reports no changes.
+  monkeypatch.setattr(manager, 'track_online_devices', lambda device_events: None)
+  monkeypatch.setattr(manager, 'get_online_devices', lambda: ['FAKE0001'])
+  starts = []
+
+  def start_runner(serial, args):
+    starts.append(serial)
+    # The first start fails.
+    return object() if len(starts) > 1 else None
+
+  class Stop(Exception):
+    pass
+
+  timeouts = []
+
+  def wait_for_device_change(device_events, timeout_seconds):
+    timeouts.append(timeout_seconds)
+    if len(timeouts) == 3:
+      raise Stop()
+    return None if timeout_seconds is not None else ['FAKE0001']
+
+  monkeypatch.setattr(manager, 'start_runner', start_runner)
+  monkeypatch.setattr(manager, 'wait_for_device_change', wait_for_device_change)
+  with pytest.raises(Stop):
+    manager.main()
+  assert starts == ['FAKE0001', 'FAKE0001']
+  assert timeouts == [7, None, None]
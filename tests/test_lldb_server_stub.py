@@ -0,0 +1,98 @@
+import socket
+import struct
+
+import gdb_remote_proxy
+import lldb_server_stub
+
+
+class Client:
+  """A gdb-remote client over a plain socket, the way LLDB talks to lldb-server."""
+
+  def __init__(self, port):
+    self.sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    self.buffer = b''
+    assert self.request('QStartNoAckMode', ack=True) == 'OK'
+
+  def read_packet(self):
+    while True:
+      packets, self.buffer = gdb_remote_proxy.split_packets(self.buffer)
+      if packets:
+        self.buffer = b''.join(packets[1:]) + self.buffer
+        return packets[0]
+      self.buffer += self.sock.recv(65536)
+
+  def request(self, payload, ack=False):
+    """Sends a packet and returns the payload of its reply."""
+    self.sock.sendall(gdb_remote_proxy.make_packet(payload.encode('latin-1')))
+    if ack:
+      assert self.read_packet() == b'+'
+    return gdb_remote_proxy.payload_of(self.read_packet()).decode('latin-1')
+
+  def close(self):
+    self.sock.close()
+
+
+def stop_fields(reply):
+  return dict(field.split(':', 1) for field in reply[3:].split(';') if field)
+
+
+def test_platform_finds_the_app_and_launches_a_gdb_server():
+  device = lldb_server_stub.Device(0, 'com.example.app', processes=5)
+  server = lldb_server_stub.StubServer([device])
+  server.start()
+  platform = Client(server.ports['stub-0'])
+
+  reply = platform.request('qPlatform_shell:' + b'pidof com.example.app'.hex() + ',a')
+  assert reply == f'F,00000000,00000000,{device.app.pid}\n'
+  assert platform.request('qPlatform_shell:' + b'pidof nothing'.hex() + ',a').startswith('F,00000001')
+
+  reply = platform.request('qfProcessInfo:name:' + b'com.example.app'.hex() + ';')
+  assert f'pid:{device.app.pid};' in reply
+  assert platform.request('qsProcessInfo') == 'E04'
+  assert platform.request('qUnsupported') == ''
+
+  reply = platform.request('qLaunchGDBServer;host:localhost;')
+  kind, port = gdb_remote_proxy.launch_reply_target(gdb_remote_proxy.make_packet(reply.encode()))
+  assert kind == 'port'
+  gdb_server = Client(port)
+  assert gdb_server.request('qC') == 'E01'
+  platform.close()
+  gdb_server.close()
+
+
+def test_gdb_server_attaches_unwinds_and_detaches():
+  device = lldb_server_stub.Device(0, 'com.example.app', threads=2, modules=2, regions=1, depth=3)
+  server = lldb_server_stub.StubServer([device])
+  server.start()
+  port, _ = server.launch_gdb_server(device)
+  gdb_server = Client(port)
+  app = device.app
+
+  reply = gdb_server.request(f'vAttach;{app.pid:x}')
+  assert reply.startswith('T13')
+  fields = stop_fields(reply)
+  assert fields['thread'] == f'{app.pid:x}'
+  assert fields['threads'] == f'{app.pid:x},{app.pid + 1:x}'
+
+  # The frame pointer chain is in the stack memory.
+  main = app.threads[0]
+  fp, return_address = main.frames[0]
+  assert gdb_server.request(f'p6;thread:{main.tid:x};') == struct.pack('<Q', fp).hex()
+  words = bytes.fromhex(gdb_server.request(f'm{fp:x},10'))
+  assert struct.unpack('<QQ', words) == (main.frames[1][0], return_address)
+  assert gdb_server.request('m10,8') == 'E14'
+
+  # Continuing replies only when interrupted.
+  gdb_server.sock.sendall(gdb_remote_proxy.make_packet(b'c'))
+  gdb_server.sock.sendall(b'\x03')
+  assert gdb_server.read_packet().startswith(b'$T13')
+
+  # The app can only be attached once at a time.
+  port, _ = server.launch_gdb_server(device)
+  other = Client(port)
+  assert other.request(f'vAttach;{app.pid:x}') == 'E01'
+  assert gdb_server.request('D') == 'OK'
+  assert other.request(f'vAttach;{app.pid:x}').startswith('T13')
+  assert server.stats.summary()['attaches'] == 2
+  gdb_server.close()
+  other.close()
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import metrics
+
+
+def test_phases_are_recorded_in_order_even_when_they_fail():
+  record = metrics.RunRecord(serial='FAKE0001')
+  with record.phase('launch_app'):
+    pass
+  with pytest.raises(RuntimeError):
+    with record.phase('attach'):
+      raise RuntimeError('attach failed')
+  assert [(phase['name'], phase['ok']) for phase in record.phases] == [
+      ('launch_app', True), ('attach', False)]
+  assert all(phase['seconds'] >= 0 for phase in record.phases)
+
+
+def test_records_are_appended_as_json_lines(tmp_path):
+  path = tmp_path / 'results' / 'runs.jsonl'
+  for status in ('passed', 'failed'):
+    record = metrics.RunRecord(serial='FAKE0001')
+    with record.phase('attach'):
+      pass
+    record.finish(status, error=None if status == 'passed' else 'boom')
+    record.append_json(str(path))
+
+  lines = [json.loads(line) for line in path.read_text().splitlines()]
+  assert [line['status'] for line in lines] == ['passed', 'failed']
+  assert lines[1]['error'] == 'boom'
+  assert lines[0]['metadata'] == {'serial': 'FAKE0001'}
+  assert lines[0]['phases'][0]['name'] == 'attach'
+  assert lines[0]['total_seconds'] >= 0
+
+
+def test_percentile_of_nothing_is_none():
+  assert metrics.percentile([], 50) is None
+
+
+def test_percentile_of_one_value():
+  assert metrics.percentile([7], 0) == 7
+  assert metrics.percentile([7], 99) == 7
+
+
+def test_percentile_interpolates_between_values():
+  values = [1, 2, 3, 4]
+  assert metrics.percentile(values, 0) == 1
+  assert metrics.percentile(values, 50) == 2.5
+  assert metrics.percentile(values, 90) == pytest.approx(3.7)
+  assert metrics.percentile(values, 100) == 4
+
+
+def test_summarize():
+  summary = metrics.summarize([3, 1, 2, 10])
+  assert summary['count'] == 4
+  assert summary['min'] == 1
+  assert summary['max'] == 10
+  assert summary['median'] == 2.5
+  assert summary['mean'] == 4
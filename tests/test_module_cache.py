@@ -0,0 +1,195 @@
+import concurrent.futures
+import os
+import shutil
+import stat
+import threading
+import time
+
+import pytest
+
+import fake_adb_server
+import lldb_server_stub
+import module_cache
+
+LIBRARIES = module_cache.core_libraries('arm64-v8a')[:4]
+
+
+def make_device(serial, build):
+  device = fake_adb_server.FakeDevice(serial, props={'ro.build.fingerprint': build})
+  for path in LIBRARIES:
+    device.files[path] = (stat.S_IFREG | 0o644, f'{build}:{path}'.encode('utf-8'), 0)
+  return device
+
+
+def test_devices_of_different_builds_prewarm_at_once(adb, adb_server, tmp_path):
+  builds = {'FAKEA': 'vendor/a:14/A.1/1:user/release-keys',
+            'FAKEB': 'vendor/b:13/B.2/2:user/release-keys'}
+  for serial, build in builds.items():
+    adb_server.add_device(make_device(serial, build))
+  cache = module_cache.ModuleCache(str(tmp_path), max_bytes=1 << 30)
+
+  start = threading.Barrier(len(builds))
+  def prewarm(serial):
+    start.wait()
+    return cache.prewarm(serial, builds[serial], LIBRARIES, client=adb)
+
+  with concurrent.futures.ThreadPoolExecutor(len(builds)) as executor:
+    results = dict(zip(builds, executor.map(prewarm, builds)))
+
+  for serial, (entry, stats) in results.items():
+    assert entry.fingerprint == builds[serial]
+    assert stats['misses'] == len(LIBRARIES)
+    for path in LIBRARIES:
+      with open(os.path.join(entry.sysroot, path.lstrip('/')), 'rb') as f:
+        assert f.read() == f'{builds[serial]}:{path}'.encode('utf-8')
+  entry_a, entry_b = results['FAKEA'][0], results['FAKEB'][0]
+  assert entry_a.sysroot != entry_b.sysroot
+  assert entry_a.lldb_cache_dir == entry_b.lldb_cache_dir == cache.lldb_cache_dir
+
+  # A second device of build A only hits the cache.
+  adb_server.add_device(make_device('FAKEA2', builds['FAKEA']))
+  _, stats = cache.prewarm('FAKEA2', builds['FAKEA'], LIBRARIES, client=adb)
+  assert (stats['hits'], stats['misses']) == (len(LIBRARIES), 0)
+
+
+def add_entry(cache, fingerprint, size=1024):
+  """Creates a cache entry with one library of `size` bytes, as if prewarmed."""
+  with cache._locked(fingerprint) as entry:
+    os.makedirs(os.path.join(entry, 'sysroot', 'system'))
+    with open(os.path.join(entry, 'sysroot', 'system', 'libc.so'), 'wb') as f:
+      f.write(bytes(size))
+    cache._touch(entry)
+  # last_used has a resolution of whatever time.time() offers.
+  time.sleep(0.01)
+  return entry
+
+
+def test_eviction_removes_least_recently_used_first(tmp_path):
+  cache = module_cache.ModuleCache(str(tmp_path), max_bytes=2500)
+  oldest = add_entry(cache, 'old')
+  add_entry(cache, 'middle')
+  add_entry(cache, 'new')
+  assert cache.evict() == 1
+  assert not os.path.exists(oldest)
+  assert cache.stats()['evictions'] == 1
+
+
+def test_lldb_cache_counts_and_is_evicted_by_last_use(adb, adb_server, tmp_path):
+  build = 'vendor/a:14/A.1/1:user/release-keys'
+  adb_server.add_device(make_device('FAKEA', build))
+  cache = module_cache.ModuleCache(str(tmp_path), max_bytes=1 << 30)
+  oldest = add_entry(cache, 'old')
+  entry, _ = cache.prewarm('FAKEA', build, LIBRARIES, client=adb)
+  # LLDB hard links what it downloads; the link is not counted twice.
+  module = os.path.join(cache.lldb_cache_dir, 'remote-android', '.cache', 'UUID', 'libc.so')
+  os.makedirs(os.path.dirname(module))
+  with open(module, 'wb') as f:
+    f.write(bytes(4096))
+  os.link(module, os.path.join(cache.lldb_cache_dir, 'remote-android', 'libc.so'))
+  assert 4096 <= module_cache._directory_size(cache.lldb_cache_dir) < 8192
+  time.sleep(0.01)
+  newest = add_entry(cache, 'new')
+
+  cache.max_bytes = sum(module_cache._directory_size(path) for path in (
+    oldest, entry.directory, cache.lldb_cache_dir, newest)) - 1
+  assert cache.evict() == 1
+  assert not os.path.exists(oldest)
+
+  # The cache is still over budget without the oldest entry.
+  cache.max_bytes = 4096
+  assert cache.evict() == 2
+  assert not os.path.exists(entry.directory)
+  assert not os.path.exists(cache.lldb_cache_dir)
+  assert os.path.exists(newest)
+
+
+def test_stats_updates_from_many_processes_add_up(tmp_path):
+  cache = module_cache.ModuleCache(str(tmp_path), max_bytes=0)
+  with concurrent.futures.ProcessPoolExecutor(4) as executor:
+    list(executor.map(cache._record_stats, [{'hits': 1, 'misses': 2}] * 100))
+  assert cache.stats() == {'hits': 100, 'misses': 200}
+
+
+def test_eviction_skips_locked_entries(tmp_path):
+  cache = module_cache.ModuleCache(str(tmp_path), max_bytes=0)
+  oldest = add_entry(cache, 'old')
+  newest = add_entry(cache, 'new')
+  with cache._locked('old'):
+    assert cache.evict() == 1
+  assert os.path.exists(os.path.join(oldest, 'sysroot', 'system', 'libc.so'))
+  assert not os.path.exists(newest)
+
+
+def test_eviction_skips_entries_used_since_they_were_listed(tmp_path, monkeypatch):
+  cache = module_cache.ModuleCache(str(tmp_path), max_bytes=0)
+  entry = add_entry(cache, 'old')
+  directory_size = module_cache._directory_size
+
+  def size_and_use(path):
+    # Another device uses the entry between the listing and the lock.
+    cache._touch(path)
+    return directory_size(path)
+
+  monkeypatch.setattr(module_cache, '_directory_size', size_and_use)
+  assert cache.evict() == 0
+  assert os.path.exists(os.path.join(entry, 'sysroot'))
+
+
+def test_prewarm_waiting_for_an_evicted_entry_recreates_it(adb, adb_server, tmp_path):
+  build = 'vendor/a:14/A.1/1:user/release-keys'
+  adb_server.add_device(make_device('FAKEA', build))
+  cache = module_cache.ModuleCache(str(tmp_path), max_bytes=1 << 30)
+  entry = add_entry(cache, build)
+
+  # Hold the entry's lock the way evict() does while the prewarm waits for it.
+  lock_file = module_cache._lock_entry(entry, blocking=False)
+  with concurrent.futures.ThreadPoolExecutor(1) as executor:
+    prewarm = executor.submit(cache.prewarm, 'FAKEA', build, LIBRARIES, client=adb)
+    time.sleep(0.1)
+    assert not prewarm.done()
+    shutil.rmtree(entry)
+    lock_file.close()
+    entry_after, stats = prewarm.result(timeout=5)
+
+  assert stats['misses'] == len(LIBRARIES)
+  for path in LIBRARIES:
+    assert os.path.exists(os.path.join(entry_after.sysroot, path.lstrip('/')))
+
+
+class StubRemote:
+  """The parts of a target connect_platform() uses, for a stub device."""
+  platform_name = 'remote-linux'
+  server_process = None
+
+  def __init__(self, port):
+    self.port = port
+
+  def connect_url(self):
+    return f'connect://127.0.0.1:{self.port}'
+
+
+def test_sessions_of_different_builds_have_their_own_sysroot(harness, tmp_path):
+  lldb = pytest.importorskip('lldb')
+  server = lldb_server_stub.StubServer(
+      [lldb_server_stub.Device(i, 'com.example.hellojni') for i in range(2)])
+  server.start()
+  cache = module_cache.ModuleCache(str(tmp_path), max_bytes=1 << 30)
+  entries = [cache.entry('vendor/a:14/A.1/1:user/release-keys'),
+             cache.entry('vendor/b:13/B.2/2:user/release-keys')]
+  remotes = [StubRemote(server.ports[f'stub-{i}']) for i in range(2)]
+
+  def connect(index):
+    debugger = harness.create_debugger(entries[index])
+    platform = harness.connect_platform(
+        debugger, remotes[index], harness.metrics.RunRecord(), entries[index])
+    return debugger, platform
+
+  with concurrent.futures.ThreadPoolExecutor(2) as executor:
+    sessions = list(executor.map(connect, range(2)))
+
+  for (debugger, platform), entry in zip(sessions, entries):
+    result = lldb.SBCommandReturnObject()
+    debugger.GetCommandInterpreter().HandleCommand('platform status', result)
+    assert f'Sysroot: {entry.sysroot}' in result.GetOutput()
+    platform.DisconnectRemote()
+    lldb.SBDebugger.Destroy(debugger)
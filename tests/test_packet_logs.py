@@ -0,0 +1,17 @@
+import adb_client
+
+APP_DIR = '/data/data/com.example.app'
+
+
+def test_packet_logs_are_streamed_to_files(harness, adb, adb_server, monkeypatch, tmp_path):
+  monkeypatch.setattr(adb_client, 'get_default_client', lambda: adb)
+  files = adb_server.find_device('FAKE0001').files
+  platform_log = b'<  19> read packet: $QStartNoAckMode#b0\n' * 100000
+  files[f'{APP_DIR}/lldb/log/platform.log'] = (0o100600, platform_log, 0)
+  files[f'{APP_DIR}/lldb/log/ring.done'] = (0o100600, b'', 0)
+
+  local_paths = harness.pull_packet_logs('FAKE0001', 'com.example.app', str(tmp_path),
+                                         wait_for_ring=True)
+  assert local_paths == [str(tmp_path / 'FAKE0001-platform.log'), None]
+  assert (tmp_path / 'FAKE0001-platform.log').read_bytes() == platform_log
+  assert not (tmp_path / 'FAKE0001-gdb-server.log').exists()
@@ -0,0 +1,131 @@
+import pytest
+
+APP_NAME = 'com.example.app'
+PROCESS_NAMES = [APP_NAME, 'app_process64']
+
+
+class ShellCommand:
+  """Stands in for lldb.SBPlatformShellCommand."""
+
+  def __init__(self, command):
+    self.command = command
+    self.status = None
+    self.output = None
+
+  def SetTimeoutSeconds(self, seconds):
+    pass
+
+  def GetStatus(self):
+    return self.status
+
+  def GetOutput(self):
+    return self.output
+
+
+class Error:
+  def __init__(self, message=None):
+    self.message = message
+
+  def Fail(self):
+    return self.message is not None
+
+  def GetCString(self):
+    return self.message
+
+
+class ProcessInfo:
+  """Stands in for lldb.SBProcessInfo."""
+
+  def __init__(self):
+    self.name = None
+    self.pid = None
+
+  def GetName(self):
+    return self.name
+
+  def GetProcessID(self):
+    return self.pid
+
+
+class ProcessList:
+  def __init__(self, processes):
+    self.processes = processes
+
+  def GetSize(self):
+    return len(self.processes)
+
+  def GetProcessInfoAtIndex(self, index, info):
+    info.name, info.pid = self.processes[index]
+    return True
+
+
+class Platform:
+  """
+  An SBPlatform whose Run() answers from `shell`, a dict of command ->
+  (status, output), or fails for other commands; GetAllProcesses() lists
+  `processes`, (name, pid) pairs.
+  """
+
+  def __init__(self, shell, processes=()):
+    self.shell = shell
+    self.processes = list(processes)
+    self.calls = []
+
+  def Run(self, command):
+    self.calls.append(command.command)
+    if command.command not in self.shell:
+      return Error('not supported')
+    command.status, command.output = self.shell[command.command]
+    return Error()
+
+  def GetAllProcesses(self, error):
+    self.calls.append('GetAllProcesses')
+    return ProcessList(self.processes)
+
+
+@pytest.fixture
+def fake_lldb(harness, monkeypatch):
+  monkeypatch.setattr(harness.lldb, 'SBPlatformShellCommand', ShellCommand)
+  monkeypatch.setattr(harness.lldb, 'SBProcessInfo', ProcessInfo)
+
+
+def test_pidof_finds_the_app_without_a_scan(harness, fake_lldb):
+  platform = Platform({f'pidof {APP_NAME}': (0, '1234\n')})
+  resolver = harness.ProcessResolver(PROCESS_NAMES)
+  assert resolver.resolve(platform) == 1234
+  assert resolver.method == 'pidof'
+  # The pid is cached until invalidated.
+  assert resolver.resolve(platform) == 1234
+  assert platform.calls == [f'pidof {APP_NAME}']
+  resolver.invalidate()
+  assert resolver.method is None
+  platform.shell[f'pidof {APP_NAME}'] = (0, '1300\n')
+  assert resolver.resolve(platform) == 1300
+
+
+def test_pidof_tries_every_process_name(harness, fake_lldb):
+  platform = Platform({f'pidof {APP_NAME}': (1, ''), 'pidof app_process64': (0, '42\n')})
+  resolver = harness.ProcessResolver(PROCESS_NAMES)
+  assert resolver.resolve(platform) == 42
+  assert resolver.method == 'pidof'
+  assert platform.calls == [f'pidof {APP_NAME}', 'pidof app_process64']
+
+
+@pytest.mark.parametrize('shell', [
+  # pidof is not available on the platform.
+  {},
+  # More than one process has the name.
+  {f'pidof {APP_NAME}': (0, '7 9\n')},
+])
+def test_falls_back_to_a_full_scan(harness, fake_lldb, shell):
+  platform = Platform(shell, [('init', 1), (APP_NAME, 7), ('zygote64', 8), (APP_NAME, 9)])
+  resolver = harness.ProcessResolver(PROCESS_NAMES)
+  assert resolver.resolve(platform) == 9
+  assert resolver.method == 'scan'
+  assert platform.calls[-1] == 'GetAllProcesses'
+
+
+def test_missing_app_is_an_error(harness, fake_lldb):
+  platform = Platform({}, [('init', 1)])
+  with pytest.raises(harness.HarnessError, match='Failed to find a process'):
+    harness.ProcessResolver(PROCESS_NAMES).resolve(platform)
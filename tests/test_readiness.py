@@ -0,0 +1,61 @@
+"""wait_for_platform() against lldb_server_stub, a host-side lldb-server stand-in."""
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import lldb_server_stub
+
+lldb = pytest.importorskip('lldb')
+
+
+@pytest.fixture(scope='module')
+def debugger():
+  debugger = lldb.SBDebugger.Create(False)
+  yield debugger
+  lldb.SBDebugger.Destroy(debugger)
+
+
+@pytest.fixture(scope='module')
+def stub_port():
+  server = lldb_server_stub.StubServer([lldb_server_stub.Device(0, 'com.example.hellojni')])
+  server.start()
+  return server.ports['stub-0']
+
+
+def closed_port():
+  with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    return sock.getsockname()[1]
+
+
+def connect_options(port):
+  return lldb.SBPlatformConnectOptions(f'connect://127.0.0.1:{port}')
+
+
+def test_connects_to_a_listening_server(harness, debugger, stub_port):
+  platform = lldb.SBPlatform('remote-linux')
+  elapsed = harness.wait_for_platform(platform, connect_options(stub_port), 5)
+  assert platform.IsConnected()
+  assert elapsed < 5
+  platform.DisconnectRemote()
+
+
+def test_gives_up_at_the_deadline(harness, debugger):
+  platform = lldb.SBPlatform('remote-linux')
+  started = time.monotonic()
+  with pytest.raises(harness.HarnessError, match='did not start listening'):
+    harness.wait_for_platform(platform, connect_options(closed_port()), 0.5)
+  assert 0.5 <= time.monotonic() - started < 5
+
+
+def test_fails_fast_when_the_server_exited(harness, debugger):
+  server_process = subprocess.Popen([sys.executable, '-c', 'raise SystemExit(3)'])
+  server_process.wait()
+  platform = lldb.SBPlatform('remote-linux')
+  started = time.monotonic()
+  with pytest.raises(harness.HarnessError, match='exited with code 3'):
+    harness.wait_for_platform(platform, connect_options(closed_port()), 30, server_process)
+  assert time.monotonic() - started < 5
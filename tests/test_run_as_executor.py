@@ -0,0 +1,60 @@
+import subprocess
+
+import pytest
+
+import adb_client
+import run_as_executor
+
+
+def run_script(commands):
+  """Runs the marker script of `commands` with the host shell; returns (stdout, stderr)."""
+  token = run_as_executor._new_token()
+  script = ''.join(run_as_executor._command_script(token, index, command, subshell=True)
+                   for index, command in enumerate(commands))
+  result = subprocess.run(['sh', '-c', script], capture_output=True)
+  return token, result.stdout, result.stderr
+
+
+def test_split_output_of_each_command():
+  token, stdout, stderr = run_script([
+    'echo one',
+    'printf "two\\nlines\\n"; echo oops >&2; exit 3',
+    'true',
+    'printf "no newline"',
+  ])
+  assert run_as_executor._split_output(token, stdout) == {
+    0: (b'one\n', 0),
+    1: (b'two\nlines\n', 3),
+    2: (b'', 0),
+    3: (b'no newline', 0),
+  }
+  assert run_as_executor._split_output(token, stderr)[1] == (b'oops\n', 3)
+
+
+def test_split_output_ignores_unfinished_and_foreign_markers():
+  token = '__run_as_test'
+  output = (b'noise before\n'
+            b'__run_as_other:begin:0\nnot ours\n\n__run_as_other:end:0:0\n'
+            b'__run_as_test:begin:0\nfirst\n\n__run_as_test:end:0:0\n'
+            b'__run_as_test:begin:1\ncut off')
+  assert run_as_executor._split_output(token, output) == {0: (b'first\n', 0)}
+
+
+def test_split_output_of_output_that_looks_like_a_marker():
+  token, stdout, _ = run_script(["echo ':end:0:1'", 'exit 1'])
+  assert run_as_executor._split_output(token, stdout) == {
+    0: (b':end:0:1\n', 0),
+    1: (b'', 1),
+  }
+
+
+def test_run_as_shell_keeps_state_between_commands(adb):
+  with run_as_executor.RunAsShell('FAKE0001', 'com.example.app', client=adb) as shell:
+    assert shell.run('x=1; mkdir -p lldb; cd lldb', timeout_seconds=5).returncode == 0
+    result = shell.run('echo $x; pwd', timeout_seconds=5)
+    assert (result.returncode, result.stdout, result.stderr) == (
+      0, b'1\n/data/data/com.example.app/lldb\n', b'')
+    result = shell.run('echo oops >&2; false', timeout_seconds=5)
+    assert (result.returncode, result.stdout, result.stderr) == (1, b'', b'oops\n')
+    with pytest.raises(adb_client.AdbError, match='exited with code 3'):
+      shell.run('exit 3', timeout_seconds=5)
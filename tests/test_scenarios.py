@@ -0,0 +1,116 @@
+import threading
+import time
+import types
+
+import pytest
+
+pytest.importorskip('lldb')
+
+import metrics
+import scenarios
+
+
+def test_run_with_timeout_returns_the_result():
+  assert scenarios.run_with_timeout(lambda: 42, 5) == 42
+
+
+def test_run_with_timeout_raises_what_the_function_raised():
+  def fail():
+    raise scenarios.ScenarioError('check failed')
+  with pytest.raises(scenarios.ScenarioError, match='check failed'):
+    scenarios.run_with_timeout(fail, 5)
+
+
+def test_run_with_timeout_abandons_a_hung_function():
+  release = threading.Event()
+  started = time.monotonic()
+  with pytest.raises(scenarios.ScenarioTimeout, match='0.2 seconds'):
+    scenarios.run_with_timeout(release.wait, 0.2)
+  assert time.monotonic() - started < 2
+  release.set()
+
+
+class HangingScenario(scenarios.Scenario):
+  name = 'test_hang'
+  timeout_seconds = 0.2
+
+  def run(self, session):
+    # Python code that no LLDB interrupt reaches.
+    session.release.wait()
+
+
+class FakeSession:
+  """The parts of a DebugSession run_scenario() uses."""
+
+  class remote:
+    name = 'fake'
+
+  def __init__(self):
+    self.release = threading.Event()
+    self.resets = 0
+
+  def reset(self):
+    self.resets += 1
+
+
+def test_hung_scenario_times_out_and_resets_the_session(harness, monkeypatch):
+  monkeypatch.setitem(scenarios.SCENARIOS, HangingScenario.name, HangingScenario)
+  session = FakeSession()
+  started = time.monotonic()
+  result = harness.run_scenario(session, metrics.RunRecord(), HangingScenario.name)
+  session.release.set()
+  assert time.monotonic() - started < 2
+  assert result['status'] == 'timeout'
+  assert session.resets == 1
+
+
+class Recorder:
+  """Stands in for an SB object, recording the methods called on it."""
+
+  def __init__(self, calls, name):
+    self._calls = calls
+    self._name = name
+
+  def __getattr__(self, method):
+    return lambda *args: self._calls.append(f'{self._name}.{method}')
+
+
+def test_reset_abandons_the_session_without_tearing_it_down(harness, monkeypatch):
+  calls = []
+  monkeypatch.setattr(harness.lldb.SBDebugger, 'Destroy',
+                      staticmethod(lambda debugger: calls.append('SBDebugger.Destroy')))
+
+  class remote:
+    process_names = ['com.example.app']
+
+  session = harness.DebugSession(remote, metrics.RunRecord())
+  session.debugger = Recorder(calls, 'debugger')
+  session.platform = Recorder(calls, 'platform')
+  session.target = Recorder(calls, 'target')
+  session.process = Recorder(calls, 'process')
+  session.reset()
+  assert calls == ['debugger.RequestInterrupt', 'process.SendAsyncInterrupt']
+  assert (session.debugger, session.platform, session.target, session.process) == (
+    None, None, None, None)
+
+
+
+class BreakpointTarget:
+  """An SBTarget that records the functions breakpoints are created on."""
+
+  def __init__(self):
+    self.functions = []
+
+  def BreakpointCreateByName(self, function):
+    self.functions.append(function)
+
+
+@pytest.mark.parametrize('platform_name, function', [
+  ('remote-android', '__epoll_pwait'),
+  ('remote-linux', 'fixture_nap'),
+])
+def test_breakpoint_function_matches_the_target(platform_name, function):
+  session = types.SimpleNamespace(remote=types.SimpleNamespace(platform_name=platform_name),
+                                  target=BreakpointTarget())
+  scenarios.SCENARIOS['breakpoint']().setup(session)
+  assert session.target.functions == [function]
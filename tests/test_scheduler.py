@@ -0,0 +1,62 @@
+import threading
+
+import scheduler
+
+SCENARIOS = ['s0', 's1', 's2', 's3', 's4']
+
+
+def test_scenarios_are_dealt_round_robin_per_abi():
+  tasks = scheduler.ScenarioScheduler(
+      SCENARIOS, {'a': 'arm64-v8a', 'b': 'arm64-v8a', 'x': 'x86_64'})
+  assert tasks.remaining() == {
+    'a': ['s0', 's2', 's4'],
+    'b': ['s1', 's3'],
+    'x': SCENARIOS,
+  }
+
+
+def test_idle_device_steals_from_the_back_of_the_longest_queue():
+  tasks = scheduler.ScenarioScheduler(
+      SCENARIOS, {'a': 'arm64-v8a', 'b': 'arm64-v8a', 'c': 'arm64-v8a'})
+  # a: s0 s3, b: s1 s4, c: s2
+  assert tasks.next('a') == 's0'
+  assert [tasks.next('c'), tasks.next('c')] == ['s2', 's4']
+  assert tasks.steals == 1
+  assert tasks.remaining() == {'a': ['s3'], 'b': ['s1']}
+  assert tasks.next('c') == 's3'
+  assert list(tasks.take('a')) == ['s1']
+  assert tasks.steals == 3
+  assert tasks.next('b') is None
+  assert tasks.remaining() == {}
+
+
+def test_devices_do_not_steal_across_abis():
+  tasks = scheduler.ScenarioScheduler(SCENARIOS, {'a': 'arm64-v8a', 'x': 'x86_64'})
+  assert list(tasks.take('x')) == SCENARIOS
+  assert tasks.next('x') is None
+  assert tasks.steals == 0
+  assert tasks.remaining() == {'a': SCENARIOS}
+
+
+def test_concurrent_workers_run_every_scenario_once_per_abi():
+  names = [f's{i}' for i in range(200)]
+  devices = {f'arm{i}': 'arm64-v8a' for i in range(4)}
+  devices.update({f'x86_{i}': 'x86_64' for i in range(3)})
+  tasks = scheduler.ScenarioScheduler(names, devices)
+  taken = {serial: [] for serial in devices}
+
+  def work(serial):
+    for name in tasks.take(serial):
+      taken[serial].append(name)
+
+  workers = [threading.Thread(target=work, args=(serial,)) for serial in devices]
+  for worker in workers:
+    worker.start()
+  for worker in workers:
+    worker.join()
+
+  for abi in ('arm64-v8a', 'x86_64'):
+    ran = [name for serial, abi_of in devices.items() if abi_of == abi
+           for name in taken[serial]]
+    assert sorted(ran) == sorted(names)
+  assert tasks.remaining() == {}
@@ -0,0 +1,55 @@
+import json
+import threading
+
+import trace_events
+
+
+def test_export_follows_the_chrome_trace_event_format(tmp_path):
+  tracer = trace_events.Tracer()
+  with tracer.span('not recorded'):
+    tracer.instant('not recorded either')
+  tracer.enable(process_name='harness test')
+  with tracer.span('phase', cat='phase'):
+    with tracer.span('adb push', cat='adb', bytes=4096):
+      pass
+    tracer.instant('scenario timeout', scenario='step')
+
+  def device_thread():
+    with tracer.on_track('FAKE0001'):
+      with tracer.span('SBProcess.Detach', cat='lldb'):
+        pass
+
+  thread = threading.Thread(target=device_thread)
+  thread.start()
+  thread.join()
+  path = tmp_path / 'trace' / 'trace.json'
+  tracer.write(str(path))
+
+  trace = json.loads(path.read_text())
+  assert trace['displayTimeUnit'] == 'ms'
+  events = trace['traceEvents']
+  metadata = [event for event in events if event['ph'] == 'M']
+  assert metadata[0]['name'] == 'process_name'
+  assert metadata[0]['args'] == {'name': 'harness test'}
+  tracks = {event['args']['name']: event['tid'] for event in metadata
+            if event['name'] == 'thread_name'}
+  assert set(tracks) == {trace_events.HARNESS_TRACK, 'FAKE0001'}
+
+  by_name = {event['name']: event for event in events if event['ph'] != 'M'}
+  assert set(by_name) == {'phase', 'adb push', 'scenario timeout', 'SBProcess.Detach'}
+  for event in by_name.values():
+    assert event['pid'] == metadata[0]['pid']
+    assert isinstance(event['ts'], (int, float))
+    assert all(isinstance(value, str) for value in event.get('args', {}).values())
+
+  phase, push = by_name['phase'], by_name['adb push']
+  assert phase['ph'] == push['ph'] == 'X'
+  assert phase['ts'] <= push['ts'] and push['ts'] + push['dur'] <= phase['ts'] + phase['dur']
+  assert push['args'] == {'bytes': '4096'}
+  assert phase['tid'] == push['tid'] == tracks[trace_events.HARNESS_TRACK]
+
+  timeout = by_name['scenario timeout']
+  assert (timeout['ph'], timeout['s'], timeout['cat']) == ('i', 't', 'harness')
+  assert timeout['args'] == {'scenario': 'step'}
+  assert phase['ts'] <= timeout['ts'] <= phase['ts'] + phase['dur']
+  assert by_name['SBProcess.Detach']['tid'] == tracks['FAKE0001']
@@ -0,0 +1,78 @@
+"""wait_for_state() and wait_for_stop() on a process attached through lldb_server_stub."""
+import threading
+import time
+
+import pytest
+
+import lldb_server_stub
+import metrics
+
+lldb = pytest.importorskip('lldb')
+
+APP_NAME = 'com.example.hellojni'
+
+
+@pytest.fixture
+def session(harness):
+  """A DebugSession attached to the app of a stub device, stopped."""
+  server = lldb_server_stub.StubServer([lldb_server_stub.Device(0, APP_NAME, threads=2)])
+  server.start()
+
+  class remote:
+    name = 'stub-0'
+    platform_name = 'remote-linux'
+    process_names = [APP_NAME]
+    server_process = None
+
+    def connect_url():
+      return f'connect://127.0.0.1:{server.ports["stub-0"]}'
+
+  session = harness.DebugSession(remote, metrics.RunRecord())
+  session.connect()
+  yield session
+  session.debugger.SetAsync(False)
+  session.close()
+
+
+def resume(session):
+  """Continues the process without waiting for it to stop again."""
+  # Only events of the resume must be waited for.
+  event = lldb.SBEvent()
+  while session.debugger.GetListener().GetNextEvent(event):
+    pass
+  session.debugger.SetAsync(True)
+  assert session.process.Continue().Success()
+
+
+def test_returns_at_once_when_already_stopped(harness, session):
+  state, seconds = harness.wait_for_state(
+      session.debugger.GetListener(), session.process, (lldb.eStateStopped,), 5)
+  assert state == lldb.eStateStopped
+  assert seconds < 1
+
+
+def test_waits_for_the_stop_event(harness, session):
+  resume(session)
+  # The stub only stops a running process when it is interrupted.
+  interrupt = threading.Timer(0.2, session.process.SendAsyncInterrupt)
+  interrupt.start()
+  seconds = harness.wait_for_stop(session.debugger.GetListener(), session.process, 5)
+  interrupt.join()
+  assert 0.2 <= seconds < 5
+  assert session.process.GetState() == lldb.eStateStopped
+
+
+def test_fails_when_the_process_exited(harness, session):
+  assert session.process.Kill().Success()
+  with pytest.raises(harness.HarnessError, match='exited while waiting for stopped'):
+    harness.wait_for_stop(session.debugger.GetListener(), session.process, 5)
+
+
+def test_gives_up_at_the_deadline(harness, session):
+  resume(session)
+  started = time.monotonic()
+  with pytest.raises(harness.HarnessError, match='Timed out .* stopped'):
+    harness.wait_for_stop(session.debugger.GetListener(), session.process, 0.5)
+  assert 0.5 <= time.monotonic() - started < 3
+  session.process.Stop()
+  harness.wait_for_stop(session.debugger.GetListener(), session.process, 5)
@@ -0,0 +1,143 @@
+"""
+Chrome trace-event export for harness runs.
+
+Spans recorded here are written in the Chrome trace-event JSON format, which
+can be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing. Each
+device gets its own track, so adb traffic, pushes and LLDB calls for different
+devices show up side by side, nested under the pipeline phase they belong to.
+Moments without a duration, like a scenario timing out or the harness
+re-attaching to the app, are marked with instant events on the same tracks.
+
+Tracing is off by default and every span is a cheap no-op until enable() is
+called.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+HARNESS_TRACK = 'harness'
+
+
+class Tracer:
+  """Collects trace events in memory and writes them out as JSON."""
+
+  def __init__(self):
+    self.enabled = False
+    self._events = []
+    self._lock = threading.Lock()
+    self._tracks = {}
+    self._local = threading.local()
+    self._pid = os.getpid()
+    self._origin_ns = time.perf_counter_ns()
+
+  def enable(self, process_name='test.py'):
+    """Starts recording events."""
+    with self._lock:
+      self.enabled = True
+      self._events.append({
+        'ph': 'M',
+        'name': 'process_name',
+        'pid': self._pid,
+        'tid': 0,
+        'args': {'name': process_name},
+      })
+
+  def _now_us(self):
+    return (time.perf_counter_ns() - self._origin_ns) / 1000
+
+  def _track_id(self, track):
+    """Returns the tid of `track`, registering its name on first use."""
+    tid = self._tracks.get(track)
+    if tid is None:
+      tid = len(self._tracks) + 1
+      self._tracks[track] = tid
+      self._events.append({
+        'ph': 'M',
+        'name': 'thread_name',
+        'pid': self._pid,
+        'tid': tid,
+        'args': {'name': track},
+      })
+    return tid
+
+  def current_track(self):
+    return getattr(self._local, 'track', HARNESS_TRACK)
+
+  @contextlib.contextmanager
+  def on_track(self, track):
+    """Records spans opened by the current thread on `track`."""
+    previous = self.current_track()
+    self._local.track = track
+    try:
+      yield
+    finally:
+      self._local.track = previous
+
+  @contextlib.contextmanager
+  def span(self, name, cat='harness', **args):
+    """Records the enclosed block as a complete ('X') event."""
+    if not self.enabled:
+      yield
+      return
+    track = self.current_track()
+    start = self._now_us()
+    try:
+      yield
+    finally:
+      end = self._now_us()
+      event = {
+        'ph': 'X',
+        'name': name,
+        'cat': cat,
+        'ts': start,
+        'dur': end - start,
+        'pid': self._pid,
+      }
+      if args:
+        event['args'] = {key: str(value) for key, value in args.items()}
+      with self._lock:
+        event['tid'] = self._track_id(track)
+        self._events.append(event)
+
+  def instant(self, name, cat='harness', **args):
+    """Records a zero-duration ('i') event."""
+    if not self.enabled:
+      return
+    event = {
+      'ph': 'i',
+      's': 't',
+      'name': name,
+      'cat': cat,
+      'ts': self._now_us(),
+      'pid': self._pid,
+    }
+    if args:
+      event['args'] = {key: str(value) for key, value in args.items()}
+    with self._lock:
+      event['tid'] = self._track_id(self.current_track())
+      self._events.append(event)
+
+  def write(self, path):
+    """Writes all recorded events to `path`."""
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    with self._lock:
+      events = list(self._events)
+    with open(path, 'w') as f:
+      json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+# The tracer shared by all harness modules.
+tracer = Tracer()
+
+
+def span(name, cat='harness', **args):
+  return tracer.span(name, cat, **args)
+
+
+def instant(name, cat='harness', **args):
+  tracer.instant(name, cat, **args)